@@ -0,0 +1,110 @@
+"""
+Import-time budget check for the project's entry points.
+Each entry point is imported in a fresh interpreter under `python -X importtime` (the minimum of a few
+runs is kept), and two things are checked:
+- the cumulative import time stays under the entry point's budget, and
+- none of the heavy packages it does not need up front (NumPy, scikit-learn, SciPy, torch, the
+  HTTP stack, python-dotenv) is imported, since those are meant to load on first use.
+GEMINI_API_KEY is removed from the child environment, so an entry point that resolves configuration
+at import time fails the check too.
+Exits with status 1 if any entry point is over budget or imports a forbidden module.
+
+Usage:
+    python -m bench.import_budget [--runs 3] [--scale 1.0] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+HEAVY = ('sklearn', 'scipy', 'torch', 'transformers', 'sentence_transformers')
+# module -> (budget in ms, top-level packages that must not be imported)
+ENTRY_POINTS = {
+    'core.prompt_builder': (50, HEAVY + ('numpy',)),
+    'core.openrouter_api': (100, HEAVY + ('numpy', 'requests', 'dotenv')),
+    'core.batch_planner': (150, HEAVY + ('requests', 'dotenv')),  # Batch retrieval needs NumPy up front
+    'core.plan_validator': (50, HEAVY + ('numpy',)),
+    'core.executor': (50, HEAVY + ('numpy',)),
+    'core.backend_router': (50, HEAVY + ('numpy', 'requests', 'dotenv')),
+    'main': (50, HEAVY + ('numpy', 'requests', 'dotenv')),
+    'mate_open_llm.local_llm_planner': (50, HEAVY + ('numpy',)),
+}
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure(module):
+    """
+    Import `module` in a fresh interpreter.
+    Returns:
+        tuple: (cumulative import time of `module` in ms, set of top-level packages imported).
+    """
+    env = dict(os.environ)
+    env.pop('GEMINI_API_KEY', None)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), env.get('PYTHONPATH')]))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    total_ms, packages = None, set()
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        packages.add(match.group(4).split('.')[0])
+        if match.group(4) == module:
+            total_ms = int(match.group(2)) / 1000
+    return total_ms, packages
+
+
+def check(runs=3, scale=1.0):
+    """
+    Measure every entry point.
+    Args:
+        runs (int): Fresh interpreters per entry point; the fastest is reported.
+        scale (float): Multiplier for every budget (for slow CI machines).
+    Returns:
+        list: One result dict per entry point with 'module', 'ms', 'budget_ms', 'forbidden' and 'ok'.
+    """
+    results = []
+    for module, (budget_ms, forbidden) in ENTRY_POINTS.items():
+        timings, packages = [], set()
+        for _ in range(runs):
+            ms, imported = measure(module)
+            timings.append(ms)
+            packages |= imported
+        ms = min(timings)
+        found = sorted(set(forbidden) & packages)
+        results.append({
+            'module': module, 'ms': round(ms, 1), 'budget_ms': budget_ms * scale,
+            'forbidden': found, 'ok': ms <= budget_ms * scale and not found,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check entry-point import times against their budgets.")
+    parser.add_argument('--runs', type=int, default=3, help="Fresh interpreters per entry point.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget by this factor.")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+    results = check(args.runs, args.scale)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            status = 'ok' if result['ok'] else 'FAIL'
+            extra = f"  imports {', '.join(result['forbidden'])}" if result['forbidden'] else ''
+            print(f"{status:>4}  {result['module']:<34} {result['ms']:>8.1f} ms / {result['budget_ms']:.0f} ms{extra}")
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Retrieval and planning benchmarks.
+Runs filter_relevant_tools, filter_relevant_tools_batch, build_prompt, extract_json_array and the whole
+planning pipeline (retrieval -> prompt -> LLM -> parse) against data/sample_prompts.txt, on the real
+catalog and on synthetic catalogs scaled up from it. The LLM is replaced by the deterministic stub in
+bench/stub_llm.py, so runs are repeatable and offline.
+Reports p50/p95/p99 latency, throughput, peak traced memory and recall@k against bench/gold_set.json,
+and writes everything as JSON so runs can be compared.
+
+Usage:
+    python -m bench.run_bench [--sizes 1000 10000 100000] [--repeat 5] [--top-n 12] [--out PATH]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from bench.stub_llm import stub_llm
+from core.plan_parsing import extract_json_array
+from core.prompt_builder import build_prompt
+from core.retrievers import TfidfRetriever
+from core.tool_catalog import get_catalog
+from core.tool_filter import filter_relevant_tools, filter_relevant_tools_batch
+from core.tool_index import ToolIndex
+
+BENCH_DIR = Path(__file__).parent
+PROMPTS_PATH = BENCH_DIR.parent / 'data' / 'sample_prompts.txt'
+GOLD_PATH = BENCH_DIR / 'gold_set.json'
+RESULTS_DIR = BENCH_DIR / 'results'
+RECALL_KS = (1, 3, 5, 12)
+
+
+def load_queries():
+    with open(PROMPTS_PATH, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_gold():
+    with open(GOLD_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_catalog(tools, size):
+    """
+    Scale a catalog up to `size` tools. The original tools are kept unchanged (so the gold set still
+    applies); the rest are renamed copies with a few extra words so their vectors are not identical.
+    """
+    scaled = list(tools[:size])
+    copy = 1
+    while len(scaled) < size:
+        for tool in tools:
+            if len(scaled) >= size:
+                break
+            clone = dict(tool)
+            clone['name'] = f"{tool['name']}_v{copy}"
+            clone['description'] = f"{tool.get('description', '')} variant {copy} revision r{copy % 97}"
+            scaled.append(clone)
+        copy += 1
+    return scaled
+
+
+def latency_summary(samples, items=None):
+    """Summarize per-call latencies (seconds) as milliseconds plus throughput (items per second)."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    total = sum(samples)
+    return {
+        'calls': len(samples),
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'mean_ms': total / len(samples) * 1000,
+        'throughput_per_s': (items if items is not None else len(samples)) / total if total else None,
+    }
+
+
+def run_timed(fn, inputs, repeat):
+    """Call fn on every input `repeat` times and return per-call latencies in seconds."""
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_memory(fn, inputs):
+    """Peak traced allocation (bytes) during one pass of fn over the inputs."""
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            fn(item)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def recall_at_k(retriever, gold, ks=RECALL_KS):
+    """Mean recall@k of the retriever over the gold set."""
+    ranked, _ = filter_relevant_tools_batch([g['query'] for g in gold], retriever.index.tools, max(ks), retriever=retriever)
+    recalls = {}
+    for k in ks:
+        per_query = []
+        for entry, tools in zip(gold, ranked):
+            relevant = set(entry['relevant'])
+            found = {tool['name'] for tool in tools[:k]}
+            per_query.append(len(found & relevant) / len(relevant))
+        recalls[f"recall@{k}"] = sum(per_query) / len(per_query)
+    return recalls
+
+
+def bench_catalog(label, tools, queries, gold, repeat, top_n):
+    """Run every benchmark against one catalog and return a result dict."""
+    start = time.perf_counter()
+    index = ToolIndex.build(tools)
+    build_seconds = time.perf_counter() - start
+    retriever = TfidfRetriever(index)
+
+    def retrieve(query):
+        return filter_relevant_tools(query, tools, top_n=top_n, retriever=retriever)
+
+    relevant = {query: retrieve(query) for query in queries}
+    prompts = {query: build_prompt(query, relevant[query]) for query in queries}
+    responses = [stub_llm(prompts[query]) for query in queries]
+
+    def prompt(query):
+        return build_prompt(query, relevant[query])
+
+    def pipeline(query):
+        return extract_json_array(stub_llm(build_prompt(query, retrieve(query))))
+
+    stages = {
+        'filter_relevant_tools': (retrieve, queries),
+        'build_prompt': (prompt, queries),
+        'extract_json_array': (extract_json_array, responses),
+        'pipeline': (pipeline, queries),
+    }
+    result = {'catalog': label, 'tools': len(tools), 'index_build_s': build_seconds, 'stages': {}}
+    for name, (fn, inputs) in stages.items():
+        summary = latency_summary(run_timed(fn, inputs, repeat))
+        summary['peak_memory_bytes'] = peak_memory(fn, inputs)
+        result['stages'][name] = summary
+
+    batch_queries = queries * repeat
+    start = time.perf_counter()
+    filter_relevant_tools_batch(batch_queries, tools, top_n=top_n, retriever=retriever)
+    result['stages']['filter_relevant_tools_batch'] = latency_summary(
+        [time.perf_counter() - start], items=len(batch_queries),
+    )
+    result['quality'] = recall_at_k(retriever, gold)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR.parent, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tool retrieval and plan generation.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1000, 10000, 100000],
+                        help="Synthetic catalog sizes to run in addition to the real catalog.")
+    parser.add_argument('--repeat', type=int, default=5, help="Passes over the sample prompts per stage.")
+    parser.add_argument('--top-n', type=int, default=12, help="Tools retrieved per query.")
+    parser.add_argument('--out', default=None, help="Output JSON path (defaults to bench/results/bench-<time>.json).")
+    args = parser.parse_args(argv)
+
+    queries = load_queries()
+    gold = load_gold()
+    tools = get_catalog().tools
+    catalogs = [('function_tools.json', tools)] + [(f'synthetic-{size}', synthetic_catalog(tools, size)) for size in args.sizes]
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'top_n': args.top_n,
+        'results': [],
+    }
+    for label, catalog_tools in catalogs:
+        result = bench_catalog(label, catalog_tools, queries, gold, args.repeat, args.top_n)
+        report['results'].append(result)
+        pipeline = result['stages']['pipeline']
+        print(f"{label:>22}: {len(catalog_tools)} tools, pipeline p50 {pipeline['p50_ms']:.2f} ms, "
+              f"p95 {pipeline['p95_ms']:.2f} ms, recall@12 {result['quality']['recall@12']:.2f}")
+
+    out_path = Path(args.out) if args.out else RESULTS_DIR / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Deterministic stand-in for the planning LLM, for benchmarks and offline runs.
+It answers with a plan that chains the first tools listed in the prompt, wrapped in some prose like a
+chatty model would, without any network access.
+"""
+import json
+import re
+
+_TOOL_LINE = re.compile(r'^- ([A-Za-z0-9_]+)', re.MULTILINE)
+
+
+def stub_llm(prompt, max_steps=3):
+    """
+    Return a deterministic model-style response for a planning prompt.
+    Args:
+        prompt (str): A prompt built by core.prompt_builder.build_prompt.
+        max_steps (int): Number of listed tools to chain into the plan.
+    Returns:
+        str: Prose followed by a JSON array of steps (or [] if the prompt lists no tools).
+    """
+    tools_section = prompt.split('TOOLS:', 1)[-1].split('EXAMPLE:', 1)[0]
+    names = _TOOL_LINE.findall(tools_section)[:max_steps]
+    plan = [{"function": name, "inputs": {}} for name in names]
+    return "Here is the plan for your request:\n```json\n" + json.dumps(plan, indent=2) + "\n```\n"
@@ -0,0 +1,319 @@
+"""
+Planning-backend router with hedged requests, failover and circuit breakers.
+A query is sent to the first available backend. If it has not answered within that backend's hedge
+delay (its recent p95 latency from the `mate_backend_seconds` histogram, see core.metrics), a second
+"hedged" request goes to the next backend, or to the same one when there is only one. The first valid
+plan wins and the other request is cancelled. Errors and invalid plans fail over to the next backend,
+and a backend whose circuit breaker is open is skipped until its reset timeout has passed.
+Cancellation is cooperative: the local planner stops at its next generated token, while an HTTP call
+that is already in flight is abandoned and bounded by the client's own timeouts.
+
+Backends are configured with MATE_BACKENDS, a comma-separated list in failover order (e.g.
+"gemini,local"); setting it also routes the web app's plan generation through here (instead of
+streaming from Gemini).
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core.metrics import get_metrics
+
+ROUTER_BACKENDS = [name.strip() for name in os.getenv('MATE_BACKENDS', 'gemini').split(',') if name.strip()]
+ROUTING_ENABLED = 'MATE_BACKENDS' in os.environ
+HEDGE_DEFAULT_DELAY = float(os.getenv('MATE_HEDGE_DELAY', '2.0'))  # Seconds, until a backend has HEDGE_MIN_SAMPLES
+HEDGE_MIN_DELAY = 0.05
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+MAX_HEDGE_RATIO = float(os.getenv('MATE_MAX_HEDGE_RATIO', '0.2'))  # Hedged requests per routed request, at most
+ROUTER_WORKERS = 16
+
+
+class NoBackendAvailable(RuntimeError):
+    """Every backend's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    Closed: calls pass. After `failure_threshold` failures in a row it opens and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open); the trial's outcome
+    closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial_running or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self):
+        """Whether a call may go through now (in the half-open state, only the first caller gets True)."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Count a failure; returns True if this opened the breaker."""
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+                return True
+            return False
+
+    def release(self):
+        """End a half-open trial without an outcome (e.g. the call was cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+
+def check_plan(plan):
+    """
+    Return `plan` if it is a non-empty list of steps with a 'function' name.
+    Raises:
+        ValueError: Otherwise (e.g. the backend returned unparseable text).
+    """
+    if not isinstance(plan, list) or not plan or not all(isinstance(step, dict) and step.get('function') for step in plan):
+        raise ValueError("The backend did not return a valid plan.")
+    return plan
+
+
+class Backend:
+    """
+    A named planning function with its own circuit breaker and latency history.
+    Args:
+        name (str): Label used in metrics and results.
+        plan_fn (callable): plan_fn(user_query, tools, cancel_event) -> plan (list of steps).
+        breaker (CircuitBreaker): Optional; a default breaker is created otherwise.
+    """
+
+    def __init__(self, name, plan_fn, breaker=None):
+        self.name = name
+        self.plan_fn = plan_fn
+        self.breaker = breaker or CircuitBreaker()
+        self._latency = get_metrics().histogram('mate_backend_seconds', 'Successful planning latency per backend', ['backend'])
+        self._opens = get_metrics().counter('mate_backend_circuit_opens_total', 'Circuit breaker trips per backend', ['backend'])
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging: the recent p95 latency, or HEDGE_DEFAULT_DELAY until enough samples exist."""
+        summary = self._latency.summary(backend=self.name)
+        if summary is None or summary['count'] < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, self._latency.quantile(HEDGE_QUANTILE, backend=self.name))
+
+    def call(self, user_query, tools, cancel_event):
+        """Run plan_fn, updating the breaker and latency history (a cancelled call counts as neither)."""
+        start = time.perf_counter()
+        try:
+            plan = check_plan(self.plan_fn(user_query, tools, cancel_event))
+        except Exception:
+            if cancel_event.is_set():
+                self.breaker.release()
+            elif self.breaker.record_failure():
+                self._opens.inc(backend=self.name)
+            raise
+        self._latency.observe(time.perf_counter() - start, backend=self.name)
+        self.breaker.record_success()
+        return plan
+
+
+class BackendRouter:
+    """
+    Route planning requests across backends with hedging and failover.
+    Args:
+        backends (list): Backend objects in failover order.
+        hedge (bool): Send a hedged request when the first one is slower than its hedge delay.
+        max_hedge_ratio (float): Cap on hedged requests as a fraction of routed requests (plus one), so a
+                                 slow backend cannot double the load on the others.
+        workers (int): Threads shared by all in-flight backend calls.
+    """
+
+    def __init__(self, backends, hedge=True, max_hedge_ratio=None, workers=ROUTER_WORKERS):
+        if not backends:
+            raise ValueError("BackendRouter needs at least one backend.")
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.max_hedge_ratio = MAX_HEDGE_RATIO if max_hedge_ratio is None else max_hedge_ratio
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mate-backend')
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedges = 0
+        self._attempts = get_metrics().counter(
+            'mate_backend_attempts_total', 'Planning attempts by backend, kind and outcome', ['backend', 'kind', 'outcome'],
+        )
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._hedges >= self.max_hedge_ratio * self._requests + 1:
+                return False
+            self._hedges += 1
+            return True
+
+    def plan(self, user_query, tools, timeout=None):
+        """
+        Plan a query with the fastest healthy backend.
+        Args:
+            user_query (str): The user's request.
+            tools (list): Tool dicts offered to the planner.
+            timeout (float): Overall seconds to wait (optional).
+        Returns:
+            dict: {'plan', 'backend', 'kind' ('primary', 'hedge' or 'failover'), 'elapsed', 'attempts'}.
+        Raises:
+            NoBackendAvailable: If every circuit breaker is open.
+            TimeoutError: If no backend answered within `timeout`.
+            Exception: The last backend error when every backend failed.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._lock:
+            self._requests += 1
+        queue = list(self.backends)
+        cancel_event = threading.Event()
+        running = {}  # future -> (backend, kind)
+        attempts = []
+        last_error = None
+
+        def launch(kind, fallback=None):
+            while queue:
+                backend = queue.pop(0)
+                if backend.breaker.allow():
+                    break
+                self._attempts.inc(backend=backend.name, kind=kind, outcome='circuit_open')
+            else:
+                if fallback is None or not fallback.breaker.allow():
+                    return None
+                backend = fallback
+            running[self._pool.submit(backend.call, user_query, tools, cancel_event)] = (backend, kind)
+            attempts.append({'backend': backend.name, 'kind': kind})
+            return backend
+
+        primary = launch('primary')
+        if primary is None:
+            raise NoBackendAvailable("Every planning backend's circuit breaker is open.")
+        hedge_at = start + primary.hedge_delay() if self.hedge else None
+        try:
+            while running:
+                now = time.monotonic()
+                waits = [t - now for t in (hedge_at, deadline) if t is not None]
+                done, _ = wait(running, timeout=max(0.0, min(waits)) if waits else None, return_when=FIRST_COMPLETED)
+                if not done:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError(f"No planning backend answered within {timeout}s.")
+                    if hedge_at is not None and time.monotonic() >= hedge_at:
+                        hedge_at = None
+                        if self._take_hedge():
+                            launch('hedge', fallback=primary)
+                    continue
+                for future in done:
+                    backend, kind = running.pop(future)
+                    try:
+                        plan = future.result()
+                    except Exception as e:
+                        last_error = e
+                        self._attempts.inc(backend=backend.name, kind=kind, outcome='error')
+                        continue
+                    self._attempts.inc(backend=backend.name, kind=kind, outcome='win')
+                    return {
+                        'plan': plan, 'backend': backend.name, 'kind': kind,
+                        'elapsed': time.monotonic() - start, 'attempts': attempts,
+                    }
+                if not running:
+                    launch('failover')
+        finally:
+            # Losers: stop them cooperatively and drop any that have not started
+            cancel_event.set()
+            for future, (backend, kind) in running.items():
+                if future.cancel():
+                    backend.breaker.release()
+                self._attempts.inc(backend=backend.name, kind=kind, outcome='cancelled')
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailable("Every planning backend's circuit breaker is open.")
+
+    def stats(self):
+        """Routed and hedged request counts plus each backend's breaker state and hedge delay."""
+        with self._lock:
+            stats = {'requests': self._requests, 'hedges': self._hedges}
+        stats['backends'] = {
+            backend.name: {'state': backend.breaker.state, 'hedge_delay': backend.hedge_delay()}
+            for backend in self.backends
+        }
+        return stats
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def gemini_plan(user_query, tools, cancel_event=None):
+    """Plan with Gemini (prompt from core.prompt_builder, response through the shared cache and client)."""
+    from core.openrouter_api import call_gemini
+    from core.plan_parsing import extract_json_array
+    from core.prompt_builder import build_prompt
+    return extract_json_array(call_gemini(build_prompt(user_query, tools)))
+
+
+def local_plan(user_query, tools, cancel_event=None):
+    """Plan with the local Hugging Face model (see mate_open_llm/local_llm_planner.py)."""
+    from mate_open_llm.local_llm_planner import plan_with_local_llm
+    return plan_with_local_llm(user_query, tools, cancel_event=cancel_event)
+
+
+def stub_plan(user_query, tools, cancel_event=None):
+    """Plan with the deterministic offline stub (bench/stub_llm.py)."""
+    from bench.stub_llm import stub_llm
+    from core.plan_parsing import extract_json_array
+    from core.prompt_builder import build_prompt
+    return extract_json_array(stub_llm(build_prompt(user_query, tools)))
+
+
+BACKEND_FUNCTIONS = {'gemini': gemini_plan, 'local': local_plan, 'stub': stub_plan}
+
+
+def make_router(names=None, **kwargs):
+    """
+    Build a BackendRouter from backend names (keys of BACKEND_FUNCTIONS), in failover order.
+    Raises:
+        ValueError: For an unknown backend name.
+    """
+    names = names or ROUTER_BACKENDS
+    unknown = [name for name in names if name not in BACKEND_FUNCTIONS]
+    if unknown:
+        raise ValueError(f"Unknown planning backend(s): {', '.join(unknown)}. Choose from {', '.join(BACKEND_FUNCTIONS)}.")
+    return BackendRouter([Backend(name, BACKEND_FUNCTIONS[name]) for name in names], **kwargs)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the process-wide BackendRouter for MATE_BACKENDS, created on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = make_router()
+    return _router
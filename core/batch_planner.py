@@ -0,0 +1,222 @@
+"""
+Headless batch planning.
+Reads queries, retrieves tools for them in vectorized chunks, builds prompts, and runs the LLM calls on
+a bounded thread pool. Each finished plan is written to a JSONL file as soon as it completes, with
+per-stage timings. Supports a global rate limit, a per-item timeout and resuming an interrupted run.
+"""
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from core.plan_parsing import extract_json_array
+from core.plan_validator import validate_plan
+from core.prompt_builder import build_prompt
+from core.tool_catalog import get_catalog
+from core.tool_filter import filter_relevant_tools_batch
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: at most `rate` acquisitions per second, with bursts up to `burst`.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def read_queries(lines):
+    """
+    Parse input lines into {'id', 'query'} items.
+    Each line is either a JSON object with a 'query' (and optional 'id') or plain query text.
+    Items without an id get their 1-based line number.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        item = None
+        if line.startswith('{'):
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = None
+        if not isinstance(item, dict) or 'query' not in item:
+            item = {'query': line}
+        item.setdefault('id', line_number)
+        yield item
+
+
+def completed_ids(output_path):
+    """Return the ids already planned successfully in an existing output file (for resume)."""
+    done = set()
+    path = Path(output_path)
+    if not path.exists():
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A partially written last line from an interrupted run
+            if isinstance(record, dict) and not record.get('error'):
+                done.add(str(record.get('id')))
+    return done
+
+
+def _plan_one(item, relevant_tools, retrieval_ms, llm, rate_limiter, plan_cache=None, router=None):
+    timings = {'retrieval_ms': retrieval_ms}
+    record = {'id': item['id'], 'query': item['query'], 'tools': [t['name'] for t in relevant_tools]}
+    start = time.perf_counter()
+    try:
+        if not relevant_tools:
+            raise ValueError("No relevant tools found for this query.")
+        if plan_cache is not None:
+            cached = plan_cache.lookup(item['query'], relevant_tools)
+            timings['cache_ms'] = (time.perf_counter() - start) * 1000
+            if cached is not None:
+                record['plan'] = cached['plan']
+                record['cached_from'] = {'query': cached['user_query'], 'similarity': round(cached['similarity'], 4)}
+                timings['total_ms'] = retrieval_ms + (time.perf_counter() - start) * 1000
+                record['timings'] = timings
+                return record
+        if router is not None:
+            # The router builds the prompt and parses the plan per backend, so llm_ms covers all three stages
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            llm_start = time.perf_counter()
+            routed = router.plan(item['query'], relevant_tools)
+            timings['llm_ms'] = (time.perf_counter() - llm_start) * 1000
+            plan = routed['plan']
+            record['backend'] = routed['backend']
+        else:
+            prompt_start = time.perf_counter()
+            prompt = build_prompt(item['query'], relevant_tools)
+            timings['prompt_ms'] = (time.perf_counter() - prompt_start) * 1000
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            llm_start = time.perf_counter()
+            response = llm(prompt)
+            timings['llm_ms'] = (time.perf_counter() - llm_start) * 1000
+            parse_start = time.perf_counter()
+            plan = extract_json_array(response)
+            timings['parse_ms'] = (time.perf_counter() - parse_start) * 1000
+        if not plan:
+            raise ValueError("The model response did not contain a valid plan.")
+        record['plan'] = plan
+        issues = validate_plan(plan)
+        if issues:
+            record['issues'] = [issue.to_dict() for issue in issues]
+        elif plan_cache is not None:
+            plan_cache.add(item['query'], relevant_tools, plan)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    timings['total_ms'] = retrieval_ms + (time.perf_counter() - start) * 1000
+    record['timings'] = timings
+    return record
+
+
+def _plan_one_timed(started, *args):
+    started.append(time.monotonic())  # Read by run_batch's timeout check: the clock starts when a worker does
+    return _plan_one(*args)
+
+
+def run_batch(items, llm, output, workers=8, rate=None, timeout=None, resume=False, top_n=12, chunk_size=256,
+              plan_cache=None, router=None):
+    """
+    Plan many queries concurrently and stream the results to a JSONL file.
+    Args:
+        items (iterable): {'id', 'query'} dicts, e.g. from read_queries().
+        llm (callable): Takes a prompt string and returns the model's response text.
+        output (str or Path): JSONL file to write; one record per query with 'plan' or 'error' and 'timings',
+                              plus 'issues' from validate_plan when the plan does not check out.
+        workers (int): Maximum concurrent LLM calls.
+        rate (float): Maximum LLM calls per second across all workers (optional).
+        timeout (float): Seconds after a worker starts an item at which it is recorded as timed out (optional).
+                         The abandoned call is not interrupted; the LLM client's own timeouts bound it.
+        resume (bool): Append to an existing output file and skip ids that already have a plan.
+        top_n (int): Tools retrieved per query.
+        chunk_size (int): Queries retrieved per vectorized filter_relevant_tools_batch call.
+        plan_cache (SemanticPlanCache): Reuse plans for near-duplicate queries (optional). Reused plans are
+                                        recorded with 'cached_from'; plans that validate cleanly are added.
+        router (BackendRouter): Plan through core.backend_router instead of calling `llm` (optional); records
+                                then carry the winning 'backend'.
+    Returns:
+        dict: Counts of 'planned', 'failed' and 'skipped' items.
+    """
+    skip = completed_ids(output) if resume else set()
+    rate_limiter = RateLimiter(rate) if rate else None
+    counts = {'planned': 0, 'failed': 0, 'skipped': 0}
+    tools = get_catalog().tools
+
+    with open(output, 'a' if resume else 'w', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            counts['failed' if record.get('error') else 'planned'] += 1
+
+        def drain(limit):
+            # Wait until at most `limit` items are in flight, writing results as they finish
+            while len(pending) > limit:
+                wait_for = None
+                if timeout is not None:
+                    # Items still queued for a worker have not started their clock yet
+                    oldest = min((started[0] for _, started in pending.values() if started), default=None)
+                    wait_for = timeout if oldest is None else max(0.0, oldest + timeout - time.monotonic())
+                done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    write(future.result())
+                if timeout is not None:
+                    now = time.monotonic()
+                    for future, (item, started) in list(pending.items()):
+                        if started and now - started[0] > timeout and not future.done():
+                            pending.pop(future)
+                            write({'id': item['id'], 'query': item['query'], 'error': f"Timed out after {timeout}s",
+                                   'timings': {'total_ms': (now - started[0]) * 1000}})
+
+        chunk = []
+
+        def submit_chunk():
+            start = time.perf_counter()
+            ranked, _ = filter_relevant_tools_batch([item['query'] for item in chunk], tools, top_n=top_n)
+            retrieval_ms = (time.perf_counter() - start) * 1000 / len(chunk)
+            for item, relevant_tools in zip(chunk, ranked):
+                drain(workers - 1)
+                started = []
+                future = pool.submit(_plan_one_timed, started, item, relevant_tools, retrieval_ms, llm, rate_limiter,
+                                     plan_cache, router)
+                pending[future] = (item, started)
+            chunk.clear()
+
+        for item in items:
+            if str(item['id']) in skip:
+                counts['skipped'] += 1
+                continue
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                submit_chunk()
+        if chunk:
+            submit_chunk()
+        drain(0)
+    return counts
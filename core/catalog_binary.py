@@ -0,0 +1,437 @@
+"""
+Compiled binary tool catalog.
+`python -m core.catalog_binary compile` turns data/function_tools.json into a single file that
+workers memory-map instead of parsing JSON. Nothing is decoded up front: a tool dict is built only
+when it is accessed by index or name, so start-up cost and per-process memory no longer grow with
+the catalog, and the file's pages are shared between worker processes through the OS page cache.
+
+File layout (little-endian):
+    header      magic, format version, tool/string counts, source file size and mtime (to detect a
+                stale compile), the catalog version (catalog_hash of the JSON tool list, so caches
+                keyed on it are shared with the JSON loader) and the offset/length of each section
+    strings     offset table + UTF-8 blob of interned strings (names, keys, types, descriptions...)
+    tools       one fixed-size record per tool: name string id, then (offset, length) of the tool's
+                retrieval text, its prompt fragments and its full schema in the sections below
+    names       tool indices sorted by name, for binary-search lookup
+    retrieval   the text the TF-IDF index is fitted on (build_tool_text)
+    fragments   pre-rendered prompt blocks (full, compact and update-prompt JSON)
+    schema      the complete tool dicts in a tagged binary encoding over the interned strings
+
+BinaryCatalog exposes the same interface as ToolCatalog (tools, by_name, version, index, get,
+fragment), so get_catalog() can serve it when MATE_CATALOG_FORMAT=binary. A compiled catalog is
+immutable: recompile (and restart workers) to pick up edits.
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from pathlib import Path
+
+from core.tool_index import ToolIndex, build_tool_text, catalog_hash
+
+BINARY_CATALOG_PATH = Path(__file__).parent.parent / 'data' / 'cache' / 'function_tools.mcat'
+DECODE_CACHE_SIZE = 4096  # Decoded tool dicts kept per catalog
+
+MAGIC = b'MATECAT\x00'
+FORMAT_VERSION = 1
+SECTIONS = ('strings_index', 'strings', 'tools', 'names', 'retrieval', 'fragments', 'schema')
+FRAGMENT_KINDS = ('full', 'compact', 'update')
+_HEADER = struct.Struct('<8sIIIQQ64s' + 'QQ' * len(SECTIONS))
+# name string id, then (offset, length) for retrieval text, each fragment kind and the schema
+_TOOL_RECORD = struct.Struct('<I' + 'QI' * (2 + len(FRAGMENT_KINDS)))
+_U32 = struct.Struct('<I')
+_U32_PAIR = struct.Struct('<II')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+
+
+def _fragment_renderers():
+    """Renderers whose output is precompiled, in FRAGMENT_KINDS order."""
+    from core.prompt_builder import format_tool_description, format_tool_description_compact
+    from core.update_prompt_builder import UpdatePromptBuilder
+    return (format_tool_description, format_tool_description_compact, UpdatePromptBuilder.compact_tool_json)
+
+
+class _StringPool:
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, text):
+        sid = self.ids.get(text)
+        if sid is None:
+            sid = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return sid
+
+
+def _encode_value(value, pool, out):
+    """Append the tagged encoding of a JSON value to the bytearray `out`."""
+    if value is None:
+        out += b'N'
+    elif value is True:
+        out += b'T'
+    elif value is False:
+        out += b'F'
+    elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        out += b'I' + _I64.pack(value)
+    elif isinstance(value, float):
+        out += b'D' + _F64.pack(value)
+    elif isinstance(value, str):
+        out += b'S' + _U32.pack(pool.intern(value))
+    elif isinstance(value, list):
+        out += b'L' + _U32.pack(len(value))
+        for item in value:
+            _encode_value(item, pool, out)
+    elif isinstance(value, dict):
+        out += b'M' + _U32.pack(len(value))
+        for key, item in value.items():
+            out += _U32.pack(pool.intern(key))
+            _encode_value(item, pool, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} in a binary catalog.")
+
+
+def compile_catalog(tools, out_path=None, source_stat=(0, 0)):
+    """
+    Write a binary catalog for a list of tool dicts.
+    Args:
+        tools (list): Tool dicts, in catalog order. Names must be unique.
+        out_path (str or Path): Output file (optional). Defaults to 'data/cache/function_tools.mcat'.
+        source_stat (tuple): (size, mtime_ns) of the JSON it was compiled from, for staleness checks.
+    Returns:
+        Path: The written file. It is replaced atomically, so open readers keep their old mapping.
+    """
+    out_path = Path(out_path or BINARY_CATALOG_PATH)
+    renderers = _fragment_renderers()
+    pool = _StringPool()
+    retrieval, fragments, schema = bytearray(), bytearray(), bytearray()
+    records = bytearray()
+    names = {}
+    for i, tool in enumerate(tools):
+        name = tool.get('name')
+        if not isinstance(name, str) or name in names:
+            raise ValueError(f"Tool {i} has a missing or duplicate name: {name!r}")
+        names[name] = i
+        fields = [pool.intern(name)]
+        for section, text in [(retrieval, build_tool_text(tool))] + [(fragments, render(tool)) for render in renderers]:
+            data = text.encode('utf-8')
+            fields += [len(section), len(data)]
+            section += data
+        start = len(schema)
+        _encode_value(tool, pool, schema)
+        fields += [start, len(schema) - start]
+        records += _TOOL_RECORD.pack(*fields)
+
+    string_data = bytearray()
+    string_index = bytearray()
+    for text in pool.strings:
+        string_index += _U32.pack(len(string_data))
+        string_data += text.encode('utf-8')
+    string_index += _U32.pack(len(string_data))
+    name_order = b''.join(_U32.pack(names[name]) for name in sorted(names))
+
+    blobs = [string_index, string_data, records, name_order, retrieval, fragments, schema]
+    offsets, position = [], _HEADER.size
+    for blob in blobs:
+        offsets += [position, len(blob)]
+        position += len(blob)
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(tools), len(pool.strings), source_stat[0], source_stat[1],
+        catalog_hash(tools).encode('ascii'), *offsets,
+    )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def compile_json(json_path=None, out_path=None):
+    """Compile a tool JSON file (defaults to data/function_tools.json) into a binary catalog."""
+    import json
+    from core.tool_catalog import TOOLS_PATH
+    json_path = Path(json_path or TOOLS_PATH)
+    stat = json_path.stat()
+    with open(json_path, 'r', encoding='utf-8') as f:
+        tools = json.load(f)
+    return compile_catalog(tools, out_path, (stat.st_size, stat.st_mtime_ns))
+
+
+class LazyTools(Sequence):
+    """Read-only list view of a BinaryCatalog's tools; each tool dict is decoded when accessed."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __len__(self):
+        return self.catalog.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.catalog.tool(j) for j in range(*i.indices(self.catalog.count))]
+        if i < 0:
+            i += self.catalog.count
+        if not 0 <= i < self.catalog.count:
+            raise IndexError(i)
+        return self.catalog.tool(i)
+
+    def names(self):
+        """Tool names in catalog order, without decoding the tools."""
+        return [self.catalog.name(i) for i in range(self.catalog.count)]
+
+
+class LazyToolsByName(Mapping):
+    """Read-only name -> tool dict mapping over a BinaryCatalog (binary search on the name index)."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __getitem__(self, name):
+        i = self.catalog.index_of(name)
+        if i is None:
+            raise KeyError(name)
+        return self.catalog.tool(i)
+
+    def __contains__(self, name):
+        return self.catalog.index_of(name) is not None
+
+    def __iter__(self):
+        return (self.catalog.name(i) for i in range(self.catalog.count))
+
+    def __len__(self):
+        return self.catalog.count
+
+
+class BinaryCatalog:
+    """
+    Memory-mapped reader for a compiled catalog.
+    Attributes:
+        tools (LazyTools): List view of the tools, in catalog order.
+        by_name (LazyToolsByName): Mapping view keyed by tool name.
+        version (str): catalog_hash of the source tool list (same value as ToolCatalog.version).
+        source_stat (tuple): (size, mtime_ns) of the JSON file it was compiled from.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or BINARY_CATALOG_PATH)
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = _HEADER.unpack_from(self._mm, 0)
+        magic, format_version, self.count, self._string_count, size, mtime_ns, version = fields[:7]
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a version {FORMAT_VERSION} binary catalog; recompile it.")
+        self.source_stat = (size, mtime_ns)
+        self.version = version.decode('ascii')
+        self._sections = {name: (fields[7 + 2 * k], fields[8 + 2 * k]) for k, name in enumerate(SECTIONS)}
+        self.tools = LazyTools(self)
+        self.by_name = LazyToolsByName(self)
+        self._decoded = OrderedDict()
+        self._fragments = {}
+        self._renderer_kinds = None
+        self._index = None
+        self._lock = threading.RLock()
+        self.string = lru_cache(maxsize=65536)(self._read_string)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+
+    # Low-level access
+
+    def _read_string(self, sid):
+        start, end = _U32_PAIR.unpack_from(self._mm, self._sections['strings_index'][0] + 4 * sid)
+        base = self._sections['strings'][0]
+        return self._mm[base + start:base + end].decode('utf-8')
+
+    def _record(self, i):
+        return _TOOL_RECORD.unpack_from(self._mm, self._sections['tools'][0] + i * _TOOL_RECORD.size)
+
+    def _slice(self, section, offset, length):
+        base = self._sections[section][0]
+        return self._mm[base + offset:base + offset + length]
+
+    def name(self, i):
+        return self.string(_U32.unpack_from(self._mm, self._sections['tools'][0] + i * _TOOL_RECORD.size)[0])
+
+    def index_of(self, name):
+        """Return the catalog index of the tool with this name, or None."""
+        base = self._sections['names'][0]
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = _U32.unpack_from(self._mm, base + 4 * mid)[0]
+            candidate = self.name(i)
+            if candidate == name:
+                return i
+            if candidate < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def retrieval_text(self, i):
+        record = self._record(i)
+        return self._slice('retrieval', record[1], record[2]).decode('utf-8')
+
+    def retrieval_texts(self):
+        """Retrieval text of every tool, in catalog order."""
+        return [self.retrieval_text(i) for i in range(self.count)]
+
+    def prompt_fragment(self, i, kind='full'):
+        """Precompiled prompt block of tool i; kind is 'full', 'compact' or 'update'."""
+        k = FRAGMENT_KINDS.index(kind)
+        record = self._record(i)
+        return self._slice('fragments', record[3 + 2 * k], record[4 + 2 * k]).decode('utf-8')
+
+    def _decode(self, buf, pos):
+        tag = buf[pos]
+        pos += 1
+        if tag == 0x53:  # 'S'
+            return self.string(_U32.unpack_from(buf, pos)[0]), pos + 4
+        if tag == 0x4D:  # 'M'
+            count = _U32.unpack_from(buf, pos)[0]
+            pos += 4
+            value = {}
+            for _ in range(count):
+                key = self.string(_U32.unpack_from(buf, pos)[0])
+                value[key], pos = self._decode(buf, pos + 4)
+            return value, pos
+        if tag == 0x4C:  # 'L'
+            count = _U32.unpack_from(buf, pos)[0]
+            pos += 4
+            value = []
+            for _ in range(count):
+                item, pos = self._decode(buf, pos)
+                value.append(item)
+            return value, pos
+        if tag == 0x49:  # 'I'
+            return _I64.unpack_from(buf, pos)[0], pos + 8
+        if tag == 0x44:  # 'D'
+            return _F64.unpack_from(buf, pos)[0], pos + 8
+        if tag == 0x4E:
+            return None, pos
+        if tag == 0x54:
+            return True, pos
+        if tag == 0x46:
+            return False, pos
+        raise ValueError(f"Corrupt binary catalog {self.path}: unknown tag {tag!r}")
+
+    # ToolCatalog interface
+
+    def tool(self, i):
+        """Decode tool i (cached; treat the returned dict as read-only)."""
+        with self._lock:
+            tool = self._decoded.get(i)
+            if tool is not None:
+                self._decoded.move_to_end(i)
+                return tool
+        record = self._record(i)
+        tool, _ = self._decode(self._slice('schema', record[-2], record[-1]), 0)
+        with self._lock:
+            self._decoded[i] = tool
+            while len(self._decoded) > DECODE_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        return tool
+
+    def get(self, name):
+        """Return the tool dict with this name, or None."""
+        i = self.index_of(name)
+        return None if i is None else self.tool(i)
+
+    def maybe_refresh(self):
+        """Compiled catalogs are immutable; recompile and restart to pick up edits."""
+        return False
+
+    @property
+    def index(self):
+        """The retrieval ToolIndex, loaded from disk or fitted on the precompiled retrieval texts."""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index = ToolIndex.load(self.tools, self.version)
+                    if index is None:
+                        index = ToolIndex.build(self.tools, self.version, texts=self.retrieval_texts())
+                        try:
+                            index.save()
+                        except OSError:
+                            pass
+                    self._index = index
+        return self._index
+
+    def fragment(self, tool, renderer):
+        """
+        Return renderer(tool). The prompt builders' renderers are served from the precompiled
+        fragments section; any other renderer is called once per tool and cached.
+        """
+        if self._renderer_kinds is None:
+            self._renderer_kinds = dict(zip(_fragment_renderers(), FRAGMENT_KINDS))
+        name = tool.get('name')
+        i = self.index_of(name) if isinstance(name, str) else None
+        if i is None:
+            return renderer(tool)
+        kind = self._renderer_kinds.get(renderer)
+        if kind is not None:
+            return self.prompt_fragment(i, kind)
+        key = (name, renderer)
+        text = self._fragments.get(key)
+        if text is None:
+            text = self._fragments[key] = renderer(tool)
+        return text
+
+
+def load_binary_catalog(path=None, json_path=None, compile_if_stale=True):
+    """
+    Open the compiled catalog, (re)compiling it first if it is missing or older than the JSON file.
+    Args:
+        path (str or Path): Binary catalog (optional). Defaults to 'data/cache/function_tools.mcat'.
+        json_path (str or Path): Source JSON (optional). Defaults to 'data/function_tools.json'.
+        compile_if_stale (bool): Set to False to open the file as-is (e.g. when the JSON is not deployed).
+    Returns:
+        BinaryCatalog: The opened catalog.
+    """
+    from core.tool_catalog import TOOLS_PATH
+    path = Path(path or BINARY_CATALOG_PATH)
+    json_path = Path(json_path or TOOLS_PATH)
+    if compile_if_stale and json_path.exists():
+        stat = json_path.stat()
+        catalog = BinaryCatalog(path) if path.exists() else None
+        if catalog is not None and catalog.source_stat == (stat.st_size, stat.st_mtime_ns):
+            return catalog
+        if catalog is not None:
+            catalog.close()
+        compile_json(json_path, path)
+    return BinaryCatalog(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or inspect the binary tool catalog.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    compile_parser = sub.add_parser('compile', help="Compile the tool JSON into a binary catalog.")
+    compile_parser.add_argument('--input', default=None, help="Tool JSON (defaults to data/function_tools.json).")
+    compile_parser.add_argument('--output', default=None, help="Output file (defaults to data/cache/function_tools.mcat).")
+    info_parser = sub.add_parser('info', help="Print a compiled catalog's header and section sizes.")
+    info_parser.add_argument('path', nargs='?', default=None)
+    args = parser.parse_args()
+    if args.command == 'compile':
+        target = compile_json(args.input, args.output)
+        print(f"Wrote {BinaryCatalog(target).count} tools to {target} ({target.stat().st_size} bytes)")
+    else:
+        catalog = BinaryCatalog(args.path)
+        print(f"{catalog.path}: {catalog.count} tools, {catalog._string_count} strings, version {catalog.version[:12]}")
+        for name in SECTIONS:
+            print(f"  {name:<14} {catalog._sections[name][1]:>10} bytes")
+
+
+if __name__ == "__main__":
+    main()
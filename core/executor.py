@@ -0,0 +1,286 @@
+"""
+Plan execution.
+A plan is turned into a dependency DAG from its dataflow (core.plan_validator.input_bindings): a step
+waits only for the steps whose outputs it consumes, so independent branches run concurrently on a
+thread pool. Tool names are mapped to Python callables through a ToolRegistry. Each step gets an
+optional timeout and retries with exponential backoff, and results of tools registered as cacheable
+are memoized by a hash of the tool name and resolved inputs.
+
+Tool callables receive the step's resolved inputs as keyword arguments and return either a dict of
+outputs (keyed by the tool's output names) or, for a tool with a single output, the bare value.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core.plan_validator import PLACEHOLDERS, input_bindings, is_required, step_dependencies
+from core.tool_catalog import get_catalog
+
+PENDING, SUCCEEDED, FAILED, SKIPPED = 'pending', 'succeeded', 'failed', 'skipped'
+
+
+class ToolRegistry:
+    """
+    Maps catalog tool names to Python callables.
+    Register with registry.register('read_pdf_tool', func) or as a decorator:
+        @registry.register('read_pdf_tool')
+        def read_pdf(file_path): ...
+    """
+
+    def __init__(self):
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, func=None, cacheable=False):
+        """
+        Register a callable for a tool.
+        Args:
+            name (str): Catalog tool name.
+            func (callable): The implementation (omit to use as a decorator).
+            cacheable (bool): Whether results may be memoized. Off by default; pass True only for pure
+                              tools, since a memoized tool with side effects (sending email, writing
+                              files) would not run again.
+        """
+        def decorator(f):
+            with self._lock:
+                self._tools[name] = (f, cacheable)
+            return f
+
+        return decorator(func) if func is not None else decorator
+
+    def unregister(self, name):
+        with self._lock:
+            self._tools.pop(name, None)
+
+    def get(self, name):
+        """Return (callable, cacheable) for a tool, or None if it has no implementation."""
+        return self._tools.get(name)
+
+    def names(self):
+        return sorted(self._tools)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+
+class StepMemo:
+    """
+    Thread-safe LRU of step results keyed by a hash of the tool name and its resolved inputs.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool_name, inputs):
+        payload = json.dumps([tool_name, inputs], sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, outputs):
+        with self._lock:
+            self._entries[key] = outputs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StepError(Exception):
+    """A step could not run (no implementation, unresolved input, bad return value)."""
+
+
+class PlanExecutor:
+    """
+    Runs plans as DAGs on a thread pool.
+    Args:
+        registry (ToolRegistry): Tool implementations (optional). Defaults to the shared registry.
+        max_workers (int): Steps run concurrently.
+        step_timeout (float): Seconds before an attempt is abandoned (optional). The abandoned call is
+                              not interrupted, so it keeps its worker until it returns.
+        retries (int): Extra attempts after a failure or timeout.
+        retry_backoff (float): Delay before the first retry; doubles on each further retry.
+        memo (StepMemo): Result cache (optional). Defaults to the shared memo; pass False to disable.
+        tools_by_name (dict): Tool name -> tool dict (optional). Defaults to the shared catalog.
+    """
+
+    def __init__(self, registry=None, max_workers=8, step_timeout=None, retries=0, retry_backoff=0.5,
+                 memo=None, tools_by_name=None):
+        self.registry = registry if registry is not None else get_registry()
+        self.max_workers = max_workers
+        self.step_timeout = step_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.memo = get_step_memo() if memo is None else (memo or None)
+        self.tools_by_name = tools_by_name
+
+    def run(self, plan):
+        """
+        Execute a plan.
+        Args:
+            plan (list): Plan steps ({"function", "inputs"} dicts).
+        Returns:
+            list: One result dict per step with 'status' ('succeeded', 'failed' or 'skipped'), 'outputs',
+                  'error', 'attempts', 'cached' and 'elapsed' (seconds).
+        """
+        tools_by_name = self.tools_by_name if self.tools_by_name is not None else get_catalog().by_name
+        bindings = input_bindings(plan, tools_by_name)
+        depends_on = step_dependencies(plan, bindings=bindings)
+        dependents = [[] for _ in plan]
+        for i, sources in enumerate(depends_on):
+            for source in sources:
+                dependents[source].append(i)
+        results = [
+            {'status': PENDING, 'outputs': None, 'error': None, 'attempts': 0, 'cached': False, 'elapsed': 0.0}
+            for _ in plan
+        ]
+        waiting = [len(sources) for sources in depends_on]
+        running = {}  # future -> (step index, attempt start time, memo key)
+
+        def finish(i, status, outputs=None, error=None):
+            results[i].update(status=status, outputs=outputs, error=error)
+            for child in dependents[i]:
+                if status != SUCCEEDED:
+                    if results[child]['status'] == PENDING:
+                        finish(child, SKIPPED, error=f"Step {i + 1} did not succeed.")
+                    continue
+                waiting[child] -= 1
+                if waiting[child] == 0 and results[child]['status'] == PENDING:
+                    start(child)
+
+        def start(i, delay=0.0):
+            step = plan[i]
+            try:
+                func, cacheable, tool, inputs = self._prepare(step, bindings[i], results, tools_by_name)
+            except StepError as e:
+                finish(i, FAILED, error=str(e))
+                return
+            key = StepMemo.make_key(tool['name'], inputs) if self.memo is not None and cacheable else None
+            if key is not None:
+                cached = self.memo.get(key)
+                if cached is not None:
+                    results[i]['cached'] = True
+                    finish(i, SUCCEEDED, outputs=cached)
+                    return
+            results[i]['attempts'] += 1
+            future = pool.submit(self._call, func, tool, inputs, delay)
+            running[future] = (i, time.monotonic() + delay, key)
+
+        def retry_or_fail(i, error):
+            attempt = results[i]['attempts']
+            if attempt <= self.retries:
+                start(i, delay=self.retry_backoff * (2 ** (attempt - 1)))
+            else:
+                finish(i, FAILED, error=error)
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for i in range(len(plan)):
+                if waiting[i] == 0 and results[i]['status'] == PENDING:
+                    start(i)
+            while running:
+                wait_for = None
+                if self.step_timeout is not None:
+                    deadline = min(started for _, started, _ in running.values()) + self.step_timeout
+                    wait_for = max(0.0, deadline - time.monotonic())
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, started, key = running.pop(future)
+                    results[i]['elapsed'] += max(0.0, time.monotonic() - started)
+                    try:
+                        outputs = future.result()
+                    except Exception as e:
+                        retry_or_fail(i, f"{type(e).__name__}: {e}")
+                        continue
+                    if key is not None:
+                        self.memo.set(key, outputs)
+                    finish(i, SUCCEEDED, outputs=outputs)
+                if self.step_timeout is not None:
+                    now = time.monotonic()
+                    for future, (i, started, _) in list(running.items()):
+                        if now - started > self.step_timeout and not future.done():
+                            running.pop(future)
+                            future.cancel()
+                            results[i]['elapsed'] += now - started
+                            retry_or_fail(i, f"Timed out after {self.step_timeout}s")
+        finally:
+            # Do not wait for abandoned (timed-out) calls
+            pool.shutdown(wait=False)
+        return results
+
+    def _prepare(self, step, step_bindings, results, tools_by_name):
+        """Resolve a step's tool, implementation and input values from literals and upstream outputs."""
+        func_name = step.get('function') if isinstance(step, dict) else None
+        tool = tools_by_name.get(func_name)
+        if tool is None:
+            raise StepError(f"'{func_name}' is not a known tool.")
+        entry = self.registry.get(func_name)
+        if entry is None:
+            raise StepError(f"No implementation is registered for '{func_name}'.")
+        func, cacheable = entry
+        literal_inputs = step.get('inputs') if isinstance(step.get('inputs'), dict) else {}
+        schema = tool.get('input') if isinstance(tool.get('input'), dict) else {}
+        inputs = {}
+        for name in set(literal_inputs) | set(step_bindings):
+            if name in step_bindings:
+                source, field, _ = step_bindings[name]
+                outputs = results[source]['outputs'] or {}
+                if field is None:
+                    inputs[name] = next(iter(outputs.values())) if len(outputs) == 1 else outputs
+                elif field in outputs:
+                    inputs[name] = outputs[field]
+                else:
+                    raise StepError(f"Step {source + 1} did not produce output '{field}' for input '{name}'.")
+            elif literal_inputs[name] not in PLACEHOLDERS:
+                inputs[name] = literal_inputs[name]
+            elif is_required(schema.get(name)):
+                raise StepError(f"Input '{name}' of '{func_name}' has no value.")
+        for name, details in schema.items():
+            if name not in inputs and name not in literal_inputs and is_required(details):
+                raise StepError(f"Input '{name}' of '{func_name}' has no value.")
+        return func, cacheable, tool, inputs
+
+    @staticmethod
+    def _call(func, tool, inputs, delay):
+        if delay:
+            time.sleep(delay)
+        value = func(**inputs)
+        output_names = list(tool.get('output') or {})
+        if isinstance(value, dict) and (not output_names or set(value) & set(output_names)):
+            return value
+        if len(output_names) == 1:
+            return {output_names[0]: value}
+        raise StepError(f"'{tool['name']}' must return a dict of its outputs {output_names}.")
+
+
+_registry = ToolRegistry()
+_step_memo = StepMemo()
+
+
+def get_registry():
+    """Return the shared ToolRegistry."""
+    return _registry
+
+
+def get_step_memo():
+    """Return the shared StepMemo."""
+    return _step_memo
+
+
+def execute_plan(plan, **kwargs):
+    """Run a plan with a PlanExecutor built from kwargs; see PlanExecutor.run for the result format."""
+    return PlanExecutor(**kwargs).run(plan)
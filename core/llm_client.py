@@ -0,0 +1,164 @@
+"""
+HTTP client for the Gemini generateContent API.
+One client keeps a pooled keep-alive requests.Session, applies connect/read timeouts, retries 429/5xx
+and connection errors with jittered exponential backoff, and caps concurrent requests.
+It has a sync entry point (generate), an asyncio one (agenerate) and a streaming one
+(stream_generate). base_url can point at a local stub server for tests.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiClient:
+    """
+    Pooled, retrying client for one Gemini model.
+    """
+
+    def __init__(self, api_key, model="gemini-2.0-flash", base_url=DEFAULT_BASE_URL, connect_timeout=5.0,
+                 read_timeout=60.0, max_retries=3, backoff_base=0.5, backoff_max=8.0, max_concurrency=8,
+                 response_hook=None):
+        """
+        Args:
+            api_key (str): Gemini API key, sent as the 'key' query parameter.
+            model (str): Model name used in the endpoint path.
+            base_url (str): API root; point it at a local stub server for tests.
+            connect_timeout (float): Seconds to wait for a connection.
+            read_timeout (float): Seconds to wait for the response.
+            max_retries (int): Retries after the first attempt for retryable failures.
+            backoff_base (float): First backoff ceiling in seconds; doubles on every retry.
+            backoff_max (float): Upper bound for any single backoff.
+            max_concurrency (int): Maximum in-flight requests across threads (also the pool size).
+            response_hook (callable): Called as response_hook(prompt, status_code, text, elapsed) after
+                                      the final attempt of every call (optional).
+        """
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.response_hook = response_hook
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def endpoint(self, method="generateContent"):
+        """Return the URL for a model method (without the API key)."""
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def generate(self, prompt):
+        """
+        Send a prompt and return the model's response text.
+        Args:
+            prompt (str): The prompt to send to Gemini.
+        Returns:
+            str: The model's response text.
+        Raises:
+            RuntimeError: On a non-200 response after retries, or an unexpected response body.
+        """
+        start = time.perf_counter()
+        with self._semaphore:
+            response = self._post("generateContent", self._payload(prompt))
+        if self.response_hook is not None:
+            self.response_hook(prompt, response.status_code, response.text, time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"Gemini API error: {response.status_code} {response.text}")
+        return self.parse_response(response.json())
+
+    async def agenerate(self, prompt):
+        """
+        Async version of generate(). The blocking request runs in a worker thread and shares this
+        client's connection pool and concurrency limit, so the event loop is never blocked.
+        """
+        return await asyncio.to_thread(self.generate, prompt)
+
+    def stream_generate(self, prompt):
+        """
+        Send a prompt to the streaming endpoint and yield response text chunks as they arrive.
+        Retries only happen before the first byte of a response; the stream itself is not resumed.
+        Args:
+            prompt (str): The prompt to send to Gemini.
+        Yields:
+            str: Consecutive pieces of the model's response text.
+        Raises:
+            RuntimeError: On a non-200 response after retries.
+        """
+        start = time.perf_counter()
+        chunks = []
+        with self._semaphore:
+            response = self._post("streamGenerateContent", self._payload(prompt), params={"alt": "sse"}, stream=True)
+            try:
+                if response.status_code != 200:
+                    if self.response_hook is not None:
+                        self.response_hook(prompt, response.status_code, response.text, time.perf_counter() - start)
+                    raise RuntimeError(f"Gemini API error: {response.status_code} {response.text}")
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[len("data:"):])
+                    for candidate in event.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                chunks.append(part["text"])
+                                yield part["text"]
+            finally:
+                response.close()
+        if self.response_hook is not None:
+            self.response_hook(prompt, response.status_code, ''.join(chunks), time.perf_counter() - start)
+
+    @staticmethod
+    def _payload(prompt):
+        return {"contents": [{"parts": [{"text": prompt}]}]}
+
+    @staticmethod
+    def parse_response(result):
+        """Return the text of the first candidate in a generateContent response body."""
+        try:
+            return result["candidates"][0]["content"]["parts"][0]["text"]
+        except Exception:
+            raise RuntimeError(f"Unexpected Gemini API response: {result}")
+
+    def _post(self, method, payload, params=None, stream=False):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    self.endpoint(method), params={"key": self.api_key, **(params or {})}, json=payload,
+                    timeout=self.timeout, stream=stream,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                if retry_after and retry_after.isdigit():
+                    time.sleep(min(float(retry_after), self.backoff_max))
+                    attempt += 1
+                    continue
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _backoff(self, attempt):
+        # Full jitter: a uniform delay up to an exponentially growing ceiling
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
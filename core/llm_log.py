@@ -0,0 +1,236 @@
+"""
+Structured logging of LLM calls.
+LLMCallLogger turns each call into one JSON line (timestamp, model, prompt hash, prompt/response
+sizes, latency, status and token counts) and hands it to a background thread through a bounded
+queue, so the request path never waits on disk. The log file rotates by size and age, keeping a
+fixed number of backups. Full prompts and responses are written only for a sampled fraction of
+calls, and every record passes through a redaction hook first; the default one strips API keys,
+which the Gemini client sends as a `key=` URL parameter and which can show up in error bodies.
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+LLM_LOG_PATH = Path(os.getenv('MATE_LLM_LOG', Path(__file__).parent.parent / 'data' / 'logs' / 'llm_calls.jsonl'))
+LLM_LOG_SAMPLE_RATE = float(os.getenv('MATE_LLM_LOG_SAMPLE_RATE', '0'))  # Fraction of calls logged with full payloads
+
+_SECRET_PATTERNS = (
+    re.compile(r'([?&]key=)[^&\s"\']+'),
+    re.compile(r'("?(?:api[_-]?key|x-goog-api-key)"?\s*[:=]\s*"?)[^&\s"\',]+', re.IGNORECASE),
+    re.compile(r'()AIza[0-9A-Za-z_\-]{35}'),  # Google API key format
+)
+
+
+def redact_secrets(text):
+    """Default redaction hook: mask API keys in URLs, key/value pairs and bare Google keys."""
+    if not isinstance(text, str):
+        return text
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(r'\1[REDACTED]', text)
+    return text
+
+
+def usage_from_response(text):
+    """
+    Token counts from a Gemini response body.
+    Returns:
+        dict or None: {'prompt_tokens', 'response_tokens', 'total_tokens'} from the body's usageMetadata,
+                      or None if the text is not a response body or carries no usage.
+    """
+    if not isinstance(text, str) or not text.lstrip().startswith('{'):
+        return None
+    try:
+        usage = json.loads(text).get('usageMetadata')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(usage, dict):
+        return None
+    return {
+        'prompt_tokens': usage.get('promptTokenCount'),
+        'response_tokens': usage.get('candidatesTokenCount'),
+        'total_tokens': usage.get('totalTokenCount'),
+    }
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for responses without usage metadata."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class LLMCallLogger:
+    """
+    Asynchronous JSONL sink for LLM call records.
+    Args:
+        path (str or Path): Log file (optional). Defaults to 'data/logs/llm_calls.jsonl'.
+        max_bytes (int): Rotate once the file reaches this size (0 disables size rotation).
+        max_age (float): Rotate once the file is this many seconds old (None disables time rotation).
+        backups (int): Rotated files kept as path.1 (newest) ... path.N.
+        sample_rate (float): Fraction of calls whose full prompt and response are logged.
+        redact (callable): Applied to every string field before it is written (None to disable).
+        queue_size (int): Records buffered for the writer; when full, new records are dropped and
+                          counted in stats() rather than blocking the caller.
+    """
+
+    def __init__(self, path=None, max_bytes=10 * 1024 * 1024, max_age=24 * 3600, backups=5,
+                 sample_rate=None, redact=redact_secrets, queue_size=10000):
+        self.path = Path(path or LLM_LOG_PATH)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.sample_rate = LLM_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.redact = redact
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._file = None
+        self._opened_at = None
+        self._counters = {'logged': 0, 'dropped': 0, 'rotations': 0, 'errors': 0}
+
+    def log_call(self, model, prompt, status_code, text, elapsed, **extra):
+        """
+        Queue one call record; returns immediately.
+        Args:
+            model (str): Model identifier.
+            prompt (str): The prompt that was sent.
+            status_code (int): HTTP status of the response.
+            text (str): Response body (or the streamed response text).
+            elapsed (float): Call latency in seconds.
+            **extra: Additional JSON-serializable fields for the record.
+        """
+        prompt = prompt or ''
+        text = text or ''
+        usage = usage_from_response(text) or {
+            'prompt_tokens': estimate_tokens(prompt), 'response_tokens': estimate_tokens(text),
+            'total_tokens': None, 'estimated': True,
+        }
+        record = {
+            'ts': time.time(),
+            'model': model,
+            'prompt_sha256': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            'prompt_chars': len(prompt),
+            'response_chars': len(text),
+            'latency_ms': round(elapsed * 1000, 1),
+            'status': status_code,
+            'tokens': usage,
+        }
+        record.update(extra)
+        if status_code != 200:
+            record['error'] = text[:500]
+        if self.sample_rate and random.random() < self.sample_rate:
+            record['prompt'] = prompt
+            record['response'] = text
+        self.log(record)
+
+    def log(self, record):
+        """Queue an arbitrary record dict."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._counters['dropped'] += 1
+
+    def flush(self, timeout=5.0):
+        """Block until every queued record is written (or the timeout passes)."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        """Write out the queue and stop the writer thread."""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        atexit.unregister(self.close)
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self):
+        return dict(self._counters, queued=self._queue.qsize())
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='llm-call-log', daemon=True)
+                    self._thread.start()
+                    # The writer is a daemon thread, so drain the queue before the interpreter exits
+                    atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    break
+                self._write(record)
+                # Flush only once the queue is drained, so a burst of calls costs one flush
+                if self._queue.empty() and self._file is not None:
+                    self._file.flush()
+            except Exception:
+                self._counters['errors'] += 1
+            finally:
+                self._queue.task_done()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record):
+        if self.redact is not None:
+            record = {key: self.redact(value) if isinstance(value, str) else value for key, value in record.items()}
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        self._maybe_rotate()
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._opened_at = os.path.getmtime(self.path) if self._file.tell() else time.time()
+        self._file.write(line)
+        self._counters['logged'] += 1
+
+    def _maybe_rotate(self):
+        if not self.path.exists():
+            return
+        size = self._file.tell() if self._file is not None else self.path.stat().st_size
+        if size == 0:
+            return
+        if self._opened_at is None:
+            self._opened_at = self.path.stat().st_mtime
+        too_big = self.max_bytes and size >= self.max_bytes
+        too_old = self.max_age is not None and time.time() - self._opened_at >= self.max_age
+        if not (too_big or too_old):
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.backups > 0:
+            for n in range(self.backups - 1, 0, -1):
+                older = self.path.with_name(f"{self.path.name}.{n}")
+                if older.exists():
+                    os.replace(older, self.path.with_name(f"{self.path.name}.{n + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._opened_at = None
+        self._counters['rotations'] += 1
+
+
+_llm_logger = None
+_llm_logger_lock = threading.Lock()
+
+
+def get_llm_logger():
+    """Return the process-wide LLMCallLogger, created on first use."""
+    global _llm_logger
+    if _llm_logger is None:
+        with _llm_logger_lock:
+            if _llm_logger is None:
+                _llm_logger = LLMCallLogger()
+    return _llm_logger
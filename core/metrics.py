@@ -0,0 +1,353 @@
+"""
+In-process metrics for the planning pipeline: counters, histograms and timing spans.
+Everything is aggregated in a process-wide MetricsRegistry and can be exported as Prometheus text,
+either to a file (write_prometheus) or over HTTP (start_metrics_server). Histograms keep Prometheus
+buckets for scraping plus a bounded window of recent observations, so p50/p95 per pipeline stage are
+available locally without a Prometheus server (stage_report).
+span() times one pipeline stage into the 'mate_stage_seconds' histogram and, when enabled, also
+emits an OpenTelemetry span (requires the optional opentelemetry-sdk and OTLP exporter packages).
+
+Environment:
+    MATE_METRICS_PORT: Serve /metrics on this port (see configure_exporters).
+    MATE_METRICS_FILE: Prometheus text file rewritten by write_metrics_file().
+    MATE_OTEL_ENDPOINT: OTLP/HTTP traces endpoint, e.g. http://localhost:4318/v1/traces.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILE_WINDOW = 2048  # Recent observations kept per label set for local percentiles
+STAGE_HISTOGRAM = 'mate_stage_seconds'
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {list(labelnames)}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    Usage: uses = registry.counter('mate_tool_uses_total', 'Tool uses', ['tool']); uses.inc(tool='send_sms_tool')
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation='', labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def items(self):
+        """Return [(labels dict, value)] for every label set seen so far."""
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def prometheus_lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """
+    Histogram with Prometheus buckets plus a window of recent observations for local quantiles.
+    Args:
+        buckets (tuple): Upper bounds, ascending; +Inf is implied.
+        window (int): Recent observations kept per label set for quantile().
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS, window=QUANTILE_WINDOW):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series = {}  # label key -> [bucket counts, sum, count, recent observations]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, deque(maxlen=self.window)]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q, **labels):
+        """
+        Quantile over the recent observation window (nearest-rank).
+        Returns:
+            float or None: None if nothing has been observed for these labels.
+        """
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if series is None:
+            return None
+        with self._lock:
+            recent = sorted(series[3])
+        if not recent:
+            return None
+        return recent[min(len(recent) - 1, max(0, int(round(q * len(recent))) - 1))]
+
+    def summary(self, **labels):
+        """Return {'count', 'sum', 'mean', 'p50', 'p95', 'p99'} for one label set (None if unseen)."""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if series is None:
+            return None
+        count, total = series[2], series[1]
+        return {
+            'count': count, 'sum': total, 'mean': total / count if count else 0.0,
+            'p50': self.quantile(0.5, **labels), 'p95': self.quantile(0.95, **labels), 'p99': self.quantile(0.99, **labels),
+        }
+
+    def label_sets(self):
+        with self._lock:
+            return [dict(zip(self.labelnames, key)) for key in self._series]
+
+    def prometheus_lines(self):
+        lines = []
+        with self._lock:
+            series = sorted((key, list(counts), total, count) for key, (counts, total, count, _) in self._series.items())
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named collection of metrics. counter() and histogram() return the existing metric when called
+    again with the same name, so modules can declare what they use without coordinating.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}.")
+            return metric
+
+    def counter(self, name, documentation='', labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render_prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            if metric.documentation:
+                lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.prometheus_lines())
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write render_prometheus() to a file atomically (e.g. for node_exporter's textfile collector)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide MetricsRegistry."""
+    return _metrics
+
+
+# OpenTelemetry (optional)
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def enable_opentelemetry(endpoint=None, service_name='toolmate'):
+    """
+    Also export span() timings as OpenTelemetry spans over OTLP/HTTP.
+    Args:
+        endpoint (str): Collector traces URL (optional). Defaults to MATE_OTEL_ENDPOINT, then the
+                        exporter's own default (http://localhost:4318/v1/traces).
+        service_name (str): Reported service.name.
+    Raises:
+        ImportError: If the opentelemetry packages are not installed.
+    """
+    global _tracer
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        raise ImportError(
+            "Tracing needs the OpenTelemetry packages: pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http"
+        ) from e
+    endpoint = endpoint or os.getenv('MATE_OTEL_ENDPOINT')
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint) if endpoint else OTLPSpanExporter()))
+    with _tracer_lock:
+        _tracer = provider.get_tracer('core.metrics')
+    return _tracer
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Time a pipeline stage into the 'mate_stage_seconds' histogram (label 'stage'), and emit an
+    OpenTelemetry span with the given attributes when tracing is enabled.
+    Usage:
+        with span('prompt_build', tools=len(relevant_tools)):
+            prompt = build_prompt(...)
+    """
+    histogram = _metrics.histogram(STAGE_HISTOGRAM, 'Duration of planning pipeline stages', ['stage'])
+    tracer = _tracer
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, stage=stage)
+        return
+    with tracer.start_as_current_span(stage, attributes=attributes):
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, stage=stage)
+
+
+def stage_report():
+    """Return {stage: {'count', 'sum', 'mean', 'p50', 'p95', 'p99'}} for every timed stage."""
+    histogram = _metrics.get(STAGE_HISTOGRAM)
+    if histogram is None:
+        return {}
+    return {labels['stage']: histogram.summary(**labels) for labels in histogram.label_sets()}
+
+
+# Exporters
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = _metrics
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of stderr
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """
+    Serve the shared registry at http://host:port/metrics from a daemon thread. Safe to call on every
+    Streamlit rerun: a port is only bound once per process.
+    """
+    with _servers_lock:
+        if port not in _servers:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name=f'metrics-{port}', daemon=True).start()
+            _servers[port] = server
+        return _servers[port]
+
+
+_configured = False
+
+
+def configure_exporters():
+    """
+    Start the exporters selected by the environment (MATE_METRICS_PORT, MATE_OTEL_ENDPOINT), once
+    per process.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    port = os.getenv('MATE_METRICS_PORT')
+    if port:
+        start_metrics_server(int(port))
+    if os.getenv('MATE_OTEL_ENDPOINT'):
+        enable_opentelemetry()
+
+
+def write_metrics_file(path=None):
+    """Write the shared registry to MATE_METRICS_FILE (or `path`); does nothing if neither is set."""
+    path = path or os.getenv('MATE_METRICS_FILE')
+    if path:
+        _metrics.write_prometheus(path)
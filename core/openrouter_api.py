@@ -1,43 +1,132 @@
 # NOTE: For open-source model usage (e.g., Mistral, LLaMA), see the 'mate_open_llm' folder for a local LLM integration example.
+import asyncio
 import os
-import requests
+import threading
 from pathlib import Path
-from dotenv import load_dotenv
+from core.llm_log import get_llm_logger
+from core.metrics import get_metrics
+from core.plan_parsing import extract_json_array
+from core.response_cache import get_response_cache, make_cache_key
+from core.tool_catalog import get_catalog
 
 DOTENV_PATH = Path(__file__).parent.parent / 'open.env'
-if DOTENV_PATH.exists():
-    load_dotenv(dotenv_path=DOTENV_PATH)
+GEMINI_MODEL = "gemini-2.0-flash"
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable not set. Please add it to open.env.")
+def get_api_key():
+    """
+    Return GEMINI_API_KEY, loading open.env on first use (nothing is read at import time).
+    Raises:
+        ValueError: If the key is set neither in the environment nor in open.env.
+    """
+    if not os.getenv("GEMINI_API_KEY") and DOTENV_PATH.exists():
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=DOTENV_PATH)
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set. Please add it to open.env.")
+    return api_key
 
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
 
-def call_gemini(prompt):
+def is_cacheable(text):
+    """
+    Whether a response may be cached: it must contain a non-empty JSON array of objects (a plan or a
+    list of patch operations). Anything else (prose, a truncated or unparseable plan) is not stored, so
+    a bad answer is not replayed for the cache's whole TTL, and a stored one is ignored on read.
+    """
+    return bool(extract_json_array(text))
+
+
+def call_gemini(prompt, use_cache=True):
     """
     Call the Gemini 2.0 Flash API with the given prompt and return the response.
+    Responses that contain a plan are cached (see is_cacheable), keyed on the model, the normalized
+    prompt and the tool-catalog version.
     Args:
         prompt (str): The prompt to send to Gemini.
+        use_cache (bool): Set to False to bypass the response cache (neither read nor written).
     Returns:
         str: The model's response text.
     """
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "contents": [
-            {"parts": [{"text": prompt}]}
-        ]
-    }
-    response = requests.post(GEMINI_API_URL, headers=headers, json=data)
-    
-    with open("gemini_debug.log", "a", encoding="utf-8") as logf:
-        logf.write(f"\n--- PROMPT ---\n{prompt}\n--- RESPONSE ({response.status_code}) ---\n{response.text}\n")
-    if response.status_code != 200:
-        raise RuntimeError(f"Gemini API error: {response.status_code} {response.text}")
-    result = response.json()
-    
-    try:
-        return result["candidates"][0]["content"]["parts"][0]["text"]
-    except Exception:
-        raise RuntimeError(f"Unexpected Gemini API response: {result}") 
\ No newline at end of file
+    if use_cache:
+        cache = get_response_cache()
+        cache_key = make_cache_key(GEMINI_MODEL, prompt, get_catalog().version)
+        cached = cache.get(cache_key)
+        if cached is not None and is_cacheable(cached):
+            return cached
+        text = _request_gemini(prompt)
+        if is_cacheable(text):
+            cache.set(cache_key, text)
+        return text
+    return _request_gemini(prompt)
+
+
+def _request_gemini(prompt):
+    return get_client().generate(prompt)
+
+
+def stream_gemini(prompt, use_cache=True):
+    """
+    Call Gemini's streaming endpoint and yield the response text in chunks as it is generated.
+    A cached response is yielded as a single chunk; a completed stream is stored in the cache if it
+    contains a plan (see is_cacheable).
+    Args:
+        prompt (str): The prompt to send to Gemini.
+        use_cache (bool): Set to False to bypass the response cache (neither read nor written).
+    Yields:
+        str: Consecutive pieces of the model's response text.
+    """
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cache_key = make_cache_key(GEMINI_MODEL, prompt, get_catalog().version)
+        cached = cache.get(cache_key)
+        if cached is not None and is_cacheable(cached):
+            yield cached
+            return
+    chunks = []
+    for chunk in get_client().stream_generate(prompt):
+        chunks.append(chunk)
+        yield chunk
+    text = ''.join(chunks)
+    if cache is not None and is_cacheable(text):
+        cache.set(cache_key, text)
+
+
+async def acall_gemini(prompt, use_cache=True):
+    """
+    Async version of call_gemini() for batch jobs and other asyncio callers.
+    """
+    return await asyncio.to_thread(call_gemini, prompt, use_cache)
+
+
+def _log_call(prompt, status_code, text, elapsed):
+    # Queued for a background writer (see core.llm_log); only hashes and sizes unless sampled
+    get_llm_logger().log_call(GEMINI_MODEL, prompt, status_code, text, elapsed)
+    metrics = get_metrics()
+    metrics.counter('mate_llm_calls_total', 'LLM API calls by HTTP status', ['model', 'status']).inc(
+        model=GEMINI_MODEL, status=status_code,
+    )
+    metrics.histogram('mate_llm_call_seconds', 'LLM API call latency', ['model']).observe(elapsed, model=GEMINI_MODEL)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide GeminiClient, created on first use (which is also when the API key is
+    resolved and the HTTP stack is imported). Set GEMINI_BASE_URL to point it at a local stub server.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from core.llm_client import DEFAULT_BASE_URL, GeminiClient
+                _client = GeminiClient(
+                    get_api_key(),
+                    model=GEMINI_MODEL,
+                    base_url=os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL),
+                    response_hook=_log_call,
+                )
+    return _client
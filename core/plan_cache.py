@@ -0,0 +1,289 @@
+"""
+Semantic plan cache: reuse a stored plan for a near-duplicate query instead of calling the LLM.
+Queries are compared by their relevance profile over the catalog: the query's TF-IDF scores against
+its top PLAN_CACHE_PROFILE_TOOLS tools (core.tool_filter.get_tool_index), as a normalised vector.
+Paraphrases that share few words but ask for the same tools ("summarize this CSV file and email it to
+my manager" / "parse the CSV file and send the summary to my manager by email") land close together:
+on paraphrases of the sample prompts this similarity was 0.84 or more, against at most 0.76 for
+queries that differ in one action (e.g. "... and send it via SMS"), while plain TF-IDF cosine scored
+some paraphrases below 0.6. A lookup is a hit when
+- the profile similarity to a stored query reaches `threshold`,
+- the entry was stored against the same catalog version,
+- every tool the stored plan uses is among the tools retrieved for the new query, and
+- the two retrieved tool sets overlap by at least `min_tool_overlap` (Jaccard; 1.0 = identical),
+- every concrete value the stored plan took from its query (emails, URLs, file names and paths,
+  numbers, quoted strings) also appears in the new query, since a relevance profile over the tools
+  cannot tell "email it to alice@example.com" from "email it to carol@x.io", and
+- the entry belongs to the same owner (the web app's chat history owner), so one user's file names
+  and addresses are never served to another.
+Entries are chat-history-style records ({'user_query', 'plan', 'reasoning', 'tool_names'}), bounded
+by an LRU and a TTL. Hit/miss/eviction counters are available from stats() and are also exported
+through core.metrics.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from core.metrics import get_metrics
+from core.tool_catalog import get_catalog
+
+PLAN_CACHE_THRESHOLD = float(os.getenv('MATE_PLAN_CACHE_THRESHOLD', '0.8'))
+PLAN_CACHE_MIN_TOOL_OVERLAP = float(os.getenv('MATE_PLAN_CACHE_MIN_TOOL_OVERLAP', '0.4'))
+PLAN_CACHE_PROFILE_TOOLS = 32  # Tools kept in a query's relevance profile
+
+LITERAL = re.compile(
+    r'"([^"]+)"|\'([^\']+)\'(?!\w)'  # Quoted strings
+    r'|([\w.+-]+@[\w-]+(?:\.[\w-]+)+'  # Emails
+    r'|https?://\S+'  # URLs
+    r'|[\w~./\\-]*[\w-]\.[A-Za-z0-9]{1,5}\b'  # File names and paths with an extension
+    r'|(?:[\w.~-]*[/\\][\w.~-]+)+'  # Paths without one
+    r'|\d+(?:[.,:/-]\d+)*)'  # Numbers, dates and times
+)
+
+
+def plan_tool_names(plan):
+    """Names of the tools a plan calls."""
+    return {step.get('function') for step in plan if isinstance(step, dict) and step.get('function')}
+
+
+def query_literals(text):
+    """Concrete values mentioned in a query (lower-cased): quoted strings, emails, URLs, paths and numbers."""
+    return {next(group for group in match.groups() if group).strip().lower() for match in LITERAL.finditer(text)}
+
+
+def _input_strings(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _input_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _input_strings(item)
+    elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        value = str(value).strip()
+        if value and value != '?' and not value.startswith('$'):
+            yield value.lower()
+
+
+def plan_literals(user_query, plan):
+    """
+    Concrete values from `user_query` that `plan` uses in its inputs; a plan served for another query
+    is only correct if that query mentions the same values.
+    """
+    values = [value for step in plan if isinstance(step, dict) for value in _input_strings(step.get('inputs', {}))]
+    return {literal for literal in query_literals(user_query) if any(literal in value for value in values)}
+
+
+class SemanticPlanCache:
+    """
+    Near-duplicate plan cache keyed by query vectors.
+    Args:
+        threshold (float): Minimum similarity between query relevance profiles for a hit.
+        min_tool_overlap (float): Minimum Jaccard overlap between the retrieved tool sets.
+        max_entries (int): Capacity; least recently used entries are evicted first.
+        ttl (float): Seconds an entry may be served (None for no expiry).
+    """
+
+    def __init__(self, threshold=None, min_tool_overlap=None, max_entries=1024, ttl=7 * 24 * 3600):
+        self.threshold = PLAN_CACHE_THRESHOLD if threshold is None else threshold
+        self.min_tool_overlap = PLAN_CACHE_MIN_TOOL_OVERLAP if min_tool_overlap is None else min_tool_overlap
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # normalized query -> entry dict
+        self._lock = threading.Lock()
+        self._generation = 0  # Bumped on every change, invalidating _stacked
+        self._stacked = None  # (generation, (catalog version, owner), entries, stacked query vectors)
+        self._counters = {
+            'hits': 0, 'misses': 0, 'tool_mismatches': 0, 'value_mismatches': 0, 'stores': 0, 'evictions': 0, 'expired': 0,
+        }
+        metrics = get_metrics()
+        self._lookups_metric = metrics.counter('mate_plan_cache_lookups_total', 'Semantic plan cache lookups', ['result'])
+        self._evictions_metric = metrics.counter('mate_plan_cache_evictions_total', 'Semantic plan cache evictions', ['reason'])
+
+    @staticmethod
+    def _key(query, owner):
+        return owner, ' '.join(query.lower().split())
+
+    @staticmethod
+    def _vectorize(query, tools):
+        """The query's relevance profile: its top tool scores as an L2-normalised sparse row over the tools."""
+        import numpy as np
+        from scipy import sparse
+        from core.tool_filter import get_tool_index
+        from core.tool_index import top_k
+        index = get_tool_index(tools)
+        top, scores = top_k((index.transform([query]) @ index.matrix.T).toarray(), PLAN_CACHE_PROFILE_TOOLS)
+        keep = scores[0] > 0
+        scores = scores[0][keep]
+        if scores.size:
+            scores = scores / np.linalg.norm(scores)
+        return sparse.csr_matrix((scores, (np.zeros(scores.size, dtype=np.intp), top[0][keep])), shape=(1, len(index.tools)))
+
+    def _count(self, result):
+        self._counters[result] += 1
+        self._lookups_metric.inc(result=result)
+
+    def lookup(self, user_query, relevant_tools, catalog_version=None, tools=None, owner=None):
+        """
+        Find a stored plan for a near-duplicate query.
+        Args:
+            user_query (str): The new query.
+            relevant_tools (list): Tool dicts retrieved for it.
+            catalog_version (str): Catalog version (optional). Defaults to the shared catalog's.
+            tools (list): Full tool list the query vector is computed against (optional). Defaults to
+                          the shared catalog.
+            owner (str): Only entries added for this owner can match (None for a single-user process).
+        Returns:
+            dict or None: A copy of the matching record plus 'similarity', or None on a miss.
+        """
+        catalog = get_catalog() if catalog_version is None or tools is None else None
+        catalog_version = catalog_version or catalog.version
+        retrieved = {tool['name'] for tool in relevant_tools}
+        candidates, matrix = self._candidates(catalog_version, owner)
+        if not candidates or not retrieved:
+            self._count('misses')
+            return None
+        vector = self._vectorize(user_query, tools if tools is not None else catalog.tools)
+        similarities = (vector @ matrix.T).toarray()[0]
+        literals = None
+        best, best_similarity, mismatch = None, self.threshold, 'misses'
+        for i in similarities.nonzero()[0]:
+            entry, similarity = candidates[i], float(similarities[i])
+            if similarity < best_similarity:
+                continue
+            stored = entry['tool_set']
+            overlap = len(stored & retrieved) / len(stored | retrieved)
+            if overlap < self.min_tool_overlap or not entry['plan_tools'] <= retrieved:
+                mismatch = 'tool_mismatches'
+                continue
+            if entry['literals']:
+                literals = query_literals(user_query) if literals is None else literals
+                if not entry['literals'] <= literals:
+                    mismatch = 'value_mismatches'
+                    continue
+            best, best_similarity = entry, similarity
+        if best is None:
+            self._count(mismatch)
+            return None
+        with self._lock:
+            if best['key'] in self._entries:
+                self._entries.move_to_end(best['key'])
+            best['hits'] += 1
+        self._count('hits')
+        return dict(best['record'], similarity=best_similarity)
+
+    def _candidates(self, catalog_version, owner):
+        """An owner's entries for a catalog version and their query vectors stacked into one matrix (rebuilt after changes)."""
+        scope = (catalog_version, owner)
+        with self._lock:
+            self._expire(time.time())
+            stacked = self._stacked
+            if stacked is not None and stacked[0] == self._generation and stacked[1] == scope:
+                return stacked[2], stacked[3]
+            entries = [
+                entry for entry in self._entries.values()
+                if entry['catalog_version'] == catalog_version and entry['owner'] == owner
+            ]
+            generation = self._generation
+        matrix = None
+        if entries:
+            from scipy import sparse
+            matrix = sparse.vstack([entry['vector'] for entry in entries]).tocsr()
+        with self._lock:
+            self._stacked = (generation, scope, entries, matrix)
+        return entries, matrix
+
+    def add(self, user_query, relevant_tools, plan, reasoning=None, catalog_version=None, tools=None, owner=None):
+        """Store a plan for an owner's query (replacing any entry for the same normalized query)."""
+        if not plan:
+            return
+        catalog = get_catalog() if catalog_version is None or tools is None else None
+        catalog_version = catalog_version or catalog.version
+        vector = self._vectorize(user_query, tools if tools is not None else catalog.tools)
+        if vector.nnz == 0:
+            return  # Nothing in the query maps to the tool vocabulary, so it can never match
+        tool_names = [tool['name'] for tool in relevant_tools]
+        key = self._key(user_query, owner)
+        entry = {
+            'key': key,
+            'owner': owner,
+            'literals': plan_literals(user_query, plan),
+            'vector': vector,
+            'catalog_version': catalog_version,
+            'tool_set': frozenset(tool_names),
+            'plan_tools': plan_tool_names(plan),
+            'record': {'user_query': user_query, 'plan': plan, 'reasoning': reasoning, 'tool_names': tool_names},
+            'created_at': time.time(),
+            'hits': 0,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._generation += 1
+            self._counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+                self._evictions_metric.inc(reason='capacity')
+
+    def warm_from_store(self, owner, store=None, limit=500):
+        """
+        Seed the cache with the latest plan version of an owner's most recent chats in a PlanStore.
+        Returns:
+            int: Number of entries added.
+        """
+        from core.plan_store import get_plan_store, resolve_tools
+        store = store or get_plan_store()
+        version = get_catalog().version
+        added = 0
+        for chat in store.list_chats(owner, limit=limit):
+            latest = store.get_version(owner, chat['id'], chat['num_versions'] - 1)
+            if latest is None or latest['catalog_version'] != version:
+                continue
+            self.add(
+                chat['user_query'], resolve_tools(latest['tool_names']), latest['plan'], latest['reasoning'], owner=owner,
+            )
+            added += 1
+        return added
+
+    def _expire(self, now):
+        if self.ttl is None:
+            return
+        expired = [key for key, entry in self._entries.items() if now - entry['created_at'] > self.ttl]
+        if expired:
+            self._generation += 1
+        for key in expired:
+            del self._entries[key]
+            self._counters['expired'] += 1
+            self._evictions_metric.inc(reason='ttl')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        """Counters plus current size, threshold and hit rate."""
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries))
+        lookups = stats['hits'] + stats['misses'] + stats['tool_mismatches'] + stats['value_mismatches']
+        stats.update(
+            threshold=self.threshold, min_tool_overlap=self.min_tool_overlap, max_entries=self.max_entries,
+            hit_rate=stats['hits'] / lookups if lookups else 0.0,
+        )
+        return stats
+
+
+_plan_cache = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache():
+    """Return the process-wide SemanticPlanCache, created on first use (see warm_from_store to seed it)."""
+    global _plan_cache
+    if _plan_cache is None:
+        with _plan_cache_lock:
+            if _plan_cache is None:
+                _plan_cache = SemanticPlanCache()
+    return _plan_cache
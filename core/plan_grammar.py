@@ -0,0 +1,287 @@
+"""
+Character-level grammar for plan JSON, used for constrained decoding.
+A plan is a JSON array of {"function": <name>, "inputs": {<key>: <value>, ...}} objects where the
+function must be one of the offered tools and every input key must come from that tool's 'input'
+schema (each key at most once). Input values may be any JSON value.
+PlanGrammar.advance() feeds text to an immutable-by-convention PlanState and returns the new state,
+or None as soon as the text can no longer be completed into a valid plan, so a decoder can test
+candidate tokens cheaply.
+"""
+import re
+
+WHITESPACE = ' \t\n\r'
+# The step object's fixed layout; whitespace is allowed before every item
+STEP_PROGRAM = (
+    ('lit', '"function"'), ('lit', ':'), ('name', None), ('lit', ','),
+    ('lit', '"inputs"'), ('lit', ':'), ('lit', '{'), ('inputs', None), ('lit', '}'),
+)
+_NUMBER_PREFIX = re.compile(r'-?(?:0|[1-9][0-9]*)?(?:(?<=[0-9])\.[0-9]*)?(?:(?<=[0-9])[eE][+-]?[0-9]*)?')
+_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?')
+_LITERALS = {'t': 'true', 'f': 'false', 'n': 'null'}
+
+
+class PlanState:
+    """
+    Position of a partial plan in the grammar. Treat instances as immutable: PlanGrammar.advance
+    works on a clone.
+    """
+    __slots__ = ('mode', 'pc', 'started', 'partial', 'function', 'used_keys', 'imode',
+                 'stack', 'vmode', 'escape')
+
+    def __init__(self):
+        self.mode = 'start'       # start, step, step_open, after_step, done
+        self.pc = 0               # Index into STEP_PROGRAM while mode == 'step'
+        self.started = False      # Whether the current program item has consumed a character
+        self.partial = ''         # Text of the current literal, name, key or number
+        self.function = None      # Tool name of the current step
+        self.used_keys = ()       # Input keys already written in the current step
+        self.imode = None         # Sub-state of the 'inputs' item
+        self.stack = ()           # Open containers of the current input value
+        self.vmode = None         # Sub-state of the current input value
+        self.escape = False       # Inside a string, after a backslash
+
+    def clone(self):
+        other = PlanState.__new__(PlanState)
+        for slot in PlanState.__slots__:
+            setattr(other, slot, getattr(self, slot))
+        return other
+
+
+class PlanGrammar:
+    """
+    Grammar for plans over a fixed set of tools.
+    Args:
+        tools (list): Tool dicts (name and 'input' schema) the plan may use.
+    """
+
+    def __init__(self, tools):
+        self.inputs = {}
+        for tool in tools:
+            schema = tool.get('input')
+            self.inputs[tool['name']] = tuple(schema) if isinstance(schema, dict) else ()
+
+    def initial(self):
+        return PlanState()
+
+    def is_complete(self, state):
+        """True once the plan array has been closed."""
+        return state is not None and state.mode == 'done'
+
+    def advance(self, state, text):
+        """
+        Feed text to a state.
+        Returns:
+            PlanState or None: The new state, or None if the text cannot continue a valid plan.
+        """
+        if state is None or not text:
+            return None
+        state = state.clone()
+        for ch in text:
+            if not self._step(state, ch):
+                return None
+        return state
+
+    # Top level: the array and the step objects
+
+    def _step(self, s, ch):
+        mode = s.mode
+        if mode == 'step':
+            return self._program(s, ch)
+        if ch in WHITESPACE:
+            return True
+        if mode == 'start':
+            if ch == '[':
+                s.mode = 'step_or_end'
+                return True
+            return False
+        if mode in ('step_or_end', 'step_open'):
+            if ch == '{':
+                s.mode, s.pc, s.started, s.partial = 'step', 0, False, ''
+                s.function, s.used_keys = None, ()
+                return True
+            if ch == ']' and mode == 'step_or_end':
+                s.mode = 'done'
+                return True
+            return False
+        if mode == 'after_step':
+            if ch == ',':
+                s.mode = 'step_open'
+                return True
+            if ch == ']':
+                s.mode = 'done'
+                return True
+            return False
+        return False  # 'done': nothing but whitespace may follow the array
+
+    def _next_item(self, s):
+        s.pc += 1
+        s.started, s.partial = False, ''
+        if s.pc == len(STEP_PROGRAM):
+            s.mode = 'after_step'
+        elif STEP_PROGRAM[s.pc][0] == 'inputs':
+            s.imode = 'key_or_close'
+
+    def _program(self, s, ch):
+        kind, literal = STEP_PROGRAM[s.pc]
+        if kind == 'inputs':
+            return self._inputs(s, ch)
+        if not s.started:
+            if ch in WHITESPACE:
+                return True
+            s.started = True
+            if kind == 'name':
+                return ch == '"'
+        if kind == 'lit':
+            s.partial += ch
+            if not literal.startswith(s.partial):
+                return False
+            if s.partial == literal:
+                self._next_item(s)
+            return True
+        # kind == 'name': the opening quote has been consumed
+        if ch == '"':
+            if s.partial not in self.inputs:
+                return False
+            s.function = s.partial
+            self._next_item(s)
+            return True
+        s.partial += ch
+        return any(name.startswith(s.partial) for name in self.inputs)
+
+    # The "inputs" object of a step
+
+    def _remaining_keys(self, s):
+        return [key for key in self.inputs.get(s.function, ()) if key not in s.used_keys]
+
+    def _inputs(self, s, ch):
+        imode = s.imode
+        if imode == 'key':
+            if ch == '"':
+                if s.partial not in self._remaining_keys(s):
+                    return False
+                s.used_keys += (s.partial,)
+                s.imode = 'colon'
+                return True
+            s.partial += ch
+            return any(key.startswith(s.partial) for key in self._remaining_keys(s))
+        if imode == 'value':
+            result = self._value(s, ch)
+            if result == 'reprocess':
+                s.imode = 'comma_or_close'
+                return self._inputs(s, ch)
+            if result == 'complete':
+                s.imode = 'comma_or_close'
+            return result is not None
+        if ch in WHITESPACE:
+            return True
+        if imode in ('key_or_close', 'key_start'):
+            if ch == '"' and self._remaining_keys(s):
+                s.imode, s.partial = 'key', ''
+                return True
+            if ch == '}' and imode == 'key_or_close':
+                self._next_item(s)
+                return True
+            return False
+        if imode == 'colon':
+            if ch == ':':
+                s.imode, s.vmode, s.stack, s.partial = 'value', 'value', (), ''
+                return True
+            return False
+        if imode == 'comma_or_close':
+            if ch == ',':
+                s.imode = 'key_start'
+                return True
+            if ch == '}':
+                self._next_item(s)
+                return True
+        return False
+
+    # Any JSON value (an input value)
+
+    def _complete_value(self, s):
+        if not s.stack:
+            return 'complete'
+        s.vmode = 'after'
+        return 'ok'
+
+    def _value(self, s, ch):
+        """
+        Consume one character of an input value.
+        Returns:
+            str or None: 'ok', 'complete' (the value ended with this character), 'reprocess' (the value
+            ended before this character, which belongs to the enclosing object) or None if invalid.
+        """
+        vmode = s.vmode
+        if vmode in ('string', 'okey'):
+            if s.escape:
+                s.escape = False
+            elif ch == '\\':
+                s.escape = True
+            elif ch == '"':
+                if vmode == 'okey':
+                    s.vmode = 'ocolon'
+                    return 'ok'
+                return self._complete_value(s)
+            elif ch < ' ':
+                return None  # Control characters must be escaped
+            return 'ok'
+        if vmode == 'number':
+            candidate = s.partial + ch
+            match = _NUMBER_PREFIX.match(candidate)
+            if match and match.end() == len(candidate):
+                s.partial = candidate
+                return 'ok'
+            if not _NUMBER.fullmatch(s.partial):
+                return None
+            result = self._complete_value(s)
+            if result == 'complete':
+                return 'reprocess'
+            return self._value(s, ch)
+        if vmode == 'literal':
+            if not s.partial.startswith(ch):
+                return None
+            s.partial = s.partial[1:]
+            return 'ok' if s.partial else self._complete_value(s)
+        if ch in WHITESPACE:
+            return 'ok'
+        if vmode == 'ocolon':
+            if ch == ':':
+                s.vmode = 'value'
+                return 'ok'
+            return None
+        if vmode == 'after':
+            top = s.stack[-1]
+            if ch == ',':
+                s.vmode = 'value' if top == '[' else 'okey_start'
+                return 'ok'
+            if ch == ('}' if top == '{' else ']'):
+                s.stack = s.stack[:-1]
+                return self._complete_value(s)
+            return None
+        if vmode in ('okey_or_close', 'okey_start'):
+            if ch == '"':
+                s.vmode = 'okey'
+                return 'ok'
+            if ch == '}' and vmode == 'okey_or_close':
+                s.stack = s.stack[:-1]
+                return self._complete_value(s)
+            return None
+        if vmode == 'value_or_close' and ch == ']':
+            s.stack = s.stack[:-1]
+            return self._complete_value(s)
+        # vmode in ('value', 'value_or_close'): start a new value
+        if ch == '"':
+            s.vmode = 'string'
+        elif ch == '[':
+            s.stack += ('[',)
+            s.vmode = 'value_or_close'
+        elif ch == '{':
+            s.stack += ('{',)
+            s.vmode = 'okey_or_close'
+        elif ch == '-' or ch in '0123456789':
+            s.vmode, s.partial = 'number', ch
+        elif ch in _LITERALS:
+            s.vmode, s.partial = 'literal', _LITERALS[ch][1:]
+        else:
+            return None
+        return 'ok'
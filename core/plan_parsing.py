@@ -0,0 +1,248 @@
+"""
+Parsing of plan JSON out of raw model output.
+extract_json_array finds the plan array in a complete response with a single linear scan, and
+StepStreamParser consumes a response chunk by chunk and returns each step object of the plan's
+JSON array as soon as its closing brace arrives, so steps can be shown while the model is still
+generating. Both planners (Gemini and the local LLM) use these.
+"""
+import json
+import re
+
+_STRUCTURAL = re.compile(r'[\[\]{}"\'\\\n]')
+_FIRST_CHAR = re.compile(r'\s*(.?)', re.S)
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_decoder = json.JSONDecoder()
+
+
+def _array_candidates(text):
+    """
+    Yield the arrays in `text` that may hold a plan, in a single forward scan.
+    Open brackets are kept on a stack, so an unbalanced '[' in prose ("[it's ok. Plan: [...]") never
+    hides a later array. Candidates are arrays that start with "[{" (a list of step objects) or are
+    empty; one nested in another "[{" array is only offered as a fallback for its enclosing array.
+    Quotes are only tracked inside brackets, so apostrophes in surrounding prose are ignored, single
+    quotes only delimit strings inside a "[{" array (a plan written with Python-style quotes), and a
+    string never spans a line break, since JSON strings cannot.
+    Yields:
+        tuple: (start, end, nested): the span of a candidate that no other candidate encloses, and the
+               spans of the "[{" arrays directly inside it. Arrays nested in a "[{" array that is never
+               closed (truncated output) come last, as (start, end, []).
+    """
+    stack = []  # [position, kind, nested spans] per open '[' (kind 'plan', 'empty' or 'list') or '{' ('object')
+    plans = []  # The open 'plan' entries of the stack
+    brackets = braces = 0
+    quote = None
+    skip_to = -1
+    for match in _STRUCTURAL.finditer(text):
+        pos = match.start()
+        if pos <= skip_to:
+            continue
+        ch = match.group()
+        if ch == '\n':
+            quote = None
+            continue
+        if quote is not None:
+            if ch == '\\':
+                skip_to = pos + 1
+            elif ch == quote:
+                quote = None
+            continue
+        if ch == '"' or ch == "'":
+            if stack and (ch == '"' or plans):
+                quote = ch
+        elif ch == '[':
+            first = _FIRST_CHAR.match(text, pos + 1).group(1)
+            entry = [pos, 'plan' if first == '{' else 'empty' if first == ']' else 'list', []]
+            stack.append(entry)
+            brackets += 1
+            if entry[1] == 'plan':
+                plans.append(entry)
+        elif ch == '{':
+            if stack:
+                stack.append([pos, 'object', None])
+                braces += 1
+        elif (ch == ']' and brackets) or (ch == '}' and braces):
+            # Pop to the matching opener, dropping any unclosed ones above it
+            while True:
+                start, kind, nested = stack.pop()
+                if kind == 'object':
+                    braces -= 1
+                else:
+                    brackets -= 1
+                    if kind == 'plan':
+                        plans.pop()
+                if (kind == 'object') == (ch == '}'):
+                    break
+            if kind not in ('plan', 'empty'):
+                continue
+            if not plans:
+                yield start, pos + 1, nested
+            elif kind == 'plan':
+                plans[-1][2].append((start, pos + 1))
+    for start, end in sorted(span for entry in plans for span in entry[2]):
+        yield start, end, []
+
+
+def _decode_array(text, start, end, repair):
+    """Decode the array at text[start:end] (None if it is not a list, or not a list of objects)."""
+    try:
+        value = _decoder.raw_decode(text, start)[0]
+    except (ValueError, RecursionError):  # RecursionError: nested too deeply for the decoder
+        if not repair:
+            return None
+        try:
+            value = json.loads(repair_json(text[start:end]))
+        except (ValueError, RecursionError):
+            return None
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        return None
+    return value
+
+
+def repair_json(text):
+    """
+    Fix common model mistakes in a JSON fragment: single-quoted strings, Python literals
+    (True/False/None) and trailing commas before a closing bracket or brace.
+    Args:
+        text (str): A JSON-like fragment.
+    Returns:
+        str: The repaired text (not guaranteed to be valid JSON).
+    """
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"' or ch == "'":
+            j = i + 1
+            chars = []
+            while j < n and text[j] != ch:
+                if text[j] == '\\' and j + 1 < n:
+                    if ch == "'" and text[j + 1] == "'":
+                        chars.append("'")
+                    else:
+                        chars.append(text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' and ch == "'" else text[j])
+                j += 1
+            out.append('"' + ''.join(chars) + '"')
+            i = j + 1
+            continue
+        if ch == ',':
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] in ']}':
+                i += 1
+                continue
+        if ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == '_'):
+                j += 1
+            word = text[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def extract_json_array(text, repair=True):
+    """
+    Extract the plan's JSON array from raw model output.
+    Candidate arrays are located with a single string- and escape-aware scan (_array_candidates);
+    each is decoded with raw_decode and, if that fails and repair is enabled, decoded again after
+    repair_json. The first array of objects wins; truncated arrays are never returned.
+    Args:
+        text (str): Raw model output.
+        repair (bool): Try repair_json on candidates that are not valid JSON.
+    Returns:
+        list or None: The parsed array (an empty list if the model answered []), or None if not found/invalid.
+    """
+    if not text:
+        return None
+    empty_found = False
+    for start, end, nested in _array_candidates(text):
+        # An enclosing array that is not a plan (e.g. prose like "[{see below}]") may still contain one
+        for start, end in [(start, end)] + nested:
+            value = _decode_array(text, start, end, repair)
+            if value:
+                return value
+            empty_found = empty_found or value == []
+    return [] if empty_found else None
+
+
+class StepStreamParser:
+    """
+    Incremental parser for a streamed JSON array of step objects.
+    Text before the plan's '[' (e.g. a markdown fence) is ignored. The scan is string- and
+    escape-aware, so braces inside string values do not end a step.
+    Attributes:
+        text (str): Everything fed so far, for a full-text fallback parse once the stream ends.
+        steps (list): Steps parsed so far.
+        done (bool): True once the array's closing ']' has been seen.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.steps = []
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._step_chars = None
+
+    @property
+    def text(self):
+        return ''.join(self._chunks)
+
+    def feed(self, chunk):
+        """
+        Consume the next piece of model output.
+        Args:
+            chunk (str): Newly received text.
+        Returns:
+            list: Step dicts completed by this chunk, in order (possibly empty).
+        """
+        self._chunks.append(chunk)
+        completed = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._step_chars is not None:
+                self._step_chars.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"' and self._depth > 0:
+                self._in_string = True
+            elif ch == '[' or (ch == '{' and self._depth > 0):
+                if ch == '{' and self._depth == 1:
+                    self._step_chars = [ch]
+                self._depth += 1
+            elif ch in ']}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 1 and ch == '}' and self._step_chars is not None:
+                    step = self._parse_step(''.join(self._step_chars))
+                    self._step_chars = None
+                    if step is not None:
+                        self.steps.append(step)
+                        completed.append(step)
+                elif self._depth == 0:
+                    # An array without step objects (e.g. "[see below]" in prose) is not the plan
+                    self.done = bool(self.steps)
+        return completed
+
+    @staticmethod
+    def _parse_step(text):
+        try:
+            step = json.loads(text)
+        except ValueError:
+            return None
+        return step if isinstance(step, dict) else None
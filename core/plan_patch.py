@@ -0,0 +1,176 @@
+"""
+Patch-based plan edits.
+Instead of re-emitting a whole plan, the model returns a short JSON-Patch-style (RFC 6902) list of
+operations against the current plan, which is applied and validated locally:
+    {"op": "add",     "path": "/2", "value": {"function": ..., "inputs": {...}}}   insert before step index 2 ("/-" appends)
+    {"op": "remove",  "path": "/3"}                                                 delete step index 3
+    {"op": "replace", "path": "/1", "value": {...}}                                 swap a whole step
+    {"op": "replace", "path": "/1/function", "value": "send_sms_tool"}              change a step's tool
+    {"op": "add",     "path": "/1/inputs/to", "value": "?"}                         set an input ("replace" also works)
+    {"op": "remove",  "path": "/1/inputs/cc"}                                       drop an input
+    {"op": "move",    "from": "/4", "path": "/0"}                                   reorder a step
+Paths use 0-based step indices and operations apply in order, each to the result of the previous one.
+When steps are inserted, removed or moved, "$N.field" references in the other steps are renumbered
+so they keep pointing at the same step; references to a removed step become "?".
+"""
+import copy
+
+from core.plan_validator import REFERENCE, parse_reference, validate_plan
+
+OPS = ('add', 'remove', 'replace', 'move')
+
+
+class PlanPatchError(ValueError):
+    """A patch operation is malformed or does not apply to the plan."""
+
+
+def _parse_path(path, plan_len, for_insert=False):
+    if not isinstance(path, str) or not path.startswith('/'):
+        raise PlanPatchError(f"Invalid path {path!r}.")
+    parts = path[1:].split('/')
+    if parts[0] == '-' and for_insert and len(parts) == 1:
+        return plan_len, []
+    try:
+        index = int(parts[0])
+    except ValueError:
+        raise PlanPatchError(f"Invalid step index in path {path!r}.")
+    limit = plan_len + 1 if for_insert and len(parts) == 1 else plan_len
+    if not 0 <= index < limit:
+        raise PlanPatchError(f"Step index {index} in {path!r} is out of range.")
+    rest = [part.replace('~1', '/').replace('~0', '~') for part in parts[1:]]
+    if rest and rest[0] not in ('function', 'inputs') or len(rest) > 2 or (len(rest) == 2 and rest[0] != 'inputs'):
+        raise PlanPatchError(f"Unsupported path {path!r}; use /N, /N/function, /N/inputs or /N/inputs/<name>.")
+    return index, rest
+
+
+def _check_step(step):
+    if not isinstance(step, dict) or not isinstance(step.get('function'), str):
+        raise PlanPatchError("A step value must be an object with a 'function' name.")
+    if not isinstance(step.get('inputs', {}), dict):
+        raise PlanPatchError("A step's 'inputs' must be an object.")
+    return {'function': step['function'], 'inputs': dict(step.get('inputs', {}))}
+
+
+def _renumber(plan, mapping, skip=None):
+    """
+    Rewrite "$N..." references in every step but `skip`; mapping takes old 0-based indices to new ones
+    (None for a removed step, whose references become "?").
+    """
+    for i, step in enumerate(plan):
+        if i == skip or not isinstance(step.get('inputs'), dict):
+            continue
+        for name, value in step['inputs'].items():
+            reference = parse_reference(value)
+            if reference is None or reference[0] not in mapping or mapping[reference[0]] == reference[0]:
+                continue
+            if mapping[reference[0]] is None:
+                step['inputs'][name] = '?'
+                continue
+            match = REFERENCE.match(value.strip())
+            field = f".{match.group(2)}" if match.group(2) else ''
+            step['inputs'][name] = f"${mapping[reference[0]] + 1}{field}"
+
+
+def apply_plan_patch(plan, operations):
+    """
+    Apply patch operations to a plan.
+    Args:
+        plan (list): Current plan steps (not modified).
+        operations (list): Operation dicts, see the module docstring.
+    Returns:
+        list: The patched plan.
+    Raises:
+        PlanPatchError: If an operation is malformed or does not apply.
+    """
+    if not isinstance(operations, list):
+        raise PlanPatchError("The patch is not a list of operations.")
+    plan = copy.deepcopy(plan)
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in OPS:
+            raise PlanPatchError(f"Unsupported operation {operation!r}; use one of {', '.join(OPS)}.")
+        op = operation['op']
+        if op in ('add', 'replace') and 'value' not in operation:
+            raise PlanPatchError(f"'{op}' needs a 'value'.")
+        n = len(plan)
+        index, rest = _parse_path(operation.get('path'), n, for_insert=(op in ('add', 'move')))
+
+        if op == 'move':
+            source, source_rest = _parse_path(operation.get('from'), n)
+            if rest or source_rest:
+                raise PlanPatchError("'move' only moves whole steps.")
+            index = min(index, n - 1)
+            step = plan.pop(source)
+            plan.insert(index, step)
+            order = list(range(n))
+            order.insert(index, order.pop(source))
+            _renumber(plan, {old: new for new, old in enumerate(order)})
+        elif not rest:
+            if op == 'add':
+                plan.insert(index, _check_step(operation['value']))
+                _renumber(plan, {old: old + 1 for old in range(index, n)}, skip=index)
+            elif op == 'remove':
+                plan.pop(index)
+                mapping = {old: old - 1 for old in range(index + 1, n)}
+                mapping[index] = None
+                _renumber(plan, mapping)
+            else:
+                plan[index] = _check_step(operation['value'])
+        elif rest == ['function']:
+            if op == 'remove' or not isinstance(operation['value'], str):
+                raise PlanPatchError("A step's function can only be replaced with a tool name.")
+            plan[index]['function'] = operation['value']
+        elif rest == ['inputs']:
+            if op == 'remove':
+                plan[index]['inputs'] = {}
+            elif not isinstance(operation['value'], dict):
+                raise PlanPatchError("'inputs' must be replaced with an object.")
+            else:
+                plan[index]['inputs'] = dict(operation['value'])
+        else:
+            inputs = plan[index].setdefault('inputs', {})
+            if op == 'remove':
+                if rest[1] not in inputs:
+                    raise PlanPatchError(f"Step {index} has no input '{rest[1]}' to remove.")
+                del inputs[rest[1]]
+            else:
+                inputs[rest[1]] = operation['value']
+    return plan
+
+
+def _issue_keys(plan, issues):
+    keys = set()
+    for issue in issues:
+        step = plan[issue.step] if 0 <= issue.step < len(plan) and isinstance(plan[issue.step], dict) else {}
+        keys.add((issue.code, step.get('function'), issue.param))
+    return keys
+
+
+def patch_plan(plan, operations, tools_by_name=None, allowed_tools=None):
+    """
+    Apply a patch and validate the result.
+    A patched plan is rejected if it introduces validation issues the current plan did not have, or
+    uses a tool outside `allowed_tools` (the tools offered to the model).
+    Args:
+        plan (list): Current plan steps.
+        operations (list): Patch operations.
+        tools_by_name (dict): Tool name -> tool dict for validation (optional). Defaults to the shared catalog.
+        allowed_tools (iterable): Tool names the patch may introduce (optional).
+    Returns:
+        list: The patched plan.
+    Raises:
+        PlanPatchError: If the patch does not apply or produces an invalid plan.
+    """
+    patched = apply_plan_patch(plan, operations)
+    if not patched:
+        raise PlanPatchError("The patch removed every step.")
+    if allowed_tools is not None:
+        allowed = set(allowed_tools) | {step.get('function') for step in plan if isinstance(step, dict)}
+        unknown = sorted({step['function'] for step in patched} - allowed)
+        if unknown:
+            raise PlanPatchError(f"The patch uses tools that were not offered: {', '.join(unknown)}.")
+    before = _issue_keys(plan, validate_plan(plan, tools_by_name))
+    issues = validate_plan(patched, tools_by_name)
+    new_issues = [issue for issue in issues if not _issue_keys(patched, [issue]) <= before]
+    if new_issues:
+        raise PlanPatchError('; '.join(str(issue) for issue in new_issues))
+    return patched
@@ -0,0 +1,281 @@
+"""
+Persistent storage for chats and their plan versions.
+PlanStore defines the interface; SQLitePlanStore is the default backend. Each chat is a row and each
+plan version is a row of its own, so the UI loads one version at a time instead of holding every
+version in memory. Every chat belongs to an owner (the web app uses a stable per-browser id, see
+ui/ui_app.py), and every read and write is scoped to that owner, so one user never lists, opens or
+deletes another user's chats. Chats not updated for MATE_CHAT_RETENTION_DAYS are deleted, so the
+history of owners who never come back does not grow forever.
+Tools are stored by reference: the version keeps the relevant tool names plus the catalog version they
+were retrieved from, and resolve_tools() maps the names back to the current catalog entries when the
+version is displayed.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import warnings
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from core.tool_catalog import get_catalog
+
+PLAN_DB_PATH = Path(os.getenv('MATE_PLAN_DB', Path(__file__).parent.parent / 'data' / 'plans.sqlite3'))
+CHAT_RETENTION_DAYS = float(os.getenv('MATE_CHAT_RETENTION_DAYS', '30'))  # 0 keeps chats forever
+PRUNE_INTERVAL = 3600  # Seconds between retention sweeps
+
+
+def resolve_tools(tool_names, catalog_version=None):
+    """
+    Map stored tool names to the current catalog's tool dicts, skipping tools that no longer exist.
+    Args:
+        tool_names (list): Tool names stored with a plan version.
+        catalog_version (str): Catalog version the names were retrieved from (optional). When it differs
+                               from the current catalog, the tools may have changed since; a warning names
+                               any that were removed.
+    Returns:
+        list: Tool dicts from the current catalog.
+    """
+    catalog = get_catalog()
+    by_name = catalog.by_name
+    if catalog_version is not None and catalog_version != catalog.version:
+        missing = [name for name in tool_names if name not in by_name]
+        if missing:
+            warnings.warn(f"Tools removed from the catalog since this plan was made: {', '.join(missing)}")
+    return [by_name[name] for name in tool_names if name in by_name]
+
+
+def is_stale(catalog_version):
+    """Whether a stored plan version was made against a different tool catalog than the current one."""
+    return catalog_version is not None and catalog_version != get_catalog().version
+
+
+class PlanStore(ABC):
+    """
+    Storage backend for chats and plan versions.
+    Chats are dicts with 'id', 'owner', 'user_query', 'created_at', 'updated_at' and 'num_versions'.
+    Versions are dicts with 'chat_id', 'index' (0-based), 'plan', 'reasoning', 'tool_names',
+    'catalog_version' and 'created_at'.
+    Every method takes the owner first; a chat id that belongs to another owner behaves as if it did
+    not exist.
+    """
+
+    @abstractmethod
+    def create_chat(self, owner, user_query, plan, reasoning=None, tool_names=(), catalog_version=None):
+        """Create a chat with its first plan version and return the new chat id."""
+
+    @abstractmethod
+    def add_version(self, owner, chat_id, plan, reasoning=None, tool_names=(), catalog_version=None):
+        """Append a plan version to a chat and return its 0-based index (KeyError for an unknown chat)."""
+
+    @abstractmethod
+    def get_chat(self, owner, chat_id):
+        """Return one chat dict, or None if it does not exist."""
+
+    @abstractmethod
+    def list_chats(self, owner, limit=20, offset=0):
+        """Return a page of the owner's chat dicts, most recently updated first."""
+
+    @abstractmethod
+    def count_chats(self, owner):
+        """Return how many chats the owner has."""
+
+    @abstractmethod
+    def get_version(self, owner, chat_id, index):
+        """Return one version dict, or None if it does not exist."""
+
+    @abstractmethod
+    def truncate_versions(self, owner, chat_id, keep):
+        """Delete every version of a chat after the first `keep`."""
+
+    @abstractmethod
+    def delete_chat(self, owner, chat_id):
+        """Delete a chat and all its versions."""
+
+    @abstractmethod
+    def prune(self, older_than):
+        """Delete every owner's chats last updated before the `older_than` timestamp; return how many."""
+
+
+class SQLitePlanStore(PlanStore):
+    """
+    PlanStore backed by a SQLite file (or ':memory:').
+    Args:
+        db_path (str): Database file (optional). Defaults to MATE_PLAN_DB.
+        retention_days (float): Chats not updated for this long are pruned when the store is opened and
+                                then at most every PRUNE_INTERVAL seconds as chats are created (0 disables).
+    """
+
+    def __init__(self, db_path=None, retention_days=CHAT_RETENTION_DAYS):
+        self.db_path = str(db_path or PLAN_DB_PATH)
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pruned_at = None
+
+    def _connection(self):
+        if self._conn is None:
+            if self.db_path != ':memory:':
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chats ("
+                "id TEXT PRIMARY KEY, owner TEXT NOT NULL DEFAULT '', user_query TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, num_versions INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chats)")}
+            if 'owner' not in columns:
+                # Databases from before chats had owners: their chats keep the empty owner and stay unlisted
+                conn.execute("ALTER TABLE chats ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS plan_versions ("
+                "chat_id TEXT NOT NULL REFERENCES chats (id) ON DELETE CASCADE, idx INTEGER NOT NULL, "
+                "plan TEXT NOT NULL, reasoning TEXT, tool_names TEXT NOT NULL, catalog_version TEXT, "
+                "created_at REAL NOT NULL, PRIMARY KEY (chat_id, idx))"
+            )
+            conn.execute("DROP INDEX IF EXISTS chats_updated_at")
+            conn.execute("CREATE INDEX IF NOT EXISTS chats_owner_updated_at ON chats (owner, updated_at)")
+            conn.commit()
+            self._conn = conn
+            self._prune_expired(conn)
+        return self._conn
+
+    def _prune_expired(self, conn):
+        now = time.time()
+        if self.retention_days > 0 and (self._pruned_at is None or now - self._pruned_at >= PRUNE_INTERVAL):
+            self._pruned_at = now
+            self._delete_older_than(conn, now - self.retention_days * 86400)
+
+    @staticmethod
+    def _delete_older_than(conn, older_than):
+        deleted = conn.execute("DELETE FROM chats WHERE updated_at < ?", (older_than,)).rowcount
+        conn.commit()
+        return deleted
+
+    @staticmethod
+    def _chat(row):
+        if row is None:
+            return None
+        chat_id, owner, user_query, created_at, updated_at, num_versions = row
+        return {
+            'id': chat_id, 'owner': owner, 'user_query': user_query, 'created_at': created_at,
+            'updated_at': updated_at, 'num_versions': num_versions,
+        }
+
+    def _insert_version(self, conn, chat_id, index, plan, reasoning, tool_names, catalog_version, now):
+        conn.execute(
+            "INSERT INTO plan_versions (chat_id, idx, plan, reasoning, tool_names, catalog_version, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (chat_id, index, json.dumps(plan), reasoning, json.dumps(list(tool_names)), catalog_version, now),
+        )
+
+    def create_chat(self, owner, user_query, plan, reasoning=None, tool_names=(), catalog_version=None):
+        chat_id = secrets.token_hex(8)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            self._prune_expired(conn)
+            conn.execute(
+                "INSERT INTO chats (id, owner, user_query, created_at, updated_at, num_versions) "
+                "VALUES (?, ?, ?, ?, ?, 1)",
+                (chat_id, owner, user_query, now, now),
+            )
+            self._insert_version(conn, chat_id, 0, plan, reasoning, tool_names, catalog_version, now)
+            conn.commit()
+        return chat_id
+
+    def add_version(self, owner, chat_id, plan, reasoning=None, tool_names=(), catalog_version=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT num_versions FROM chats WHERE id = ? AND owner = ?", (chat_id, owner),
+            ).fetchone()
+            if row is None:
+                raise KeyError(chat_id)
+            index = row[0]
+            self._insert_version(conn, chat_id, index, plan, reasoning, tool_names, catalog_version, now)
+            conn.execute("UPDATE chats SET num_versions = ?, updated_at = ? WHERE id = ?", (index + 1, now, chat_id))
+            conn.commit()
+        return index
+
+    def get_chat(self, owner, chat_id):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT id, owner, user_query, created_at, updated_at, num_versions FROM chats "
+                "WHERE id = ? AND owner = ?", (chat_id, owner),
+            ).fetchone()
+        return self._chat(row)
+
+    def list_chats(self, owner, limit=20, offset=0):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT id, owner, user_query, created_at, updated_at, num_versions FROM chats "
+                "WHERE owner = ? ORDER BY updated_at DESC LIMIT ? OFFSET ?", (owner, limit, offset),
+            ).fetchall()
+        return [self._chat(row) for row in rows]
+
+    def count_chats(self, owner):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chats WHERE owner = ?", (owner,)).fetchone()[0]
+
+    def get_version(self, owner, chat_id, index):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT v.plan, v.reasoning, v.tool_names, v.catalog_version, v.created_at FROM plan_versions v "
+                "JOIN chats c ON c.id = v.chat_id WHERE v.chat_id = ? AND v.idx = ? AND c.owner = ?",
+                (chat_id, index, owner),
+            ).fetchone()
+        if row is None:
+            return None
+        plan, reasoning, tool_names, catalog_version, created_at = row
+        return {
+            'chat_id': chat_id, 'index': index, 'plan': json.loads(plan), 'reasoning': reasoning,
+            'tool_names': json.loads(tool_names), 'catalog_version': catalog_version, 'created_at': created_at,
+        }
+
+    def truncate_versions(self, owner, chat_id, keep):
+        with self._lock:
+            conn = self._connection()
+            if conn.execute("SELECT 1 FROM chats WHERE id = ? AND owner = ?", (chat_id, owner)).fetchone() is None:
+                return
+            conn.execute("DELETE FROM plan_versions WHERE chat_id = ? AND idx >= ?", (chat_id, keep))
+            conn.execute(
+                "UPDATE chats SET num_versions = (SELECT COUNT(*) FROM plan_versions WHERE chat_id = ?), "
+                "updated_at = ? WHERE id = ?", (chat_id, time.time(), chat_id),
+            )
+            conn.commit()
+
+    def delete_chat(self, owner, chat_id):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM chats WHERE id = ? AND owner = ?", (chat_id, owner))
+            conn.commit()
+
+    def prune(self, older_than):
+        with self._lock:
+            return self._delete_older_than(self._connection(), older_than)
+
+
+_plan_store = None
+_plan_store_lock = threading.Lock()
+
+
+def get_plan_store():
+    """Return the process-wide PlanStore, creating the SQLite store on first use."""
+    global _plan_store
+    if _plan_store is None:
+        with _plan_store_lock:
+            if _plan_store is None:
+                _plan_store = SQLitePlanStore()
+    return _plan_store
+
+
+def set_plan_store(store):
+    """Replace the process-wide PlanStore (e.g. with another backend)."""
+    global _plan_store
+    with _plan_store_lock:
+        _plan_store = store
@@ -0,0 +1,221 @@
+"""
+Static checks for generated plans against the tool catalog.
+Each step must name a known tool, supply every required input (parameters whose description starts
+with "Optional" may be left out, as may inputs fed by an earlier step's output of the same name) and
+use no parameters the tool does not declare. Dataflow between steps is resolved by input_bindings():
+- an explicit reference "$N.field" (or "$N" for the step's single output) names output `field` of
+  step N (1-based) and must point to an earlier step;
+- an input left as a placeholder ('?' or empty) is bound to the most recent earlier step with an
+  output of the same name; one that no earlier output matches is reported as a missing input.
+Bound inputs are then type-checked against the producing output. Checks are pure dictionary
+lookups, cheap enough to run on every generation.
+"""
+import re
+
+from core.tool_catalog import get_catalog
+
+REFERENCE = re.compile(r'^\$(?:step_?)?(\d+)(?:\.(\w+))?$')
+PLACEHOLDERS = ('?', '', None)
+
+
+class PlanIssue:
+    """
+    One problem found in a plan.
+    Attributes:
+        code (str): Machine-readable kind, e.g. 'unknown_tool', 'missing_input', 'type_mismatch'.
+        step (int): 0-based index of the offending step.
+        message (str): Human-readable explanation.
+        param (str): The input parameter involved, if any.
+    """
+
+    def __init__(self, code, step, message, param=None):
+        self.code = code
+        self.step = step
+        self.message = message
+        self.param = param
+
+    def to_dict(self):
+        return {'code': self.code, 'step': self.step, 'param': self.param, 'message': self.message}
+
+    def __repr__(self):
+        return f"PlanIssue({self.code!r}, step={self.step}, param={self.param!r})"
+
+    def __str__(self):
+        return f"Step {self.step + 1}: {self.message}"
+
+
+def is_required(param_details):
+    """Inputs are required unless their description starts with 'Optional'."""
+    description = param_details.get('description', '') if isinstance(param_details, dict) else ''
+    return not description.lstrip().lower().startswith('optional')
+
+
+def parse_reference(value):
+    """
+    Parse an explicit step reference.
+    Returns:
+        tuple or None: (0-based step index, output field or None) for "$N.field" / "$N", else None.
+    """
+    if not isinstance(value, str):
+        return None
+    match = REFERENCE.match(value.strip())
+    if not match:
+        return None
+    return int(match.group(1)) - 1, match.group(2)
+
+
+def _normalize_type(type_name):
+    return (type_name or '').replace(' ', '').lower()
+
+
+def types_compatible(source, target):
+    """
+    Whether a value of type `source` may feed a parameter of type `target` (catalog type strings such
+    as 'str', 'float', 'list[dict]'). Unknown types are accepted; ints widen to floats and a bare
+    'list' matches any list type.
+    """
+    source, target = _normalize_type(source), _normalize_type(target)
+    if not source or not target or source in ('any', 'unknown') or target in ('any', 'unknown'):
+        return True
+    if source == target:
+        return True
+    if source == 'int' and target == 'float':
+        return True
+    if source.startswith('list') and target.startswith('list'):
+        return source == 'list' or target == 'list'
+    return False
+
+
+def _step_tool(step, tools_by_name):
+    if not isinstance(step, dict):
+        return None
+    return tools_by_name.get(step.get('function'))
+
+
+def input_bindings(plan, tools_by_name):
+    """
+    Resolve which earlier step output feeds each step input.
+    Args:
+        plan (list): Plan steps.
+        tools_by_name (dict): Tool name -> tool dict.
+    Returns:
+        list: One dict per step mapping input name -> (source step index, output field or None, explicit).
+              The output field is None for a "$N" reference to a step's whole output. Dangling
+              references (unknown or later steps) and unmatched placeholders are left out;
+              validate_plan reports them.
+    """
+    bindings = []
+    for i, step in enumerate(plan):
+        tool = _step_tool(step, tools_by_name)
+        inputs = step.get('inputs') if isinstance(step, dict) else None
+        inputs = inputs if isinstance(inputs, dict) else {}
+        step_bindings = {}
+        params = list(inputs)
+        if tool and isinstance(tool.get('input'), dict):
+            params += [name for name in tool['input'] if name not in inputs]
+        for name in params:
+            value = inputs.get(name)
+            reference = parse_reference(value)
+            if reference is not None:
+                source, field = reference
+                if 0 <= source < i:
+                    step_bindings[name] = (source, field, True)
+            elif value in PLACEHOLDERS:
+                for source in range(i - 1, -1, -1):
+                    source_tool = _step_tool(plan[source], tools_by_name)
+                    if source_tool and name in (source_tool.get('output') or {}):
+                        step_bindings[name] = (source, name, False)
+                        break
+        bindings.append(step_bindings)
+    return bindings
+
+
+def step_dependencies(plan, tools_by_name=None, bindings=None):
+    """
+    Dependency DAG of a plan, from its dataflow (see input_bindings).
+    Args:
+        plan (list): Plan steps.
+        tools_by_name (dict): Tool name -> tool dict (optional). Defaults to the shared catalog.
+        bindings (list): Precomputed input_bindings(plan, tools_by_name) (optional).
+    Returns:
+        list: For each step, the sorted indices of the earlier steps it consumes outputs from.
+    """
+    if bindings is None:
+        if tools_by_name is None:
+            tools_by_name = get_catalog().by_name
+        bindings = input_bindings(plan, tools_by_name)
+    return [sorted({source for source, _, _ in step_bindings.values()}) for step_bindings in bindings]
+
+
+def _output_type(tool, field):
+    outputs = tool.get('output') if isinstance(tool.get('output'), dict) else {}
+    if field is None:
+        if len(outputs) != 1:
+            return 'dict'
+        details = next(iter(outputs.values()))
+    else:
+        details = outputs.get(field)
+    # Entries that are not {"type": ...} objects (e.g. "x": "str") are treated as untyped
+    return details.get('type') if isinstance(details, dict) else None
+
+
+def validate_plan(plan, tools_by_name=None):
+    """
+    Check a plan against the tool catalog.
+    Args:
+        plan (list): Plan steps ({"function", "inputs"} dicts).
+        tools_by_name (dict): Tool name -> tool dict (optional). Defaults to the shared catalog.
+    Returns:
+        list: PlanIssue objects, in step order (empty if the plan is valid).
+    """
+    if tools_by_name is None:
+        tools_by_name = get_catalog().by_name
+    if not isinstance(plan, list):
+        return [PlanIssue('invalid_plan', 0, "The plan is not a list of steps.")]
+    issues = []
+    bindings = input_bindings(plan, tools_by_name)
+    for i, step in enumerate(plan):
+        if not isinstance(step, dict) or not isinstance(step.get('function'), str):
+            issues.append(PlanIssue('invalid_step', i, "The step is not an object with a 'function' name."))
+            continue
+        func = step['function']
+        inputs = step.get('inputs', {})
+        if not isinstance(inputs, dict):
+            issues.append(PlanIssue('invalid_step', i, f"The inputs of '{func}' are not an object."))
+            inputs = {}
+        tool = tools_by_name.get(func)
+        if tool is None:
+            issues.append(PlanIssue('unknown_tool', i, f"'{func}' is not a known tool."))
+            continue
+        schema = tool.get('input') if isinstance(tool.get('input'), dict) else {}
+        for name, details in schema.items():
+            if inputs.get(name) in PLACEHOLDERS and name not in bindings[i] and is_required(details):
+                issues.append(PlanIssue('missing_input', i, f"'{func}' requires input '{name}'.", name))
+        for name, value in inputs.items():
+            if name not in schema:
+                issues.append(PlanIssue('unknown_input', i, f"'{func}' has no input '{name}'.", name))
+                continue
+            reference = parse_reference(value)
+            if reference is not None and name not in bindings[i]:
+                issues.append(PlanIssue(
+                    'bad_reference', i, f"Input '{name}' refers to step {reference[0] + 1}, which is not an earlier step.", name,
+                ))
+        for name, (source, field, explicit) in bindings[i].items():
+            if name not in schema:
+                continue
+            source_tool = _step_tool(plan[source], tools_by_name)
+            if source_tool is None:
+                continue  # Already reported as an unknown tool
+            if field is not None and field not in (source_tool.get('output') or {}):
+                issues.append(PlanIssue(
+                    'unknown_output', i, f"Step {source + 1} ('{source_tool['name']}') has no output '{field}'.", name,
+                ))
+                continue
+            source_type = _output_type(source_tool, field)
+            target_type = schema[name].get('type') if isinstance(schema[name], dict) else None
+            if not types_compatible(source_type, target_type):
+                issues.append(PlanIssue(
+                    'type_mismatch', i,
+                    f"Input '{name}' expects {target_type} but step {source + 1} produces {source_type}.", name,
+                ))
+    return issues
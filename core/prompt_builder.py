@@ -1,21 +1,21 @@
 import json
-import re
+import logging
 from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from core.tool_filter import filter_relevant_tools
+from core.plan_parsing import extract_json_array
+from core.tool_catalog import get_catalog
 
 TOOLS_PATH = Path(__file__).parent.parent / 'data' / 'function_tools.json'
+logger = logging.getLogger(__name__)
+DEFAULT_TOKEN_BUDGET = 4000  # Approximate cap for a planning prompt; see build_prompt(token_budget=...)
 
 def load_tools():
-    """Load the tool definitions from the JSON file."""
-    with open(TOOLS_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load the tool definitions from the shared ToolCatalog (do not mutate the returned list)."""
+    return get_catalog().tools
 
 def load_tools_json(json_path=None):
     """Load the tool definitions from the JSON file (with keywords)."""
-    if json_path is None:
-        json_path = TOOLS_PATH
+    if json_path is None or Path(json_path) == TOOLS_PATH:
+        return get_catalog().tools
     with open(json_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -24,68 +24,106 @@ def filter_tools_by_query(user_query, tools, top_n=12):
     Deprecated: Use filter_relevant_tools from core/tool_filter.py instead.
     This function is kept for backward compatibility and simply calls filter_relevant_tools.
     """
+    from core.tool_filter import filter_relevant_tools  # Retrieval (NumPy) loads on first use
     return filter_relevant_tools(user_query, tools, top_n=top_n)
 
 
-def build_prompt(user_query, tools=None, example=None):
-    """
-    Build a concise prompt for Gemini, including the user query and available tools.
-    The prompt instructs Gemini to return only a valid JSON array of function call steps, with no extra text or explanation.
-    To extend the prompt for special cases, add details to the INSTRUCTIONS section below.
-    """
-    if tools is None:
-        tools = load_tools()
-    print("Filtered tools:", [t['name'] for t in tools])
-    tool_descriptions = []
-    for tool in tools:
-        # Basic tool info
-        tool_info = f"- {tool.get('name', 'Unknown Tool')}\n"
-        tool_info += f"  Description: {tool.get('description', 'No description available.')}\n"
-        if tool.get('category'):
-            tool_info += f"  Category: {tool.get('category')}\n"
-        if tool.get('tags'):
-            tool_info += f"  Tags: {', '.join(tool.get('tags'))}\n"
-
-        # Input parameters with their descriptions
-        tool_info += f"  Input Parameters:\n"
-        if isinstance(tool.get('input'), dict):
-            if tool['input']:
-                for param_name, param_details in tool['input'].items():
-                    param_type = param_details.get('type', 'unknown')
-                    param_desc = param_details.get('description', 'No description.')
-                    tool_info += f"    - {param_name} (type: {param_type}): {param_desc}\n"
-            else:
-                tool_info += f"    - None\n"
+def format_tool_description(tool):
+    """Render one tool's description block for the planning prompt."""
+    # Basic tool info
+    tool_info = f"- {tool.get('name', 'Unknown Tool')}\n"
+    tool_info += f"  Description: {tool.get('description', 'No description available.')}\n"
+    if tool.get('category'):
+        tool_info += f"  Category: {tool.get('category')}\n"
+    if tool.get('tags'):
+        tool_info += f"  Tags: {', '.join(tool.get('tags'))}\n"
+
+    # Input parameters with their descriptions
+    tool_info += f"  Input Parameters:\n"
+    if isinstance(tool.get('input'), dict):
+        if tool['input']:
+            for param_name, param_details in tool['input'].items():
+                param_type = param_details.get('type', 'unknown')
+                param_desc = param_details.get('description', 'No description.')
+                tool_info += f"    - {param_name} (type: {param_type}): {param_desc}\n"
         else:
-            tool_info += f"    - Invalid input format in schema\n"
-
-        # Output parameters with their descriptions
-        tool_info += f"  Output Parameters:\n"
-        if isinstance(tool.get('output'), dict):
-            if tool['output']:
-                for param_name, param_details in tool['output'].items():
-                    param_type = param_details.get('type', 'unknown')
-                    param_desc = param_details.get('description', 'No description.')
-                    tool_info += f"    - {param_name} (type: {param_type}): {param_desc}\n"
-            else:
-                tool_info += f"    - None\n"
+            tool_info += f"    - None\n"
+    else:
+        tool_info += f"    - Invalid input format in schema\n"
+
+    # Output parameters with their descriptions
+    tool_info += f"  Output Parameters:\n"
+    if isinstance(tool.get('output'), dict):
+        if tool['output']:
+            for param_name, param_details in tool['output'].items():
+                param_type = param_details.get('type', 'unknown')
+                param_desc = param_details.get('description', 'No description.')
+                tool_info += f"    - {param_name} (type: {param_type}): {param_desc}\n"
         else:
-            tool_info += f"    - Invalid output format in schema\n"
+            tool_info += f"    - None\n"
+    else:
+        tool_info += f"    - Invalid output format in schema\n"
 
-        # Constraints
-        if tool.get('constraints'):
-            tool_info += f"  CONSTRAINT: {tool.get('constraints')}\n"
+    # Constraints
+    if tool.get('constraints'):
+        tool_info += f"  CONSTRAINT: {tool.get('constraints')}\n"
 
-        # Usage Examples (optional, could make prompt too long, consider conditional inclusion)
-        # if tool.get('meta') and tool['meta'].get('usage_examples'):
-        #     tool_info += f"  Usage Examples:\n"
-        #     for example_usage in tool['meta']['usage_examples']:
-        #         tool_info += f"    - {example_usage}\n"
+    # Usage Examples (optional, could make prompt too long, consider conditional inclusion)
+    # if tool.get('meta') and tool['meta'].get('usage_examples'):
+    #     tool_info += f"  Usage Examples:\n"
+    #     for example_usage in tool['meta']['usage_examples']:
+    #         tool_info += f"    - {example_usage}\n"
 
-        tool_descriptions.append(tool_info)
-    tool_list_str = '\n'.join(tool_descriptions)
-    if example is None:
-        example = '''User query: "Summarize sales by category and email the report"
+    return tool_info
+
+
+def format_tool_description_compact(tool):
+    """
+    Render one tool as a short block for token-constrained prompts.
+    Keeps the name, description, parameter names/types and constraints; drops category, tags and
+    parameter descriptions.
+    """
+    def params(schema):
+        if not isinstance(schema, dict):
+            return '?'
+        return ', '.join(
+            f"{name}: {details.get('type', 'unknown') if isinstance(details, dict) else 'unknown'}"
+            for name, details in schema.items()
+        )
+
+    tool_info = f"- {tool.get('name', 'Unknown Tool')}({params(tool.get('input'))}) -> ({params(tool.get('output'))})\n"
+    tool_info += f"  {tool.get('description', 'No description available.')}\n"
+    if tool.get('constraints'):
+        tool_info += f"  CONSTRAINT: {tool.get('constraints')}\n"
+    return tool_info
+
+
+def estimate_tokens(text):
+    """Rough token count used for prompt budgets (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def fit_to_token_budget(fragments, token_budget):
+    """
+    Keep rendered tool fragments, in rank order, while their total fits the budget.
+    Lowest-ranked tools are trimmed first; the best-ranked tool is always kept.
+    Args:
+        fragments (list): Rendered fragments, best-ranked first.
+        token_budget (int): Tokens available for the tool list.
+    Returns:
+        list: The leading fragments that fit.
+    """
+    kept, used = [], 0
+    for fragment in fragments:
+        cost = estimate_tokens(fragment) + 1
+        if kept and used + cost > token_budget:
+            break
+        kept.append(fragment)
+        used += cost
+    return kept
+
+
+DEFAULT_EXAMPLE = '''User query: "Summarize sales by category and email the report"
 [
   {"function": "readExcelTool", "inputs": {"file_path": "?"}},
   {"function": "groupByCategoryTool", "inputs": {"data": "?", "category_field": "?"}},
@@ -94,7 +132,8 @@ def build_prompt(user_query, tools=None, example=None):
   {"function": "generateEmailTool", "inputs": {"content": "?"}},
   {"function": "sendEmailTool", "inputs": {"to": "?", "content": "?"}}
 ]'''
-    prompt = f"""
+
+PROMPT_TEMPLATE = """
 You are an AI workflow planner. Break down the user's request into a sequence of function calls using only the tools below.
 
 INSTRUCTIONS:
@@ -116,18 +155,33 @@ User query:
 
 Respond ONLY with the JSON array as described above.
 """
-    return prompt
 
 
-def extract_json_array(text):
+def build_prompt(user_query, tools=None, example=None, compact=False, token_budget=None):
     """
-    Extract the first JSON array from a string using regex.
-    Returns the parsed array or None if not found/invalid.
+    Build a concise prompt for Gemini, including the user query and available tools.
+    The prompt instructs Gemini to return only a valid JSON array of function call steps, with no extra text or explanation.
+    To extend the prompt for special cases, add details to the INSTRUCTIONS section of PROMPT_TEMPLATE.
+    Each tool's block is rendered once per catalog version and cached, so building a prompt is a join.
+    Args:
+        user_query (str): The user's natural language request.
+        tools (list): Tool dicts, best-ranked first (optional). Defaults to the whole catalog.
+        example (str): Example query and plan (optional).
+        compact (bool): Render tools with format_tool_description_compact.
+        token_budget (int): Approximate token cap for the whole prompt; lowest-ranked tools are trimmed first.
+    Returns:
+        str: The prompt.
     """
-    match = re.search(r'\[\s*\{.*?\}\s*\]', text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(0))
-        except Exception:
-            return None
-    return None 
\ No newline at end of file
+    if tools is None:
+        tools = load_tools()
+    if example is None:
+        example = DEFAULT_EXAMPLE
+    catalog = get_catalog()
+    renderer = format_tool_description_compact if compact else format_tool_description
+    tool_descriptions = [catalog.fragment(tool, renderer) for tool in tools]
+    if token_budget is not None:
+        base_tokens = estimate_tokens(PROMPT_TEMPLATE.format(tool_list_str='', example=example, user_query=user_query))
+        tool_descriptions = fit_to_token_budget(tool_descriptions, token_budget - base_tokens)
+    logger.debug("Filtered tools: %s", [t['name'] for t in tools[:len(tool_descriptions)]])
+    tool_list_str = '\n'.join(tool_descriptions)
+    return PROMPT_TEMPLATE.format(tool_list_str=tool_list_str, example=example, user_query=user_query)
@@ -0,0 +1,162 @@
+"""
+Two-tier cache for LLM responses: an in-process LRU in front of an on-disk SQLite store.
+Keys are a hash of the model, the whitespace-normalized prompt and the tool-catalog version, so a
+catalog edit never serves a plan built against old tool definitions.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+CACHE_DB_PATH = Path(__file__).parent.parent / 'data' / 'cache' / 'llm_responses.sqlite3'
+
+
+def normalize_prompt(prompt):
+    """Collapse runs of whitespace and strip the ends, so formatting-only differences share a key."""
+    return ' '.join(prompt.split())
+
+
+def make_cache_key(model, prompt, catalog_version=None):
+    """
+    Build the cache key for one LLM call.
+    Args:
+        model (str): Model identifier.
+        prompt (str): The prompt text (normalized before hashing).
+        catalog_version (str): Version of the tool catalog the prompt was built from (optional).
+    Returns:
+        str: Hex digest key.
+    """
+    payload = '\x1f'.join([model, catalog_version or '', normalize_prompt(prompt)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU memory tier plus SQLite disk tier, both size-bounded, with a shared TTL.
+    Disk hits are promoted into the memory tier. Hit/miss counters are available via stats().
+    """
+
+    def __init__(self, db_path=None, max_memory_entries=256, max_disk_entries=10000, ttl=7 * 24 * 3600):
+        """
+        Args:
+            db_path (str or Path): SQLite file (optional). Defaults to 'data/cache/llm_responses.sqlite3'.
+                                   Pass ':memory:' to keep the disk tier in memory.
+            max_memory_entries (int): Capacity of the in-process LRU.
+            max_disk_entries (int): Capacity of the SQLite store; least recently used rows are evicted.
+            ttl (float): Seconds an entry stays valid in either tier.
+        """
+        self.db_path = str(db_path or CACHE_DB_PATH)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _connection(self):
+        if self._conn is None:
+            if self.db_path != ':memory:':
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """
+        Return the cached response for a key, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value, created_at = row
+                if now - created_at < self.ttl:
+                    conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    self._remember(key, value, created_at)
+                    self._counters['disk_hits'] += 1
+                    return value
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+            self._counters['misses'] += 1
+            return None
+
+    def set(self, key, value):
+        """Store a response in both tiers, evicting expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            evicted = conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            ).rowcount
+            conn.commit()
+            self._counters['stores'] += 1
+            self._counters['evictions'] += max(evicted, 0)
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def stats(self):
+        """
+        Return hit/miss counters.
+        Returns:
+            dict: memory_hits, disk_hits, misses, stores, evictions, memory_entries and hit_rate.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide ResponseCache, creating it on first use."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,241 @@
+"""
+Pluggable tool retrievers.
+Every retriever implements search_batch(queries, top_n) -> one list of (tool dict, score) per query.
+- TfidfRetriever wraps the fitted ToolIndex (the default).
+- EmbeddingRetriever searches dense tool vectors computed offline with a local sentence-transformers
+  model. Vectors are stored as a float32 .npy file and memory-mapped; search goes through an hnswlib
+  approximate-nearest-neighbour index when one was built, otherwise through an exact NumPy product.
+- HybridRetriever blends dense and TF-IDF scores.
+Everything runs on CPU and never downloads a model. Build the dense index offline with:
+    python -m core.retrievers build [--model PATH] [--ann]
+"""
+import argparse
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+from core.tool_catalog import get_catalog
+from core.tool_index import build_tool_text, catalog_hash, top_k
+
+EMBEDDINGS_DIR = Path(__file__).parent.parent / 'data' / 'cache' / 'embeddings'
+DEFAULT_EMBEDDING_MODEL = os.getenv('MATE_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+
+
+class Retriever(ABC):
+    """Base class for tool retrievers; subclasses must implement search_batch()."""
+
+    def search(self, user_query, top_n=12):
+        """Return a list of (tool dict, score) tuples for one query, best first."""
+        return self.search_batch([user_query], top_n=top_n)[0]
+
+    @abstractmethod
+    def search_batch(self, queries, top_n=12):
+        """Return one list of (tool dict, score) tuples per query, best first."""
+
+
+class TfidfRetriever(Retriever):
+    """TF-IDF + cosine similarity over a fitted ToolIndex."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def search_batch(self, queries, top_n=12):
+        return self.index.search_batch(queries, top_n=top_n)
+
+
+class LocalEncoder:
+    """
+    Sentence-transformers encoder that only loads from local files and runs on CPU.
+    The model is loaded on first use.
+    """
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or DEFAULT_EMBEDDING_MODEL
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise ImportError(
+                            "Embedding retrieval needs the 'sentence-transformers' package: pip install sentence-transformers"
+                        ) from e
+                    self._model = SentenceTransformer(self.model_path, device='cpu', local_files_only=True)
+        return self._model
+
+    def encode(self, texts, batch_size=64):
+        """Return L2-normalised float32 embeddings, one row per text."""
+        vectors = self._load().encode(
+            list(texts), batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def build_embedding_index(tools, out_dir=None, model_path=None, ann=False, encoder=None):
+    """
+    Encode every tool offline and save the vectors (and optionally an ANN index).
+    Args:
+        tools (list): List of tool dicts.
+        out_dir (str or Path): Root directory (optional). Defaults to 'data/cache/embeddings'.
+        model_path (str): Local sentence-transformers model name or path (optional).
+        ann (bool): Also build an hnswlib index (requires the 'hnswlib' package).
+        encoder (LocalEncoder): Encoder to use instead of loading model_path (optional).
+    Returns:
+        Path: Directory holding vectors.npy, meta.json and, if built, ann.bin.
+    """
+    key = catalog_hash(tools)
+    encoder = encoder or LocalEncoder(model_path)
+    target = Path(out_dir or EMBEDDINGS_DIR) / key
+    target.mkdir(parents=True, exist_ok=True)
+    embedded = encoder.encode([build_tool_text(tool) for tool in tools])
+    vectors = np.lib.format.open_memmap(target / 'vectors.npy', mode='w+', dtype=np.float32, shape=embedded.shape)
+    vectors[:] = embedded
+    vectors.flush()
+    if ann:
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("ANN search needs the 'hnswlib' package: pip install hnswlib") from e
+        index = hnswlib.Index(space='ip', dim=embedded.shape[1])
+        index.init_index(max_elements=max(len(tools), 1), ef_construction=200, M=16)
+        if len(tools):
+            index.add_items(embedded, np.arange(len(tools)))
+        index.save_index(str(target / 'ann.bin'))
+    with open(target / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            'model': encoder.model_path,
+            'dim': int(embedded.shape[1]),
+            'names': [tool.get('name') for tool in tools],
+            'ann': bool(ann),
+        }, f)
+    return target
+
+
+class EmbeddingRetriever(Retriever):
+    """
+    Dense retrieval over memory-mapped tool vectors, with an optional hnswlib ANN index.
+    """
+
+    def __init__(self, tools, vectors, encoder, ann_index=None, chunk_size=256):
+        self.tools = tools
+        self.vectors = vectors
+        self.encoder = encoder
+        self.ann_index = ann_index
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def load(cls, tools, key=None, out_dir=None, encoder=None):
+        """
+        Load the vectors built for this exact catalog.
+        Returns:
+            EmbeddingRetriever or None: None if no matching vectors were built (see build_embedding_index).
+        """
+        source = Path(out_dir or EMBEDDINGS_DIR) / (key or catalog_hash(tools))
+        try:
+            with open(source / 'meta.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except OSError:
+            return None
+        if meta.get('names') != [tool.get('name') for tool in tools]:
+            return None
+        vectors = np.load(source / 'vectors.npy', mmap_mode='r')
+        ann_index = None
+        if meta.get('ann') and (source / 'ann.bin').exists():
+            try:
+                import hnswlib
+            except ImportError:
+                hnswlib = None  # Fall back to exact search
+            if hnswlib is not None:
+                ann_index = hnswlib.Index(space='ip', dim=meta['dim'])
+                ann_index.load_index(str(source / 'ann.bin'), max_elements=len(tools))
+        return cls(tools, vectors, encoder or _get_encoder(meta.get('model')), ann_index)
+
+    def score_queries(self, query_vectors, top_n):
+        """Top-N (indices, scores) per query vector: ANN when available, exact NumPy otherwise."""
+        k = min(top_n, len(self.tools))
+        if self.ann_index is not None:
+            self.ann_index.set_ef(max(64, 4 * k))
+            labels, distances = self.ann_index.knn_query(query_vectors, k=k)
+            return labels, 1.0 - distances
+        indices, scores = [], []
+        for start in range(0, len(query_vectors), self.chunk_size):
+            top, top_sims = top_k(query_vectors[start:start + self.chunk_size] @ self.vectors.T, k)
+            indices.append(top)
+            scores.append(top_sims)
+        return np.vstack(indices), np.vstack(scores)
+
+    def search_batch(self, queries, top_n=12):
+        queries = list(queries)
+        if not queries or not self.tools or top_n <= 0:
+            return [[] for _ in queries]
+        indices, scores = self.score_queries(self.encoder.encode(queries), top_n)
+        return [
+            [(self.tools[i], float(s)) for i, s in zip(row_indices, row_scores) if s > 0]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+
+class HybridRetriever(Retriever):
+    """
+    Blend of dense and TF-IDF retrieval: score = alpha * dense + (1 - alpha) * tfidf.
+    Each backend contributes its top `candidates` tools; a tool missing from one backend's candidates
+    scores 0 on that side.
+    """
+
+    def __init__(self, dense, sparse, alpha=0.5, candidates=50):
+        self.dense = dense
+        self.sparse = sparse
+        self.alpha = alpha
+        self.candidates = candidates
+
+    def search_batch(self, queries, top_n=12):
+        queries = list(queries)
+        pool = max(self.candidates, top_n)
+        results = []
+        for dense_hits, sparse_hits in zip(self.dense.search_batch(queries, pool), self.sparse.search_batch(queries, pool)):
+            combined = {}
+            for tool, score in dense_hits:
+                combined[tool.get('name')] = [tool, self.alpha * score]
+            for tool, score in sparse_hits:
+                entry = combined.setdefault(tool.get('name'), [tool, 0.0])
+                entry[1] += (1 - self.alpha) * score
+            ranked = sorted(combined.values(), key=lambda entry: entry[1], reverse=True)[:top_n]
+            results.append([(tool, score) for tool, score in ranked if score > 0])
+        return results
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def _get_encoder(model_path=None):
+    model_path = model_path or DEFAULT_EMBEDDING_MODEL
+    with _encoders_lock:
+        if model_path not in _encoders:
+            _encoders[model_path] = LocalEncoder(model_path)
+        return _encoders[model_path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dense tool-embedding index for the current catalog.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Encode all tools and save vectors (and optionally an ANN index).")
+    build.add_argument('--model', default=None, help="Local sentence-transformers model name or path.")
+    build.add_argument('--ann', action='store_true', help="Also build an hnswlib ANN index.")
+    build.add_argument('--out', default=None, help="Output root (defaults to data/cache/embeddings).")
+    args = parser.parse_args()
+    catalog = get_catalog()
+    target = build_embedding_index(catalog.tools, out_dir=args.out, model_path=args.model, ann=args.ann)
+    print(f"Wrote {len(catalog.tools)} tool vectors to {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Process-wide tool catalog service.
+The catalog loads data/function_tools.json once and then only re-reads it when the file's mtime or
+size changes. Edits are applied as a delta: only added or edited tools are re-vectorized in the
+retrieval index, and only their cached prompt fragments are dropped. A file that does not parse (e.g.
+saved mid-edit) is logged and skipped, and the previous catalog is served until the next change.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from core.tool_index import ToolIndex, catalog_hash
+
+logger = logging.getLogger(__name__)
+
+TOOLS_PATH = Path(__file__).parent.parent / 'data' / 'function_tools.json'
+CATALOG_FORMAT = os.getenv('MATE_CATALOG_FORMAT', 'json')  # 'json' (hot-reloading) or 'binary' (core.catalog_binary)
+
+
+def _tool_hash(tool):
+    return catalog_hash([tool])
+
+
+class ToolCatalog:
+    """
+    A hot-reloading view of the tool JSON file.
+    Attributes:
+        tools (list): Current tool dicts, in file order. Replaced (never mutated) on reload.
+        by_name (dict): Tool name -> tool dict.
+        version (str): Hash of the current catalog content.
+    """
+
+    def __init__(self, json_path=None, check_interval=1.0, rebuild_ratio=0.2):
+        """
+        Args:
+            json_path (str or Path): Path to the JSON file (optional). Defaults to 'data/function_tools.json'.
+            check_interval (float): Minimum seconds between file stat checks in maybe_refresh().
+            rebuild_ratio (float): Refit the retrieval index from scratch once this fraction of tools
+                                   has been indexed against an older vocabulary.
+        """
+        self.json_path = Path(json_path or TOOLS_PATH)
+        self.check_interval = check_interval
+        self.rebuild_ratio = rebuild_ratio
+        self.tools = []
+        self.by_name = {}
+        self.version = None
+        self._tool_hashes = {}
+        self._file_stat = None
+        self._last_check = 0.0
+        self._index = None
+        self._stale_tools = set()
+        self._fragments = {}
+        self._lock = threading.RLock()
+        self.refresh(force=True)
+
+    def maybe_refresh(self):
+        """Call refresh() if at least check_interval seconds have passed since the last check."""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.refresh()
+
+    def refresh(self, force=False):
+        """
+        Reload the JSON file if it changed on disk and apply the differences.
+        Args:
+            force (bool): Re-read the file even if its mtime and size are unchanged.
+        Returns:
+            bool: True if the catalog content changed.
+        Raises:
+            ValueError: If the file is not valid JSON on the first load (later, the previous catalog is kept).
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            stat = self.json_path.stat()
+            file_stat = (stat.st_mtime_ns, stat.st_size)
+            if not force and file_stat == self._file_stat:
+                return False
+            self._file_stat = file_stat
+            try:
+                with open(self.json_path, 'r', encoding='utf-8') as f:
+                    tools = json.load(f)
+            except ValueError as e:
+                if self.version is None:
+                    raise
+                logger.error("Could not parse %s (%s); keeping the previous tool catalog.", self.json_path, e)
+                return False
+            return self._apply(tools)
+
+    def _apply(self, tools):
+        tool_hashes = {tool.get('name'): _tool_hash(tool) for tool in tools}
+        changed = {name for name, h in tool_hashes.items() if self._tool_hashes.get(name) != h}
+        removed = set(self._tool_hashes) - set(tool_hashes)
+        if self.version is not None and not changed and not removed and \
+                [t.get('name') for t in tools] == [t.get('name') for t in self.tools]:
+            return False
+        version = catalog_hash(tools)
+
+        if self._index is not None:
+            self._stale_tools = (self._stale_tools | changed) - removed
+            if len(self._stale_tools) > self.rebuild_ratio * max(len(tools), 1):
+                self._index = None
+            else:
+                self._index = self._index.updated(tools, changed, key=version)
+
+        for key in [k for k in self._fragments if k[0] in changed or k[0] in removed]:
+            del self._fragments[key]
+
+        self.by_name = {tool.get('name'): tool for tool in tools}
+        self.tools = tools
+        self._tool_hashes = tool_hashes
+        self.version = version
+        return True
+
+    @property
+    def index(self):
+        """The retrieval ToolIndex for the current tools, loaded or fitted on first use."""
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = ToolIndex.load_or_build(self.tools, key=self.version)
+                    self._stale_tools = set()
+                index = self._index
+        return index
+
+    def get(self, name):
+        """Return the tool dict with this name, or None."""
+        return self.by_name.get(name)
+
+    def fragment(self, tool, renderer):
+        """
+        Return renderer(tool), cached per tool until that tool changes in the catalog.
+        Tools that are not the catalog's own objects are rendered without caching.
+        """
+        name = tool.get('name')
+        if self.by_name.get(name) is not tool:
+            return renderer(tool)
+        key = (name, renderer)
+        text = self._fragments.get(key)
+        if text is None:
+            text = renderer(tool)
+            self._fragments[key] = text
+        return text
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the process-wide catalog for data/function_tools.json, checking the file for edits.
+    With MATE_CATALOG_FORMAT=binary the memory-mapped compiled catalog is served instead (compiled
+    on first use if missing or stale); it has the same interface but does not hot-reload.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                if CATALOG_FORMAT == 'binary':
+                    from core.catalog_binary import load_binary_catalog
+                    _catalog = load_binary_catalog()
+                else:
+                    _catalog = ToolCatalog()
+                return _catalog
+    _catalog.maybe_refresh()
+    return _catalog
+
+
+def find_catalog(tools):
+    """Return the loaded process-wide catalog if `tools` is its current tool list, else None."""
+    catalog = _catalog
+    if catalog is not None and catalog.tools is tools:
+        return catalog
+    return None
@@ -1,46 +1,118 @@
 """
 Tool filtering logic for the AI Task Planner.
-This module exposes a single function, filter_relevant_tools, which selects the most relevant tools for a user query using TF-IDF + cosine similarity.
+This module exposes filter_relevant_tools, which selects the most relevant tools for a user query using TF-IDF + cosine similarity.
+filter_relevant_tools_batch does the same for many queries at once.
+The TF-IDF index is fitted once per catalog (see core/tool_index.py) and reused across queries.
+Other retrieval backends (dense embeddings, hybrid) are selected with the MATE_RETRIEVER environment
+variable or by passing a retriever from core/retrievers.py.
 """
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+import warnings
 
-def filter_relevant_tools(user_query, tools, top_n=12):
+from core.retrievers import EmbeddingRetriever, HybridRetriever, TfidfRetriever
+from core.tool_catalog import find_catalog
+from core.tool_index import ToolIndex, catalog_hash
+
+RETRIEVER = os.getenv('MATE_RETRIEVER', 'tfidf')  # 'tfidf', 'embedding' or 'hybrid'
+
+# Most recently used tools list and its index, so repeat calls with the same list skip hashing
+_last_tools = None
+_last_index = None
+_indexes = {}
+
+
+def get_tool_index(tools):
     """
-    Return the top-N most relevant tools for a user query using TF-IDF + cosine similarity.
+    Return a fitted ToolIndex for the given tools, reusing in-memory and on-disk indexes.
+    Args:
+        tools (list): List of tool dicts.
+    Returns:
+        ToolIndex: The index for this exact catalog content.
+    """
+    global _last_tools, _last_index
+    catalog = find_catalog(tools)
+    if catalog is not None:
+        return catalog.index
+    if tools is _last_tools and _last_index is not None:
+        return _last_index
+    key = catalog_hash(tools)
+    index = _indexes.get(key)
+    if index is None:
+        if len(_indexes) >= 8:
+            _indexes.clear()
+        index = ToolIndex.load_or_build(tools)
+        _indexes[key] = index
+    elif index.tools is not tools:
+        index = ToolIndex(tools, index.vectorizer, index.matrix, key)
+    _last_tools, _last_index = tools, index
+    return index
+
+
+def get_retriever(tools, kind=None):
+    """
+    Return a retriever over the given tools.
+    Args:
+        tools (list): List of tool dicts.
+        kind (str): 'tfidf', 'embedding' or 'hybrid' (optional). Defaults to MATE_RETRIEVER.
+    Returns:
+        Retriever: The requested backend. Falls back to TF-IDF with a warning when no dense vectors
+                   were built for this catalog (see `python -m core.retrievers build`).
+    """
+    kind = kind or RETRIEVER
+    index = get_tool_index(tools)
+    sparse = TfidfRetriever(index)
+    if kind == 'tfidf':
+        return sparse
+    if kind not in ('embedding', 'hybrid'):
+        raise ValueError(f"Unknown retriever '{kind}'. Use 'tfidf', 'embedding' or 'hybrid'.")
+    dense = _dense_retrievers.get(index.key)
+    if dense is None:
+        dense = EmbeddingRetriever.load(tools, key=index.key)
+        if dense is None:
+            warnings.warn("No tool embeddings built for this catalog; using TF-IDF. Run `python -m core.retrievers build`.")
+            return sparse
+        _dense_retrievers.clear()
+        _dense_retrievers[index.key] = dense
+    elif dense.tools is not tools:
+        dense = EmbeddingRetriever(tools, dense.vectors, dense.encoder, dense.ann_index)
+    return dense if kind == 'embedding' else HybridRetriever(dense, sparse)
+
+
+_dense_retrievers = {}
+
+
+def filter_relevant_tools(user_query, tools, top_n=12, retriever=None):
+    """
+    Return the top-N most relevant tools for a user query using TF-IDF + cosine similarity
+    (or the configured retrieval backend).
     Args:
         user_query (str): The user's natural language request.
         tools (list): List of tool dicts (with 'name', 'description', and 'keywords' fields).
         top_n (int): Number of top relevant tools to return.
+        retriever (Retriever): Backend to use instead of get_retriever(tools) (optional).
     Returns:
         list: List of top-N relevant tool dicts.
     """
-    tool_texts = []
-    for tool in tools:
-        name = tool.get('name', '')
-        description = tool.get('description', '')
-        keywords = ' '.join(tool.get('keywords', []))
-        category = tool.get('category', '')
-        tags = ' '.join(tool.get('tags', []))
-
-        parameters_descriptions = []
-        if isinstance(tool.get('input'), dict):
-            for param_info in tool['input'].values():
-                if isinstance(param_info, dict) and 'description' in param_info:
-                    parameters_descriptions.append(param_info['description'])
-
-        param_desc_text = ' '.join(parameters_descriptions)
-
-        # Combine all relevant text fields for creating the tool's representation
-        text = f"{name} {description} {keywords} {category} {tags} {param_desc_text}"
-        tool_texts.append(text)
-
-    corpus = tool_texts + [user_query]
-    vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(corpus)
-    query_vec = tfidf_matrix[-1]
-    tool_vecs = tfidf_matrix[:-1]
-    sims = cosine_similarity(query_vec, tool_vecs).flatten()
-    top_indices = sims.argsort()[::-1][:top_n]
-    relevant_tools = [tools[i] for i in top_indices if sims[i] > 0]
-    return relevant_tools 
\ No newline at end of file
+    retriever = retriever or get_retriever(tools)
+    return [tool for tool, _ in retriever.search(user_query, top_n=top_n)]
+
+
+def filter_relevant_tools_batch(queries, tools, top_n=12, retriever=None):
+    """
+    Return the top-N most relevant tools for each of many queries in one vectorized pass.
+    Much faster than calling filter_relevant_tools per query for offline evaluation and bulk planning.
+    Args:
+        queries (list): List of natural language requests.
+        tools (list): List of tool dicts (with 'name', 'description', and 'keywords' fields).
+        top_n (int): Number of top relevant tools to return per query.
+        retriever (Retriever): Backend to use instead of get_retriever(tools) (optional).
+    Returns:
+        tuple: (ranked_tools, ranked_scores), where ranked_tools[i] is the list of tool dicts for
+               queries[i], best first, and ranked_scores[i] holds the matching similarity scores.
+    """
+    ranked_tools, ranked_scores = [], []
+    retriever = retriever or get_retriever(tools)
+    for hits in retriever.search_batch(queries, top_n=top_n):
+        ranked_tools.append([tool for tool, _ in hits])
+        ranked_scores.append([score for _, score in hits])
+    return ranked_tools, ranked_scores
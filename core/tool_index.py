@@ -0,0 +1,237 @@
+"""
+Prebuilt TF-IDF index over the tool catalog.
+The vectorizer is fitted once per catalog; lookups only transform the query. Fitted indexes are
+saved to disk (sparse matrix as .npz plus a vocabulary/idf JSON file) keyed by a hash of the tools,
+so new workers start warm and only rebuild when the catalog changes.
+NumPy, SciPy and scikit-learn are imported on first use, so importing this module (and everything
+that imports the catalog) stays cheap until an index is actually needed.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+INDEX_CACHE_DIR = Path(__file__).parent.parent / 'data' / 'cache' / 'tool_index'
+
+
+def catalog_hash(tools):
+    """
+    Return a stable hash of a list of tool dicts.
+    Args:
+        tools (list): List of tool dicts.
+    Returns:
+        str: Hex digest identifying this exact catalog content.
+    """
+    payload = json.dumps(tools, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def build_tool_text(tool):
+    """
+    Build the text used to represent a tool for retrieval.
+    Args:
+        tool (dict): Tool dict (with 'name', 'description', and 'keywords' fields).
+    Returns:
+        str: Combined name, description, keywords, category, tags and parameter descriptions.
+    """
+    name = tool.get('name', '')
+    description = tool.get('description', '')
+    keywords = ' '.join(tool.get('keywords', []))
+    category = tool.get('category', '')
+    tags = ' '.join(tool.get('tags', []))
+
+    parameters_descriptions = []
+    if isinstance(tool.get('input'), dict):
+        for param_info in tool['input'].values():
+            if isinstance(param_info, dict) and 'description' in param_info:
+                parameters_descriptions.append(param_info['description'])
+
+    param_desc_text = ' '.join(parameters_descriptions)
+
+    # Combine all relevant text fields for creating the tool's representation
+    return f"{name} {description} {keywords} {category} {tags} {param_desc_text}"
+
+
+def _tool_names(tools):
+    # Lazy tool lists (core.catalog_binary.LazyTools) list their names without decoding every tool
+    names = getattr(tools, 'names', None)
+    return names() if callable(names) else [tool.get('name') for tool in tools]
+
+
+def _tfidf_vectorizer(**kwargs):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(stop_words='english', **kwargs)
+
+
+def top_k(sims, k):
+    """
+    Row-wise top-k of a dense score matrix using argpartition (only the selected columns are sorted).
+    Args:
+        sims (ndarray): Scores, one row per query.
+        k (int): Number of columns to keep per row.
+    Returns:
+        tuple: (indices, scores) arrays of shape (rows, min(k, columns)), best first.
+    """
+    import numpy as np
+    n = sims.shape[1]
+    k = min(k, n)
+    if k < n:
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(n), (sims.shape[0], 1))
+    top_sims = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_sims, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_sims, order, axis=1)
+
+
+class ToolIndex:
+    """
+    A fitted TF-IDF index over a list of tools.
+    Rows of the matrix are L2-normalised, so a dot product with a transformed query is the cosine similarity.
+    """
+
+    def __init__(self, tools, vectorizer, matrix, key):
+        self.tools = tools
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.key = key
+
+    @classmethod
+    def build(cls, tools, key=None, texts=None):
+        """Fit a new index over the given tools (or over their precomputed build_tool_text texts)."""
+        vectorizer = _tfidf_vectorizer()
+        if texts is None:
+            texts = [build_tool_text(tool) for tool in tools]
+        matrix = vectorizer.fit_transform(texts).tocsr()
+        return cls(tools, vectorizer, matrix, key or catalog_hash(tools))
+
+    @classmethod
+    def load(cls, tools, key, cache_dir=None):
+        """
+        Load a previously saved index for the given catalog key.
+        Returns:
+            ToolIndex or None: The index, or None if nothing valid is saved for this key.
+        """
+        cache_dir = Path(cache_dir or INDEX_CACHE_DIR)
+        matrix_path = cache_dir / f"{key}.npz"
+        vocab_path = cache_dir / f"{key}.vocab.json"
+        if not matrix_path.exists() or not vocab_path.exists():
+            return None
+        import numpy as np
+        from scipy import sparse
+        try:
+            with open(vocab_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            matrix = sparse.load_npz(matrix_path).tocsr()
+        except Exception:
+            return None
+        if saved.get('names') != _tool_names(tools) or matrix.shape[0] != len(tools):
+            return None
+        vectorizer = _tfidf_vectorizer(vocabulary=saved['vocabulary'])
+        vectorizer.idf_ = np.asarray(saved['idf'], dtype=np.float64)
+        return cls(tools, vectorizer, matrix, key)
+
+    @classmethod
+    def load_or_build(cls, tools, cache_dir=None, key=None):
+        """
+        Return the saved index for this catalog if there is one, otherwise fit and save a new one.
+        Args:
+            tools (list): List of tool dicts.
+            cache_dir (str or Path): Directory for saved indexes (optional).
+                                     Defaults to 'data/cache/tool_index'.
+            key (str): Precomputed catalog_hash(tools) (optional).
+        Returns:
+            ToolIndex: A fitted index.
+        """
+        key = key or catalog_hash(tools)
+        index = cls.load(tools, key, cache_dir)
+        if index is None:
+            index = cls.build(tools, key)
+            try:
+                index.save(cache_dir)
+            except OSError:
+                pass  # A read-only deployment can still use the in-memory index
+        return index
+
+    def save(self, cache_dir=None):
+        """Save the matrix and vocabulary under this index's catalog key."""
+        from scipy import sparse
+        cache_dir = Path(cache_dir or INDEX_CACHE_DIR)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        sparse.save_npz(cache_dir / f"{self.key}.npz", self.matrix)
+        vocabulary = {term: int(col) for term, col in self.vectorizer.vocabulary_.items()}
+        with open(cache_dir / f"{self.key}.vocab.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                'names': _tool_names(self.tools),
+                'vocabulary': vocabulary,
+                'idf': self.vectorizer.idf_.tolist(),
+            }, f)
+
+    def updated(self, tools, changed_names, key=None):
+        """
+        Return a new index for an edited catalog, re-vectorizing only the changed tools.
+        Unchanged rows are reused and changed or added tools are transformed with the current
+        vocabulary and IDF, so terms that only appear in new text are ignored until the next full build.
+        Args:
+            tools (list): The full new list of tool dicts.
+            changed_names (set): Names of tools that were added or edited.
+            key (str): Catalog key of the new tool list (optional).
+        Returns:
+            ToolIndex: A new index; this one is left untouched for readers still using it.
+        """
+        import numpy as np
+        from scipy import sparse
+        old_rows = {tool.get('name'): i for i, tool in enumerate(self.tools)}
+        kept_rows, fresh_texts, order = [], [], []
+        for tool in tools:
+            name = tool.get('name')
+            if name in old_rows and name not in changed_names:
+                order.append(('kept', len(kept_rows)))
+                kept_rows.append(old_rows[name])
+            else:
+                order.append(('fresh', len(fresh_texts)))
+                fresh_texts.append(build_tool_text(tool))
+        kept = self.matrix[np.asarray(kept_rows, dtype=np.intp)]
+        fresh = self.transform(fresh_texts) if fresh_texts else sparse.csr_matrix((0, self.matrix.shape[1]))
+        stacked = sparse.vstack([kept, fresh]).tocsr()
+        permutation = [pos if kind == 'kept' else len(kept_rows) + pos for kind, pos in order]
+        matrix = stacked[np.asarray(permutation, dtype=np.intp)]
+        return ToolIndex(tools, self.vectorizer, matrix, key or catalog_hash(tools))
+
+    def transform(self, queries):
+        """Transform a list of query strings into L2-normalised TF-IDF rows."""
+        return self.vectorizer.transform(queries)
+
+    def search(self, user_query, top_n=12):
+        """
+        Return the top-N tools for a query, best first.
+        Args:
+            user_query (str): The user's natural language request.
+            top_n (int): Number of top relevant tools to return.
+        Returns:
+            list: List of (tool dict, score) tuples with a score above zero.
+        """
+        return self.search_batch([user_query], top_n=top_n)[0]
+
+    def search_batch(self, queries, top_n=12, chunk_size=1024):
+        """
+        Return the top-N tools for each of many queries, best first.
+        All queries are transformed into one sparse matrix and scored against the tool matrix with a
+        single product per chunk; top-N selection uses argpartition rather than a full sort.
+        Args:
+            queries (list): List of natural language requests.
+            top_n (int): Number of top relevant tools to return per query.
+            chunk_size (int): Number of queries scored per product, bounding the dense score matrix.
+        Returns:
+            list: One list of (tool dict, score) tuples per query, each with a score above zero.
+        """
+        queries = list(queries)
+        k = min(top_n, len(self.tools))
+        if k <= 0:
+            return [[] for _ in queries]
+        results = []
+        for start in range(0, len(queries), chunk_size):
+            query_matrix = self.transform(queries[start:start + chunk_size])
+            top, top_sims = top_k((query_matrix @ self.matrix.T).toarray(), k)
+            for row_indices, row_sims in zip(top, top_sims):
+                results.append([(self.tools[i], float(s)) for i, s in zip(row_indices, row_sims) if s > 0])
+        return results
@@ -1,5 +1,6 @@
 import json
 from pathlib import Path
+from core.tool_catalog import get_catalog
 
 def load_tool_schema(json_path=None):
     """
@@ -11,10 +12,11 @@ def load_tool_schema(json_path=None):
                                  Defaults to 'data/function_tools.json'.
     Returns:
         list: List of tool definitions, where each tool is a dictionary
-              conforming to the enhanced schema.
+              conforming to the enhanced schema. The default file is served from the shared
+              ToolCatalog, so the returned list must not be mutated.
     """
     if json_path is None:
-        json_path = Path(__file__).parent.parent / 'data' / 'function_tools.json'
+        return get_catalog().tools
     with open(json_path, 'r', encoding='utf-8') as f:
         return json.load(f)
  
\ No newline at end of file
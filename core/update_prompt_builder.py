@@ -1,7 +1,31 @@
+import json
+from core.tool_catalog import get_catalog
+
 class UpdatePromptBuilder:
+    @staticmethod
+    def compact_tool_json(tool):
+        """
+        Render one tool as compact JSON for the update prompt: name, description, parameter types and
+        constraints only (no meta, author, version, tags or keywords).
+        """
+        def params(schema):
+            if not isinstance(schema, dict):
+                return {}
+            return {k: v.get('type', 'unknown') if isinstance(v, dict) else 'unknown' for k, v in schema.items()}
+        compact = {
+            "name": tool.get('name'),
+            "description": tool.get('description', ''),
+            "input": params(tool.get('input')),
+            "output": params(tool.get('output')),
+        }
+        if tool.get('constraints'):
+            compact["constraints"] = tool['constraints']
+        return json.dumps(compact, ensure_ascii=False, separators=(',', ':'))
+
     @staticmethod
     def build_update_prompt(user_query, current_plan, update_instruction, relevant_tools):
-        import json
+        catalog = get_catalog()
+        tools_json = '[' + ',\n'.join(catalog.fragment(t, UpdatePromptBuilder.compact_tool_json) for t in relevant_tools) + ']'
         return (
             "You are an expert AI workflow planner. You are assisting a user in updating a step-by-step function call plan using a library of available tools."
             "\n\nContext:"
@@ -22,6 +46,34 @@ class UpdatePromptBuilder:
             "\n\nUser's Update Request:"
             f"\n{update_instruction}"
             "\n\nCurrent Plan (JSON array):\n" + json.dumps(current_plan, indent=2) +
-            "\n\nAvailable Tools (JSON array):\n" + json.dumps(relevant_tools, indent=2) +
+            "\n\nAvailable Tools (JSON array):\n" + tools_json +
             "\n\nReturn ONLY the updated plan as a valid JSON array."
+        )
+
+    @staticmethod
+    def build_patch_prompt(user_query, current_plan, update_instruction, relevant_tools):
+        """
+        Build a prompt asking for the edit as patch operations (see core.plan_patch) instead of the whole
+        updated plan, so the model's output scales with the size of the change rather than of the plan.
+        """
+        catalog = get_catalog()
+        tools_json = '[' + ',\n'.join(catalog.fragment(t, UpdatePromptBuilder.compact_tool_json) for t in relevant_tools) + ']'
+        plan_lines = '\n'.join(
+            f"/{i}: " + json.dumps(step, ensure_ascii=False, separators=(',', ':')) for i, step in enumerate(current_plan)
+        )
+        return (
+            "You are an expert AI workflow planner. You are editing an existing step-by-step function call plan."
+            f"\n\nOriginal request:\n{user_query}"
+            f"\n\nUser's Update Request:\n{update_instruction}"
+            "\n\nCurrent Plan (one step per line, prefixed with its 0-based path):\n" + plan_lines +
+            "\n\nAvailable Tools (JSON array):\n" + tools_json +
+            "\n\nDescribe ONLY the changes as a JSON array of patch operations, applied in order:"
+            '\n- {"op": "add", "path": "/N", "value": {"function": "...", "inputs": {...}}} inserts a step before index N ("/-" appends)'
+            '\n- {"op": "remove", "path": "/N"} deletes step N'
+            '\n- {"op": "replace", "path": "/N", "value": {...}} replaces step N'
+            '\n- {"op": "replace", "path": "/N/function", "value": "tool_name"} changes the tool of step N'
+            '\n- {"op": "add", "path": "/N/inputs/name", "value": ...} sets an input; {"op": "remove", "path": "/N/inputs/name"} drops it'
+            '\n- {"op": "move", "from": "/N", "path": "/M"} moves step N to index M'
+            "\n\nRules: only use tools from the list; do not invent values (use \"?\" for unknown inputs); leave unrelated steps untouched."
+            "\nReturn ONLY the JSON array of operations, with no explanation."
         ) 
\ No newline at end of file
@@ -1,10 +1,20 @@
+import argparse
+import json
 import sys
 from core.prompt_builder import build_prompt
-from core.openrouter_api import call_mistral
 from core.tool_schema import load_tool_schema
 
 
-def main():
+def get_llm(backend):
+    """Return the prompt -> response callable for a backend name ('gemini' or 'stub'; 'router' plans without one)."""
+    if backend == 'stub':
+        from bench.stub_llm import stub_llm
+        return stub_llm
+    from core.openrouter_api import call_gemini
+    return call_gemini
+
+
+def interactive(args):
     print("\n=== Student AI Function Planner (CLI) ===\n")
     tools = load_tool_schema()
     user_query = input("Enter your request: ")
@@ -13,10 +23,68 @@ def main():
     print(prompt)
     print("\n--- LLM Response ---\n")
     try:
-        response = call_mistral(prompt)
+        if args.backend == 'router':
+            from core.backend_router import get_router
+            routed = get_router().plan(user_query, tools)
+            print(f"[{routed['backend']}, {routed['kind']}, {routed['elapsed']:.2f}s]")
+            print(json.dumps(routed['plan'], indent=2))
+            return
+        response = get_llm(args.backend)(prompt)
         print(response)
     except Exception as e:
         print(f"Error: {e}")
 
+
+def batch(args):
+    from core.batch_planner import read_queries, run_batch
+    from core.backend_router import get_router
+    from core.plan_cache import get_plan_cache
+
+    source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    try:
+        counts = run_batch(
+            read_queries(source),
+            None if args.backend == 'router' else get_llm(args.backend),
+            args.output,
+            workers=args.workers,
+            rate=args.rate,
+            timeout=args.timeout,
+            resume=args.resume,
+            top_n=args.top_n,
+            plan_cache=get_plan_cache() if args.reuse_similar else None,
+            router=get_router() if args.backend == 'router' else None,
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"Planned {counts['planned']}, failed {counts['failed']}, skipped {counts['skipped']} -> {args.output}",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Toolmate command-line planner.")
+    parser.add_argument('--backend', choices=['gemini', 'stub', 'router'], default='gemini',
+                        help="LLM backend ('stub' is a deterministic offline stand-in; 'router' hedges and fails over "
+                             "across the backends listed in MATE_BACKENDS, e.g. gemini,local).")
+    sub = parser.add_subparsers(dest='command')
+    batch_parser = sub.add_parser('batch', help="Plan many queries concurrently and write JSONL results.")
+    # Also accepted after "batch"; SUPPRESS keeps the top-level value when it is not repeated here
+    batch_parser.add_argument('--backend', choices=['gemini', 'stub', 'router'], default=argparse.SUPPRESS,
+                              help="LLM backend (same as the top-level --backend).")
+    batch_parser.add_argument('--input', default='-', help="JSONL ({'id', 'query'}) or plain-text file; '-' for stdin.")
+    batch_parser.add_argument('--output', required=True, help="JSONL file to write plans to.")
+    batch_parser.add_argument('--workers', type=int, default=8, help="Concurrent LLM calls.")
+    batch_parser.add_argument('--rate', type=float, default=None, help="Maximum LLM calls per second.")
+    batch_parser.add_argument('--timeout', type=float, default=None, help="Per-item timeout in seconds.")
+    batch_parser.add_argument('--resume', action='store_true', help="Skip ids already planned in --output.")
+    batch_parser.add_argument('--top-n', type=int, default=12, help="Tools retrieved per query.")
+    batch_parser.add_argument('--reuse-similar', action='store_true',
+                              help="Reuse plans for near-duplicate queries instead of calling the LLM again.")
+    args = parser.parse_args()
+    if args.command == 'batch':
+        batch(args)
+    else:
+        interactive(args)
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
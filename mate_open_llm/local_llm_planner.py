@@ -1,16 +1,170 @@
-import json
-import torch
-import re
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+import copy
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.plan_grammar import PlanGrammar
+from core.plan_parsing import StepStreamParser, extract_json_array
+from core.tool_index import catalog_hash
 
 MODEL_NAME = "mistralai/Mistral-7B-Instruct-v0.2"  # Change to your preferred model
+DEFAULT_MAX_NEW_TOKENS = int(os.getenv('MATE_LOCAL_MAX_NEW_TOKENS', '512'))
+DEFAULT_BATCH_SIZE = 8
+PREFIX_CACHE_SIZE = 4  # Prefixes (tool sets) whose past key/values are kept in memory
+GRAMMAR_TOP_K = 16  # Best-scoring tokens checked against the plan grammar before scanning the whole vocabulary
 
-# trust_remote_code=True is needed for some custom models (see Hugging Face docs)
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
-model = AutoModelForCausalLM.from_pretrained(MODEL_NAME, torch_dtype=torch.float16, trust_remote_code=True)
-generator = pipeline("text-generation", model=model, tokenizer=tokenizer)
 
-def build_prompt(user_query, tools, example=None):
+class LocalModel:
+    """
+    Process-wide holder for the local model and tokenizer.
+    Nothing (not even torch) is imported until the first generation, so importing this module is cheap.
+    """
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self._tokenizer = None
+        self._model = None
+        self._token_strings = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the tokenizer and model once; returns (tokenizer, model)."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import torch
+                    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+                    # trust_remote_code=True is needed for some custom models (see Hugging Face docs)
+                    tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+                    # Decoder-only models must be left-padded so every prompt ends where generation starts
+                    tokenizer.padding_side = 'left'
+                    if tokenizer.pad_token is None:
+                        tokenizer.pad_token = tokenizer.eos_token
+                    dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+                    model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=dtype, trust_remote_code=True)
+                    model.eval()
+                    self._tokenizer = tokenizer
+                    self._model = model
+        return self._tokenizer, self._model
+
+    def token_strings(self):
+        """
+        Text of every vocabulary token as it appears mid-sequence (with any leading space), computed once.
+        Special tokens map to None.
+        """
+        if self._token_strings is None:
+            tokenizer, _ = self.load()
+            with self._lock:
+                if self._token_strings is None:
+                    # Decode each token after an anchor so tokenizers that drop a word's leading space
+                    # when it starts the text (e.g. SentencePiece) still report it
+                    anchor = tokenizer.encode('a', add_special_tokens=False)[-1]
+                    anchor_len = len(tokenizer.decode([anchor]))
+                    special = set(tokenizer.all_special_ids)
+                    self._token_strings = [
+                        None if token_id in special else tokenizer.decode([anchor, token_id])[anchor_len:]
+                        for token_id in range(len(tokenizer))
+                    ]
+        return self._token_strings
+
+
+_local_model = LocalModel()
+
+
+def get_local_model():
+    """Return the shared LocalModel holder."""
+    return _local_model
+
+
+class JsonArrayStop:
+    """
+    Stopping criterion that ends a sequence once the plan's JSON array has closed.
+    Only the newest token of each row is decoded per step and fed to a StepStreamParser, so the
+    check stays cheap however long the output gets. Returns one flag per row, so finished rows stop
+    while the rest of the batch keeps generating. Setting `cancel_event` stops every row at the next token.
+    """
+
+    def __init__(self, tokenizer, batch_size, cancel_event=None):
+        self.tokenizer = tokenizer
+        self.parsers = [StepStreamParser() for _ in range(batch_size)]
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return torch.ones(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        for parser, token_id in zip(self.parsers, input_ids[:, -1].tolist()):
+            if not parser.done:
+                parser.feed(self.tokenizer.decode([token_id], skip_special_tokens=True))
+        return torch.tensor([parser.done for parser in self.parsers], dtype=torch.bool, device=input_ids.device)
+
+class PlanGrammarLogitsProcessor:
+    """
+    Logits processor that only lets the model write plans accepted by a PlanGrammar: a JSON array of
+    {"function", "inputs"} steps using the offered tool names and their input keys.
+    Each row keeps a grammar state that is advanced by the token chosen at the previous step. The
+    GRAMMAR_TOP_K best-scoring tokens are checked first; only if none fits is the whole vocabulary
+    scanned, best first. Once the array is closed only EOS is allowed.
+    """
+
+    def __init__(self, grammar, token_strings, eos_token_id, batch_size, top_k=GRAMMAR_TOP_K):
+        self.grammar = grammar
+        self.token_strings = token_strings
+        self.eos_token_id = eos_token_id
+        self.top_k = top_k
+        self.states = [grammar.initial()] * batch_size
+        self._started = False
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        if self._started:
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                state = self.states[row]
+                if state is not None and not self.grammar.is_complete(state):
+                    self.states[row] = self.grammar.advance(state, self._text(token_id))
+        self._started = True
+        mask = torch.full_like(scores, float('-inf'))
+        for row, state in enumerate(self.states):
+            if state is None:
+                mask[row] = 0  # Lost track of this row (should not happen); leave it unconstrained
+            else:
+                mask[row, self._allowed(state, scores[row])] = 0
+        return scores + mask
+
+    def _text(self, token_id):
+        return self.token_strings[token_id] if token_id < len(self.token_strings) else None
+
+    def _valid(self, state, token_id):
+        text = self._text(token_id)
+        return bool(text) and self.grammar.advance(state, text) is not None
+
+    def _allowed(self, state, row_scores):
+        import torch
+
+        if self.grammar.is_complete(state):
+            return [self.eos_token_id]
+        candidates = torch.topk(row_scores, min(self.top_k, row_scores.shape[-1])).indices.tolist()
+        allowed = [token_id for token_id in candidates if self._valid(state, token_id)]
+        if allowed:
+            return allowed
+        for token_id in torch.argsort(row_scores, descending=True).tolist():
+            if self._valid(state, token_id):
+                return [token_id]
+        return [self.eos_token_id]
+
+
+def build_prompt_prefix(tools, example=None):
+    """
+    Shared part of the planning prompt: instructions, tools and example.
+    It is identical for every query over the same tools, so its past key/values can be computed once
+    and reused (see PrefixCache).
+    """
     tool_descriptions = []
     for tool in tools:
         args = ', '.join([f"{k}: {v}" for k, v in tool['input'].items()])
@@ -31,7 +185,7 @@ def build_prompt(user_query, tools, example=None):
   {"function": "generateEmailTool", "inputs": {"content": "?"}},
   {"function": "sendEmailTool", "inputs": {"to": "?", "content": "?"}}
 ]'''
-    prompt = f"""
+    prefix = f"""
 You are an AI workflow planner. Break down the user's request into a sequence of function calls using only the tools below.
 
 INSTRUCTIONS:
@@ -47,27 +201,177 @@ TOOLS:
 
 EXAMPLE:
 {example}
+"""
+    return prefix
+
 
+def build_prompt_suffix(user_query):
+    """
+    Query-specific part of the planning prompt.
+    It starts with a newline so the prefix/suffix split falls on a token boundary (see _encode_suffixes).
+    """
+    return f"""
 User query:
 "{user_query}"
 
 Respond ONLY with the JSON array as described above.
 """
-    return prompt
-
-def plan_with_local_llm(user_query, tools):
-    prompt = build_prompt(user_query, tools)
-    result = generator(prompt, max_new_tokens=512, do_sample=True, temperature=0.7)
-    output = result[0]['generated_text']
-    # Robustly extract the first JSON array from the output
-    try:
-        json_match = re.search(r"\[[\s\S]*?\]", output)
-        if json_match:
-            plan = json.loads(json_match.group())
-            return plan
-    except Exception:
-        pass
-    return output  # Return raw output if parsing fails
+
+
+def build_prompt_parts(user_query, tools, example=None):
+    """
+    Split the planning prompt into a shared prefix and a query-specific suffix.
+    Returns:
+        tuple: (prefix, suffix); prefix + suffix is the full prompt.
+    """
+    return build_prompt_prefix(tools, example), build_prompt_suffix(user_query)
+
+
+def build_prompt(user_query, tools, example=None):
+    prefix, suffix = build_prompt_parts(user_query, tools, example)
+    return prefix + suffix
+
+
+class PrefixCache:
+    """
+    LRU cache of the transformer past key/values for shared prompt prefixes.
+    Entries are keyed by the catalog version (hash of the tools offered) plus a hash of the prefix
+    text, so a catalog change never reuses stale keys/values. Only the prefix is prefilled once;
+    each request then encodes just its own suffix.
+    """
+
+    def __init__(self, max_entries=PREFIX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, prefix, catalog_version, tokenizer, model):
+        """
+        Return (prefix_ids, past_key_values) for the prefix, prefilling it on a miss.
+        The returned cache is shared: deep-copy it before generating, since generation extends it in place.
+        """
+        import torch
+        from transformers import DynamicCache
+
+        key = (catalog_version, hashlib.sha256(prefix.encode('utf-8')).hexdigest())
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            prefix_ids = tokenizer(prefix, return_tensors='pt')['input_ids'].to(model.device)
+            with torch.inference_mode():
+                past = model(prefix_ids, past_key_values=DynamicCache(), use_cache=True).past_key_values
+            self._entries[key] = (prefix_ids, past)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return prefix_ids, past
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_prefix_cache = PrefixCache()
+
+def _encode_suffixes(tokenizer, suffixes, device):
+    """
+    Tokenize suffixes as they would be tokenized following the prefix, left-padded into one batch.
+    Each suffix is encoded after an anchor token whose ids are then dropped, so tokenizers that add a
+    word-start marker at the beginning of a text (e.g. SentencePiece) do not insert one at the split.
+    Returns:
+        tuple: (input_ids, attention_mask) tensors.
+    """
+    import torch
+
+    anchor = 'a'
+    anchor_len = len(tokenizer.encode(anchor, add_special_tokens=False))
+    rows = [tokenizer.encode(anchor + suffix, add_special_tokens=False)[anchor_len:] for suffix in suffixes]
+    width = max(len(row) for row in rows)
+    input_ids = [[tokenizer.pad_token_id] * (width - len(row)) + row for row in rows]
+    attention_mask = [[0] * (width - len(row)) + [1] * len(row) for row in rows]
+    return (torch.tensor(input_ids, dtype=torch.long, device=device),
+            torch.tensor(attention_mask, dtype=torch.long, device=device))
+
+
+def _generate(prefix, suffixes, catalog_version, max_new_tokens, grammar=None, cancel_event=None):
+    """
+    Generate completions for several suffixes that share one prefix.
+    The prefix's cached past key/values are expanded to the batch; suffixes are left-padded, so the
+    padding sits between prefix and suffix and is masked out (positions follow the attention mask).
+    With a grammar, decoding is constrained by PlanGrammarLogitsProcessor.
+    """
+    import torch
+    from transformers import LogitsProcessorList, StoppingCriteriaList
+
+    local_model = get_local_model()
+    tokenizer, model = local_model.load()
+    prefix_ids, past = _prefix_cache.get(prefix, catalog_version, tokenizer, model)
+    suffix_ids, suffix_mask = _encode_suffixes(tokenizer, suffixes, model.device)
+    batch = len(suffixes)
+    input_ids = torch.cat([prefix_ids.expand(batch, -1), suffix_ids], dim=1)
+    attention_mask = torch.cat([
+        torch.ones((batch, prefix_ids.shape[1]), dtype=suffix_mask.dtype, device=model.device),
+        suffix_mask,
+    ], dim=1)
+    cache = copy.deepcopy(past)
+    cache.batch_repeat_interleave(batch)
+    stop = JsonArrayStop(tokenizer, batch, cancel_event)
+    processors = LogitsProcessorList()
+    if grammar is not None:
+        processors.append(PlanGrammarLogitsProcessor(grammar, local_model.token_strings(), tokenizer.eos_token_id, batch))
+    with torch.inference_mode():
+        output_ids = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=cache,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,  # Greedy decoding: the same query and tools always give the same plan
+            stopping_criteria=StoppingCriteriaList([stop]),
+            logits_processor=processors,
+            pad_token_id=tokenizer.pad_token_id,
+        )
+    return tokenizer.batch_decode(output_ids[:, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+def plan_batch(queries, tools, batch_size=DEFAULT_BATCH_SIZE, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, constrained=True,
+               cancel_event=None):
+    """
+    Plan several queries with the local model, generating padded batches.
+    The shared prompt prefix is prefilled once per catalog version (see PrefixCache); each batch only
+    encodes its query suffixes, grouped by length so each batch carries as little padding as possible.
+    Args:
+        queries (list): User queries.
+        tools (list): Tool dicts offered to every query.
+        batch_size (int): Prompts generated together.
+        max_new_tokens (int): Generation cap per prompt; generation also stops once the JSON array closes.
+        constrained (bool): Restrict decoding to valid plans over these tools (see core/plan_grammar.py).
+        cancel_event (threading.Event): Set it to stop generating early, e.g. when another backend answered first.
+    Returns:
+        list: One result per query, in order: the parsed plan, or the raw output if parsing fails.
+    """
+    if not queries:
+        return []
+    prefix = build_prompt_prefix(tools)
+    suffixes = [build_prompt_suffix(query) for query in queries]
+    catalog_version = catalog_hash(tools)
+    grammar = PlanGrammar(tools) if constrained else None
+    order = sorted(range(len(suffixes)), key=lambda i: len(suffixes[i]))
+    results = [None] * len(suffixes)
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        outputs = _generate(prefix, [suffixes[i] for i in indices], catalog_version, max_new_tokens, grammar, cancel_event)
+        for i, output in zip(indices, outputs):
+            # Robustly extract the plan's JSON array from the output
+            plan = extract_json_array(output)
+            results[i] = plan if plan is not None else output  # Return raw output if parsing fails
+    return results
+
+
+def plan_with_local_llm(user_query, tools, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, constrained=True, cancel_event=None):
+    return plan_batch([user_query], tools, max_new_tokens=max_new_tokens, constrained=constrained,
+                      cancel_event=cancel_event)[0]
 
 # NOTE: The path to function_tools.json is hardcoded in main_open_llm.py for demo purposes.
 # For production, make this configurable or accept as a CLI argument. 
\ No newline at end of file
@@ -1,6 +1,7 @@
+import argparse
 import json
 from pathlib import Path
-from local_llm_planner import plan_with_local_llm
+from local_llm_planner import DEFAULT_BATCH_SIZE, DEFAULT_MAX_NEW_TOKENS, plan_batch, plan_with_local_llm
 import sys
 
 # NOTE: The path to function_tools.json is hardcoded for demo. Make configurable for production use.
@@ -14,10 +15,26 @@ def load_tools():
         return json.load(f)
 
 def main():
+    parser = argparse.ArgumentParser(description="Toolmate planner on a local open-source LLM.")
+    parser.add_argument('--queries', default=None, help="File with one query per line; plans them in batches.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Prompts generated together.")
+    parser.add_argument('--max-new-tokens', type=int, default=DEFAULT_MAX_NEW_TOKENS, help="Generation cap per plan.")
+    parser.add_argument('--unconstrained', action='store_true', help="Decode freely instead of only emitting valid plans.")
+    args = parser.parse_args()
+
     print("\n=== Toolmate (Open-Source LLM Edition) ===\n")
     tools = load_tools()
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        plans = plan_batch(queries, tools, batch_size=args.batch_size, max_new_tokens=args.max_new_tokens,
+                           constrained=not args.unconstrained)
+        for query, plan in zip(queries, plans):
+            print(json.dumps({'query': query, 'plan': plan}))
+        return
     user_query = input("Enter your request: ")
-    plan = plan_with_local_llm(user_query, tools)
+    plan = plan_with_local_llm(user_query, tools, max_new_tokens=args.max_new_tokens,
+                               constrained=not args.unconstrained)
     print("\n--- Plan Generated by Local LLM ---\n")
     print(json.dumps(plan, indent=2))
 
@@ -0,0 +1,39 @@
+import pytest
+
+TOOLS = [
+    {
+        'name': 'read_pdf_tool',
+        'description': 'Read the text of a PDF file',
+        'input': {'file_path': {'type': 'str', 'description': 'Path of the PDF'}},
+        'output': {'content': {'type': 'str', 'description': 'Extracted text'}},
+    },
+    {
+        'name': 'summarize_text_tool',
+        'description': 'Summarize a text',
+        'input': {
+            'content': {'type': 'str', 'description': 'Text to summarize'},
+            'max_words': {'type': 'int', 'description': 'Optional length limit'},
+        },
+        'output': {'summary': {'type': 'str', 'description': 'The summary'}},
+    },
+    {
+        'name': 'count_words_tool',
+        'description': 'Count the words of a text',
+        'input': {'content': {'type': 'str', 'description': 'Text'}},
+        'output': {'count': {'type': 'int', 'description': 'Word count'}},
+    },
+    {
+        'name': 'send_email_tool',
+        'description': 'Send an email',
+        'input': {
+            'to': {'type': 'str', 'description': 'Recipient address'},
+            'body': {'type': 'str', 'description': 'Message body'},
+        },
+        'output': {'status': {'type': 'str', 'description': 'Delivery status'}},
+    },
+]
+
+
+@pytest.fixture
+def tools_by_name():
+    return {tool['name']: tool for tool in TOOLS}
@@ -0,0 +1,139 @@
+import time
+
+import pytest
+
+import core.backend_router as backend_router
+from core.backend_router import Backend, BackendRouter, CircuitBreaker, NoBackendAvailable
+
+PLAN = [{'function': 'read_pdf_tool', 'inputs': {}}]
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    # Latency history is process-wide, so always hedge after the default delay
+    monkeypatch.setattr(backend_router, 'HEDGE_DEFAULT_DELAY', 0.05)
+    monkeypatch.setattr(backend_router, 'HEDGE_MIN_SAMPLES', float('inf'))
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(*plan_fns, **kwargs):
+        backends = [Backend(f"backend{i}", fn, CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+                    for i, fn in enumerate(plan_fns)]
+        routers.append(BackendRouter(backends, **kwargs))
+        return routers[-1]
+
+    yield make
+    for router in routers:
+        router.close()
+
+
+def answer(plan=PLAN, delay=0.0, calls=None):
+    def plan_fn(user_query, tools, cancel_event):
+        if calls is not None:
+            calls.append(cancel_event)
+        if cancel_event.wait(delay):
+            raise RuntimeError("cancelled")
+        return plan
+    return plan_fn
+
+
+def fail(user_query, tools, cancel_event):
+    raise ConnectionError("down")
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert not breaker.record_failure() and breaker.state == 'closed'
+    assert breaker.record_failure() and breaker.state == 'open'
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert breaker.allow() and not breaker.allow()  # A single trial call
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.record_failure() and breaker.state == 'open'
+
+
+def test_released_trial_lets_the_next_call_try():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_primary_answers(make_router):
+    result = make_router(answer(), answer()).plan('query', [])
+    assert result['plan'] == PLAN and result['backend'] == 'backend0' and result['kind'] == 'primary'
+    assert result['attempts'] == [{'backend': 'backend0', 'kind': 'primary'}]
+
+
+def test_slow_primary_is_hedged_and_cancelled(make_router):
+    primary_calls = []
+    router = make_router(answer(delay=5, calls=primary_calls), answer(plan=PLAN * 2))
+    result = router.plan('query', [])
+    assert result['backend'] == 'backend1' and result['kind'] == 'hedge' and result['plan'] == PLAN * 2
+    assert primary_calls[0].is_set()  # The losing call was told to stop
+    assert router.stats()['hedges'] == 1
+
+
+def test_single_backend_hedges_to_itself(make_router):
+    calls = []
+
+    def plan_fn(user_query, tools, cancel_event):
+        calls.append(None)
+        return answer(delay=5 if len(calls) == 1 else 0)(user_query, tools, cancel_event)
+
+    result = make_router(plan_fn).plan('query', [])
+    assert result['kind'] == 'hedge' and len(calls) == 2
+
+
+def test_hedges_are_capped(make_router):
+    router = make_router(answer(delay=0.1), answer(delay=0.1), max_hedge_ratio=0.0)
+    kinds = [router.plan('query', [])['kind'] for _ in range(3)]
+    assert router.stats()['hedges'] == 1
+    assert kinds.count('hedge') <= 1
+
+
+def test_errors_and_invalid_plans_fail_over(make_router):
+    result = make_router(fail, answer()).plan('query', [])
+    assert result['backend'] == 'backend1' and result['kind'] == 'failover'
+    result = make_router(answer(plan='no plan here'), answer()).plan('query', [])
+    assert result['backend'] == 'backend1' and result['kind'] == 'failover'
+
+
+def test_open_breakers_are_skipped(make_router):
+    router = make_router(fail, answer(), hedge=False)
+    for _ in range(2):
+        router.plan('query', [])
+    assert router.backends[0].breaker.state == 'open'
+    result = router.plan('query', [])
+    assert result['kind'] == 'primary' and result['backend'] == 'backend1'
+
+
+def test_every_backend_failing(make_router):
+    router = make_router(fail, fail, hedge=False)
+    with pytest.raises(ConnectionError):
+        router.plan('query', [])
+    with pytest.raises(ConnectionError):
+        router.plan('query', [])
+    with pytest.raises(NoBackendAvailable):
+        router.plan('query', [])
+
+
+def test_timeout(make_router):
+    calls = []
+    router = make_router(answer(delay=5, calls=calls), hedge=False)
+    with pytest.raises(TimeoutError):
+        router.plan('query', [], timeout=0.05)
+    assert calls[0].is_set()
@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+from core.catalog_binary import BinaryCatalog, _fragment_renderers, compile_catalog, load_binary_catalog
+from core.tool_catalog import TOOLS_PATH
+from core.tool_index import build_tool_text, catalog_hash
+
+ODD_TOOL = {
+    'name': 'odd_tool',
+    'description': 'Ünïcödé, "quotes" and\nnewlines',
+    'input': {},
+    'output': {},
+    'tags': ['a', 'a', ''],
+    'limits': {'max': 2 ** 62, 'min': -5, 'ratio': 0.25, 'enabled': True, 'beta': False, 'owner': None},
+}
+
+
+@pytest.fixture
+def tools(tools_by_name):
+    return list(tools_by_name.values()) + [ODD_TOOL]
+
+
+def test_round_trip(tmp_path, tools):
+    catalog = BinaryCatalog(compile_catalog(tools, tmp_path / 'tools.mcat'))
+    try:
+        assert len(catalog) == len(tools)
+        assert list(catalog.tools) == tools
+        assert catalog.tools[-1] == ODD_TOOL and catalog.tools[1:3] == tools[1:3]
+        assert catalog.tools.names() == [tool['name'] for tool in tools]
+        assert sorted(catalog.by_name) == sorted(tool['name'] for tool in tools)
+        assert catalog.version == catalog_hash(tools)
+        for i, tool in enumerate(tools):
+            assert catalog.get(tool['name']) == tool
+            assert catalog.retrieval_text(i) == build_tool_text(tool)
+            for renderer in _fragment_renderers():
+                assert catalog.fragment(catalog.tools[i], renderer) == renderer(tool)
+        assert catalog.get('missing_tool') is None
+        assert 'missing_tool' not in catalog.by_name
+    finally:
+        catalog.close()
+
+
+def test_real_catalog_round_trip(tmp_path):
+    with open(TOOLS_PATH, 'r', encoding='utf-8') as f:
+        tools = json.load(f)
+    catalog = BinaryCatalog(compile_catalog(tools, tmp_path / 'tools.mcat'))
+    try:
+        assert list(catalog.tools) == tools
+        assert catalog.version == catalog_hash(tools)
+    finally:
+        catalog.close()
+
+
+def test_duplicate_names_are_rejected(tmp_path, tools):
+    with pytest.raises(ValueError, match='duplicate name'):
+        compile_catalog(tools + tools[:1], tmp_path / 'tools.mcat')
+
+
+def test_not_a_catalog(tmp_path):
+    path = tmp_path / 'tools.mcat'
+    path.write_bytes(b'\0' * 1024)
+    with pytest.raises(ValueError, match='recompile'):
+        BinaryCatalog(path)
+
+
+def test_stale_compile_is_rebuilt(tmp_path, tools):
+    json_path, path = tmp_path / 'tools.json', tmp_path / 'tools.mcat'
+    json_path.write_text(json.dumps(tools[:2]), encoding='utf-8')
+    catalog = load_binary_catalog(path, json_path)
+    assert len(catalog) == 2
+    catalog.close()
+    json_path.write_text(json.dumps(tools), encoding='utf-8')
+    os.utime(json_path, ns=(0, 10 ** 9))
+    catalog = load_binary_catalog(path, json_path)
+    try:
+        assert len(catalog) == len(tools) and catalog.version == catalog_hash(tools)
+    finally:
+        catalog.close()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from core.executor import FAILED, SKIPPED, SUCCEEDED, PlanExecutor, StepMemo, ToolRegistry
+
+PLAN = [
+    {'function': 'read_pdf_tool', 'inputs': {'file_path': 'a.pdf'}},
+    {'function': 'summarize_text_tool', 'inputs': {'content': '$1.content'}},
+    {'function': 'count_words_tool', 'inputs': {'content': '?'}},
+    {'function': 'send_email_tool', 'inputs': {'to': 'bob@example.com', 'body': '$2.summary'}},
+]
+
+
+def make_registry(calls, **overrides):
+    registry = ToolRegistry()
+    implementations = {
+        'read_pdf_tool': lambda file_path: {'content': f"text of {file_path}"},
+        'summarize_text_tool': lambda content, max_words=None: f"summary of {content}",
+        'count_words_tool': lambda content: len(content.split()),
+        'send_email_tool': lambda to, body: {'status': f"sent to {to}"},
+    }
+    implementations.update(overrides)
+    for name, func in implementations.items():
+        def wrapped(_func=func, _name=name, **inputs):
+            calls.append((_name, inputs))
+            return _func(**inputs)
+        registry.register(name, wrapped, cacheable=(name == 'read_pdf_tool'))
+    return registry
+
+
+def test_run_resolves_bindings(tools_by_name):
+    calls = []
+    results = PlanExecutor(make_registry(calls), memo=False, tools_by_name=tools_by_name).run(PLAN)
+    assert [result['status'] for result in results] == [SUCCEEDED] * 4
+    assert results[1]['outputs'] == {'summary': 'summary of text of a.pdf'}
+    assert results[2]['outputs'] == {'count': 3}
+    assert ('send_email_tool', {'to': 'bob@example.com', 'body': 'summary of text of a.pdf'}) in calls
+
+
+def test_independent_branches_run_concurrently(tools_by_name):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def summarize(content, max_words=None):
+        barrier.wait()
+        return 'summary'
+
+    def count(content):
+        barrier.wait()
+        return 1
+
+    registry = make_registry([], summarize_text_tool=summarize, count_words_tool=count)
+    results = PlanExecutor(registry, memo=False, tools_by_name=tools_by_name).run(PLAN[:3])
+    assert [result['status'] for result in results] == [SUCCEEDED] * 3
+
+
+def test_failure_skips_dependents(tools_by_name):
+    def broken(file_path):
+        raise OSError("unreadable")
+
+    results = PlanExecutor(make_registry([], read_pdf_tool=broken), memo=False, tools_by_name=tools_by_name).run(PLAN)
+    assert [result['status'] for result in results] == [FAILED, SKIPPED, SKIPPED, SKIPPED]
+    assert results[0]['error'] == 'OSError: unreadable'
+
+
+def test_unbound_placeholder_fails_its_step(tools_by_name):
+    plan = [PLAN[0], {'function': 'send_email_tool', 'inputs': {'to': 'bob@example.com', 'body': '?'}}]
+    results = PlanExecutor(make_registry([]), memo=False, tools_by_name=tools_by_name).run(plan)
+    assert [result['status'] for result in results] == [SUCCEEDED, FAILED]
+    assert "has no value" in results[1]['error']
+
+
+def test_retries_then_succeeds(tools_by_name):
+    attempts = []
+
+    def flaky(file_path):
+        attempts.append(file_path)
+        if len(attempts) < 3:
+            raise TimeoutError("try again")
+        return {'content': 'ok'}
+
+    registry = make_registry([], read_pdf_tool=flaky)
+    results = PlanExecutor(registry, memo=False, retries=2, retry_backoff=0.01, tools_by_name=tools_by_name).run(PLAN[:1])
+    assert results[0]['status'] == SUCCEEDED and results[0]['attempts'] == 3
+
+
+def test_step_timeout(tools_by_name):
+    registry = make_registry([], read_pdf_tool=lambda file_path: time.sleep(1) or {'content': 'late'})
+    results = PlanExecutor(registry, memo=False, step_timeout=0.05, tools_by_name=tools_by_name).run(PLAN[:1])
+    assert results[0]['status'] == FAILED and 'Timed out' in results[0]['error']
+
+
+def test_only_cacheable_tools_are_memoized(tools_by_name):
+    calls = []
+    executor = PlanExecutor(make_registry(calls), memo=StepMemo(), tools_by_name=tools_by_name)
+    executor.run(PLAN)
+    results = executor.run(PLAN)
+    assert results[0]['cached'] and not results[3]['cached']
+    assert [name for name, _ in calls].count('read_pdf_tool') == 1
+    assert [name for name, _ in calls].count('send_email_tool') == 2
+
+
+def test_register_defaults_to_not_cacheable():
+    registry = ToolRegistry()
+    registry.register('send_email_tool', print)
+    assert registry.get('send_email_tool') == (print, False)
@@ -0,0 +1,85 @@
+import pytest
+
+from core.plan_cache import SemanticPlanCache, plan_literals, plan_tool_names, query_literals
+from core.prompt_builder import filter_tools_by_query
+from core.tool_catalog import get_catalog
+
+PARAPHRASES = [
+    ("Summarize this CSV file and email it to my manager", "Parse the CSV file and send the summary to my manager by email"),
+    ("Get all invoices for March and send a summary email to finance", "Fetch the March invoices and email finance a summary"),
+    ("Translate this document and email it to my manager", "Email my manager a translated version of this document"),
+    ("Convert this Excel sheet to PDF and upload it to the cloud", "Turn this Excel spreadsheet into a PDF and upload it to cloud storage"),
+    ("Analyze this CSV for duplicate entries and save the cleaned file", "Remove duplicate rows from this CSV and save the cleaned file"),
+    ("Create a calendar invite for a project meeting and send a Slack notification",
+     "Schedule a project meeting invite and notify the team on Slack"),
+]
+
+NEAR_MISSES = [
+    ("Summarize this CSV file and email it to my manager", "Summarize this CSV file and send it via SMS"),
+    ("Get all invoices for March and send a summary email to finance", "Get all invoices for March and calculate the total"),
+    ("Convert this Excel sheet to PDF and upload it to the cloud", "Convert this Excel sheet to CSV and email it"),
+    ("Create a bar chart of monthly sales and email the chart to my team", "Create a bar chart of monthly sales and save as PNG"),
+    ("Analyze this CSV for duplicate entries and save the cleaned file", "Analyze this CSV and plot a histogram"),
+]
+
+
+def retrieve(query):
+    return filter_tools_by_query(query, get_catalog().tools, top_n=12)
+
+
+def cache_with(query, owner=None, inputs=None):
+    cache = SemanticPlanCache()
+    tools = retrieve(query)
+    plan = [{'function': tool['name'], 'inputs': dict(inputs or {})} for tool in tools[:3]]
+    cache.add(query, tools, plan, owner=owner)
+    return cache, plan
+
+
+@pytest.mark.parametrize('stored, query', PARAPHRASES)
+def test_paraphrase_hits(stored, query):
+    cache, plan = cache_with(stored)
+    hit = cache.lookup(query, retrieve(query))
+    assert hit is not None and hit['plan'] == plan
+    assert hit['similarity'] >= cache.threshold
+
+
+@pytest.mark.parametrize('stored, query', NEAR_MISSES)
+def test_different_request_misses(stored, query):
+    cache, _ = cache_with(stored)
+    assert cache.lookup(query, retrieve(query)) is None
+
+
+def test_entries_are_scoped_to_their_owner():
+    stored, query = PARAPHRASES[0]
+    cache, _ = cache_with(stored, owner='alice')
+    assert cache.lookup(query, retrieve(query), owner='bob') is None
+    assert cache.lookup(query, retrieve(query), owner='alice') is not None
+
+
+def test_plan_values_must_appear_in_the_new_query():
+    stored = "Summarize report.csv and email it to alice@example.com"
+    cache, _ = cache_with(stored, inputs={'to': 'alice@example.com', 'file_path': 'report.csv'})
+    other = "Summarize report.csv and email it to carol@example.com"
+    assert cache.lookup(other, retrieve(other)) is None
+    assert cache.stats()['value_mismatches'] == 1
+    assert cache.lookup(stored, retrieve(stored)) is not None
+
+
+def test_query_literals():
+    query = ('Email "Q3 summary" from ~/reports/q3.csv and https://example.com/a?b=1 '
+             'to Alice@Example.com by 2024-07-01 at 09:30, it\'s 12.5% done')
+    assert query_literals(query) == {
+        'q3 summary', '~/reports/q3.csv', 'https://example.com/a?b=1', 'alice@example.com', '2024-07-01', '09:30', '12.5',
+    }
+    assert query_literals("Summarize this file and email it to my manager") == set()
+
+
+def test_plan_literals_keeps_only_values_the_plan_uses():
+    query = "Read data/sales.xlsx, sum column 3 and send it to bob@example.com"
+    plan = [
+        {'function': 'readExcelTool', 'inputs': {'file_path': 'data/sales.xlsx'}},
+        {'function': 'calculateSumTool', 'inputs': {'grouped_data': '$1', 'sum_field': '?'}},
+        {'function': 'sendEmailTool', 'inputs': {'to': ['Bob@example.com'], 'content': '$2.total'}},
+    ]
+    assert plan_literals(query, plan) == {'data/sales.xlsx', 'bob@example.com'}
+    assert plan_tool_names(plan + ['not a step']) == {'readExcelTool', 'calculateSumTool', 'sendEmailTool'}
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from core.plan_parsing import StepStreamParser, extract_json_array, repair_json
+
+STEP = {'function': 'a', 'inputs': {}}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('[{"function": "a", "inputs": {}}]', [STEP]),
+    ('```json\n[{"function": "a", "inputs": {"x": "[1]"}}]\n```', [{'function': 'a', 'inputs': {'x': '[1]'}}]),
+    ('Note [it\'s ok]. Plan: [{"function": "a", "inputs": {}}]', [STEP]),
+    ('Note [it\'s ok. Plan: [{"function": "a", "inputs": {}}]', [STEP]),
+    ("It's here: [{'function': 'a', 'inputs': {'ok': True,},}]", [{'function': 'a', 'inputs': {'ok': True}}]),
+    ('See [1, 2] then [{"function": "b", "inputs": {}}]', [{'function': 'b', 'inputs': {}}]),
+    ('No plan needed: []', []),
+    ('[{"function": "a", "inputs": {', None),
+    ('no array here', None),
+    ('{"plan": [{"function": "a", "inputs": {}}]}', [STEP]),
+    ('[{"function": "a", "inputs": {"items": [{"k": 1}]}}]', [{'function': 'a', 'inputs': {'items': [{'k': 1}]}}]),
+    ('Say "[ hi\nPlan: [{"function": "a", "inputs": {}}]', [STEP]),
+    ('[{see below}, [{"function": "a", "inputs": {}}]]', [STEP]),
+    ('Draft [{"function": "x", "inputs": {"y": [{"function": "a", "inputs": {}}]', [STEP]),
+    ('[{"function": "a", "inputs": {}}] and [{"function": "b", "inputs": {}}]', [STEP]),
+])
+def test_extract_json_array(text, expected):
+    assert extract_json_array(text) == expected
+
+
+def test_extract_json_array_without_repair():
+    assert extract_json_array("[{'function': 'a'}]", repair=False) is None
+
+
+@pytest.mark.parametrize('text', [
+    'x [a ' * 8000, '[' * 40000, '[{' * 20000, '[{"a": "' * 5000,
+    '[{x: ' * 5000 + '}]' * 5000, '[{"a": ' * 5000 + '1' + '}]' * 5000,
+])
+def test_extract_json_array_is_linear(text):
+    start = time.perf_counter()
+    assert extract_json_array(text) is None
+    assert time.perf_counter() - start < 1.0
+
+
+def test_repair_json():
+    assert repair_json("{'a': 'it\\'s', 'b': None, 'c': [1, 2,],}") == '{"a": "it\'s", "b": null, "c": [1, 2]}'
+
+
+def test_stream_parser_yields_steps_as_they_close():
+    parser = StepStreamParser()
+    text = 'Plan: [see below]\n```json\n[{"function": "a", "inputs": {"x": "}"}}, {"function": "b", "inputs": {}}]\n```'
+    steps = []
+    for i in range(0, len(text), 7):
+        steps.extend(parser.feed(text[i:i + 7]))
+    assert steps == [{'function': 'a', 'inputs': {'x': '}'}}, {'function': 'b', 'inputs': {}}]
+    assert parser.done
+    assert parser.text == text
@@ -0,0 +1,87 @@
+import pytest
+
+from core.plan_patch import PlanPatchError, apply_plan_patch, patch_plan
+
+PLAN = [
+    {'function': 'read_pdf_tool', 'inputs': {'file_path': 'a.pdf'}},
+    {'function': 'summarize_text_tool', 'inputs': {'content': '$1.content'}},
+    {'function': 'send_email_tool', 'inputs': {'to': 'bob@example.com', 'body': '$2.summary'}},
+]
+COUNT_STEP = {'function': 'count_words_tool', 'inputs': {'content': '$1.content'}}
+
+
+def functions(plan):
+    return [step['function'] for step in plan]
+
+
+def test_add_renumbers_later_references():
+    patched = apply_plan_patch(PLAN, [{'op': 'add', 'path': '/1', 'value': COUNT_STEP}])
+    assert functions(patched) == ['read_pdf_tool', 'count_words_tool', 'summarize_text_tool', 'send_email_tool']
+    assert patched[1]['inputs'] == {'content': '$1.content'}
+    assert patched[3]['inputs']['body'] == '$3.summary'
+    assert PLAN[2]['inputs']['body'] == '$2.summary'  # The input plan is not modified
+
+
+def test_append_with_dash():
+    assert functions(apply_plan_patch(PLAN, [{'op': 'add', 'path': '/-', 'value': COUNT_STEP}]))[-1] == 'count_words_tool'
+
+
+def test_remove_turns_references_to_the_removed_step_into_placeholders():
+    patched = apply_plan_patch(PLAN, [{'op': 'remove', 'path': '/1'}])
+    assert functions(patched) == ['read_pdf_tool', 'send_email_tool']
+    assert patched[1]['inputs']['body'] == '?'
+
+
+def test_move_keeps_references_on_the_same_step():
+    plan = PLAN + [COUNT_STEP]
+    patched = apply_plan_patch(plan, [{'op': 'move', 'from': '/3', 'path': '/1'}])
+    assert functions(patched) == ['read_pdf_tool', 'count_words_tool', 'summarize_text_tool', 'send_email_tool']
+    assert patched[3]['inputs']['body'] == '$3.summary'
+
+
+def test_step_field_operations():
+    patched = apply_plan_patch(PLAN, [
+        {'op': 'replace', 'path': '/1/function', 'value': 'count_words_tool'},
+        {'op': 'add', 'path': '/2/inputs/to', 'value': 'carol@example.com'},
+        {'op': 'remove', 'path': '/0/inputs/file_path'},
+    ])
+    assert patched[1]['function'] == 'count_words_tool'
+    assert patched[2]['inputs']['to'] == 'carol@example.com'
+    assert patched[0]['inputs'] == {}
+
+
+@pytest.mark.parametrize('operations', [
+    {'op': 'add'},
+    [{'op': 'copy', 'path': '/0'}],
+    [{'op': 'remove', 'path': '/9'}],
+    [{'op': 'remove', 'path': 'x'}],
+    [{'op': 'replace', 'path': '/0/description', 'value': 'x'}],
+    [{'op': 'add', 'path': '/0'}],
+    [{'op': 'add', 'path': '/0', 'value': {'inputs': {}}}],
+    [{'op': 'remove', 'path': '/0/inputs/nope'}],
+    [{'op': 'move', 'from': '/0/inputs', 'path': '/1'}],
+])
+def test_malformed_operations_raise(operations):
+    with pytest.raises(PlanPatchError):
+        apply_plan_patch(PLAN, operations)
+
+
+def test_patch_plan_validates_the_result(tools_by_name):
+    patched = patch_plan(PLAN, [{'op': 'replace', 'path': '/2/inputs/to', 'value': 'carol@example.com'}], tools_by_name)
+    assert patched[2]['inputs']['to'] == 'carol@example.com'
+    with pytest.raises(PlanPatchError, match="requires input 'body'"):
+        patch_plan(PLAN, [{'op': 'remove', 'path': '/1'}], tools_by_name)
+    with pytest.raises(PlanPatchError, match='removed every step'):
+        patch_plan(PLAN[:1], [{'op': 'remove', 'path': '/0'}], tools_by_name)
+
+
+def test_patch_plan_keeps_issues_the_plan_already_had(tools_by_name):
+    plan = [dict(PLAN[0], inputs={})]
+    assert patch_plan(plan, [{'op': 'add', 'path': '/-', 'value': COUNT_STEP}], tools_by_name)
+
+
+def test_patch_plan_only_allows_offered_tools(tools_by_name):
+    operation = {'op': 'add', 'path': '/-', 'value': COUNT_STEP}
+    with pytest.raises(PlanPatchError, match='not offered: count_words_tool'):
+        patch_plan(PLAN, [operation], tools_by_name, allowed_tools=['send_email_tool'])
+    assert patch_plan(PLAN, [operation], tools_by_name, allowed_tools=['count_words_tool'])
@@ -0,0 +1,76 @@
+from core.plan_validator import input_bindings, parse_reference, step_dependencies, types_compatible, validate_plan
+
+
+def codes(issues):
+    return [(issue.code, issue.step, issue.param) for issue in issues]
+
+
+def test_parse_reference():
+    assert parse_reference('$2.summary') == (1, 'summary')
+    assert parse_reference(' $step_3 ') == (2, None)
+    assert parse_reference('$x') is None
+    assert parse_reference(3) is None
+
+
+def test_types_compatible():
+    assert types_compatible('int', 'float')
+    assert not types_compatible('float', 'int')
+    assert types_compatible('list', 'list[dict]')
+    assert not types_compatible('list[str]', 'list[dict]')
+    assert types_compatible(None, 'str')
+
+
+def test_explicit_references_and_matching_placeholders_bind(tools_by_name):
+    plan = [
+        {'function': 'read_pdf_tool', 'inputs': {'file_path': 'a.pdf'}},
+        {'function': 'summarize_text_tool', 'inputs': {'content': '$1.content'}},
+        {'function': 'count_words_tool', 'inputs': {'content': '?'}},
+        {'function': 'send_email_tool', 'inputs': {'to': 'bob@example.com', 'body': '$2'}},
+    ]
+    assert input_bindings(plan, tools_by_name) == [
+        {},
+        {'content': (0, 'content', True)},
+        {'content': (0, 'content', False)},
+        {'body': (1, None, True)},
+    ]
+    assert step_dependencies(plan, tools_by_name) == [[], [0], [0], [1]]
+    assert validate_plan(plan, tools_by_name) == []
+
+
+def test_unmatched_placeholder_is_unbound_and_missing(tools_by_name):
+    plan = [
+        {'function': 'read_pdf_tool', 'inputs': {'file_path': 'a.pdf'}},
+        {'function': 'send_email_tool', 'inputs': {'to': 'bob@example.com', 'body': '?'}},
+    ]
+    assert input_bindings(plan, tools_by_name) == [{}, {}]
+    assert step_dependencies(plan, tools_by_name) == [[], []]
+    assert codes(validate_plan(plan, tools_by_name)) == [('missing_input', 1, 'body')]
+
+
+def test_validate_plan_reports_each_kind_of_issue(tools_by_name):
+    plan = [
+        {'function': 'count_words_tool', 'inputs': {'content': 'some text'}},
+        {'function': 'send_email_tool', 'inputs': {'to': '$1.count', 'body': '$3.summary', 'cc': 'x'}},
+        {'function': 'summarize_text_tool', 'inputs': {'content': '$1.words'}},
+        {'function': 'no_such_tool', 'inputs': {}},
+        'not a step',
+    ]
+    assert codes(validate_plan(plan, tools_by_name)) == [
+        ('bad_reference', 1, 'body'),
+        ('unknown_input', 1, 'cc'),
+        ('type_mismatch', 1, 'to'),
+        ('unknown_output', 2, 'content'),
+        ('unknown_tool', 3, None),
+        ('invalid_step', 4, None),
+    ]
+
+
+def test_optional_inputs_may_be_left_out(tools_by_name):
+    plan = [{'function': 'summarize_text_tool', 'inputs': {'content': 'text'}}]
+    assert validate_plan(plan, tools_by_name) == []
+
+
+def test_untyped_outputs_are_not_type_checked(tools_by_name):
+    tools_by_name = dict(tools_by_name, raw_tool={'name': 'raw_tool', 'input': {}, 'output': {'content': 'str'}})
+    plan = [{'function': 'raw_tool', 'inputs': {}}, {'function': 'summarize_text_tool', 'inputs': {'content': '$1.content'}}]
+    assert validate_plan(plan, tools_by_name) == []
@@ -0,0 +1,41 @@
+import json
+import logging
+
+import pytest
+
+from core.tool_catalog import ToolCatalog
+
+
+def write_tools(path, names):
+    path.write_text(json.dumps([{'name': name, 'description': f"Tool {name}"} for name in names]), encoding='utf-8')
+
+
+def test_refresh_applies_edits(tmp_path):
+    path = tmp_path / 'tools.json'
+    write_tools(path, ['a'])
+    catalog = ToolCatalog(path, check_interval=0)
+    write_tools(path, ['a', 'b'])
+    assert catalog.refresh()
+    assert sorted(catalog.by_name) == ['a', 'b']
+
+
+def test_unparseable_file_keeps_previous_catalog(tmp_path, caplog):
+    path = tmp_path / 'tools.json'
+    write_tools(path, ['a'])
+    catalog = ToolCatalog(path, check_interval=0)
+    version = catalog.version
+    path.write_text('[{"name": "a", ', encoding='utf-8')
+    with caplog.at_level(logging.ERROR, logger='core.tool_catalog'):
+        assert not catalog.refresh()
+    assert catalog.version == version and list(catalog.by_name) == ['a']
+    assert 'keeping the previous tool catalog' in caplog.text
+    write_tools(path, ['a', 'b'])
+    assert catalog.refresh()
+    assert list(catalog.by_name) == ['a', 'b']
+
+
+def test_unparseable_file_on_first_load_raises(tmp_path):
+    path = tmp_path / 'tools.json'
+    path.write_text('not json', encoding='utf-8')
+    with pytest.raises(ValueError):
+        ToolCatalog(path)
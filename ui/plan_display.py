@@ -1,5 +1,16 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
 import streamlit as st
 import graphviz
+from core.plan_validator import input_bindings
+from core.tool_catalog import get_catalog
+
+RENDER_CACHE_SIZE = 64  # Rendered plan views kept across reruns
+_render_cache = OrderedDict()
+_render_cache_lock = threading.Lock()
 
 def get_tool_label(func, TOOL_LABELS):
     if func in TOOL_LABELS:
@@ -23,8 +34,17 @@ def get_input_placeholder(key):
     }
     return mapping.get(key, 'No value provided')
 
-def render_plan(plan, relevant_tools, TOOL_LABELS):
-    st.markdown("### 🧠 Task Plan (Visual Diagram)")
+def plan_view_key(plan, relevant_tools):
+    """Cache key of a rendered plan: hash of the plan, its relevant tool names and the catalog version."""
+    payload = json.dumps([plan, [t.get('name') for t in relevant_tools], get_catalog().version], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def build_plan_view(plan, relevant_tools, TOOL_LABELS):
+    """
+    Build everything render_plan shows that does not depend on widgets: the flow diagram HTML, the
+    Graphviz DOT source and each step's markdown blocks.
+    """
+    tools_by_name = {t['name']: t for t in relevant_tools}
     flow_parts = []
     for i, step in enumerate(plan):
         func = step.get('function', f"Step{i+1}")
@@ -32,103 +52,178 @@ def render_plan(plan, relevant_tools, TOOL_LABELS):
         flow_parts.append(label)
     flow_parts.append("✅ Output")
     flow_str = "<br><span style='font-size:2em;color:#ffb300;'>↓</span><br>".join([f"<span style='font-size:1.2em;'>{part}</span>" for part in flow_parts])
-    st.markdown(f"<div style='text-align:center;padding:1.5em 0;'>{flow_str}</div>", unsafe_allow_html=True)
+    return {
+        'flow_html': f"<div style='text-align:center;padding:1.5em 0;'>{flow_str}</div>",
+        'dot': plan_graph(plan, TOOL_LABELS).source,
+        'steps': [step_markup(i, step, tools_by_name.get(step.get('function')), TOOL_LABELS) for i, step in enumerate(plan)],
+    }
+
+def get_plan_view(plan, relevant_tools, TOOL_LABELS):
+    """Return the plan's view from the render cache, building it on a miss."""
+    key = plan_view_key(plan, relevant_tools)
+    with _render_cache_lock:
+        if key in _render_cache:
+            _render_cache.move_to_end(key)
+            return _render_cache[key]
+    view = build_plan_view(plan, relevant_tools, TOOL_LABELS)
+    with _render_cache_lock:
+        _render_cache[key] = view
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return view
+
+def render_plan(plan, relevant_tools, TOOL_LABELS, chat_id=None):
+    # The markup and graph are cached per plan version, so reruns triggered by unrelated widgets are cheap
+    view = get_plan_view(plan, relevant_tools, TOOL_LABELS)
+    st.markdown("### 🧠 Task Plan (Visual Diagram)")
+    st.markdown(view['flow_html'], unsafe_allow_html=True)
 
     # New Graphviz visualization
     st.markdown("### 📊 Workflow Graph")
-    render_plan_as_graph(plan, TOOL_LABELS)
+    show_graph(view['dot'])
 
     st.markdown("### 🪄 Step-by-Step Plan")
     for i, step in enumerate(plan):
-        func = step.get('function', f"Step{i+1}")
-        args = step.get('inputs', {})
-        tool_details = next((t for t in relevant_tools if t['name'] == func), None)
-        desc = tool_details.get('description', "No description available.") if tool_details else "Tool details not found."
-        category = tool_details.get('category', 'N/A') if tool_details else 'N/A'
-        version = tool_details.get('version', 'N/A') if tool_details else 'N/A'
-        author = tool_details.get('author', 'N/A') if tool_details else 'N/A'
-        tags = tool_details.get('tags', []) if tool_details else []
+        for block in view['steps'][i]:
+            st.markdown(block, unsafe_allow_html=True)
+        render_step_feedback(i, step.get('function', f"Step{i+1}"), chat_id)
 
-        label, _ = get_tool_label(func, TOOL_LABELS)
-        
-        st.markdown(f"**Step {i+1}**")
-        st.markdown(f"#### {label}")
-        st.markdown(f"<code style='font-size:1.1em;'>{func}</code>", unsafe_allow_html=True)
-        
-        # Display new tool information
-        st.markdown(f"""
-        <small>
-            <span style='color:#888;'>Category:</span> <b style='color:#555;'>{category}</b> |
-            <span style='color:#888;'>Version:</span> <b style='color:#555;'>{version}</b> |
-            <span style='color:#888;'>Author:</span> <b style='color:#555;'>{author}</b>
-        </small>
-        """, unsafe_allow_html=True)
-        if tags:
-            st.markdown(f"<small><span style='color:#888;'>Tags:</span> <i style='color:#555;'>{', '.join(tags)}</i></small>", unsafe_allow_html=True)
-
-        st.markdown(f"<span style='color:#bdbdbd;'>What it does:</span> <b>{desc}</b>", unsafe_allow_html=True)
-
-        # Display input parameters with their descriptions
-        if args:
-            input_lines = []
-            if tool_details and isinstance(tool_details.get('input'), dict):
-                for k, v in args.items():
-                    param_info = tool_details['input'].get(k, {})
-                    param_desc = param_info.get('description', 'No specific description.')
-                    param_type = param_info.get('type', 'unknown')
-                    val_display = repr(v) if v is not None and v != '' and v != '?' else get_input_placeholder(k)
-                    input_lines.append(f"<li><b>{k}</b> (<i>{param_type}</i>): {val_display} <br><small style='color:#777;'>&nbsp;&nbsp;&nbsp;└ {param_desc}</small></li>")
-            else: # Fallback if tool_details or its input schema is not found/malformed
-                for k, v in args.items():
-                    val_display = repr(v) if v is not None and v != '' and v != '?' else get_input_placeholder(k)
-                    input_lines.append(f"<li><b>{k}</b>: {val_display}</li>")
-
-            if input_lines:
-                st.markdown(f"<span style='color:#bdbdbd;'>Inputs:</span>", unsafe_allow_html=True)
-                st.markdown('<ul style="margin-top:0;margin-bottom:0.5em;">' + ''.join(input_lines) + '</ul>', unsafe_allow_html=True)
-
-        # Display output parameters with their descriptions
-        if tool_details and isinstance(tool_details.get('output'), dict) and tool_details['output']:
-            output_lines = []
-            st.markdown(f"<span style='color:#bdbdbd;'>Expected Outputs:</span>", unsafe_allow_html=True)
-            for out_param_name, out_param_details in tool_details['output'].items():
-                out_param_type = out_param_details.get('type', 'unknown')
-                out_param_desc = out_param_details.get('description', 'No specific description.')
-                output_lines.append(f"<li><b>{out_param_name}</b> (<i>{out_param_type}</i>): <small style='color:#777;'>{out_param_desc}</small></li>")
-            if output_lines:
-                st.markdown('<ul style="margin-top:0;margin-bottom:0.5em;">' + ''.join(output_lines) + '</ul>', unsafe_allow_html=True)
-
-        st.markdown("<hr style='border:0;border-top:1px solid #333;margin:0.7em 0 1.1em 0;'/>", unsafe_allow_html=True)
-
-        # User Feedback Section for each tool
-        with st.expander(f"📝 Provide Feedback for {func_name}"):
-            feedback_rating_key = f"rating_{active_chat['id']}_{i}_{func_name}"
-            feedback_comment_key = f"comment_{active_chat['id']}_{i}_{func_name}"
-            feedback_button_key = f"submit_feedback_{active_chat['id']}_{i}_{func_name}"
-
-            rating = st.radio(
-                "Rate this tool:",
-                options=[1, 2, 3, 4, 5],
-                index=4,  # Default to 5 stars
-                key=feedback_rating_key,
-                horizontal=True
-            )
-            comment = st.text_area("Your comments (optional):", key=feedback_comment_key, height=100)
-
-            if st.button("Submit Feedback", key=feedback_button_key):
-                if func_name not in st.session_state['tool_feedback']:
-                    st.session_state['tool_feedback'][func_name] = []
-
-                feedback_entry = {"rating": rating, "comment": comment, "plan_id": active_chat['id'], "step_index": i}
-                st.session_state['tool_feedback'][func_name].append(feedback_entry)
-                st.success(f"Thanks for your feedback on {func_name}!")
-                # Consider clearing the input fields after submission if desired, by resetting their keys or rerunning.
-                # For now, let's keep it simple.
+def render_plan_stream(steps, relevant_tools, TOOL_LABELS):
+    """
+    Render plan steps progressively as they arrive from a streaming model response.
+    Args:
+        steps (iterable): Yields step dicts as soon as each one is complete.
+    Returns:
+        list: All rendered steps, in order.
+    """
+    st.markdown("### 🪄 Step-by-Step Plan")
+    tools_by_name = {t['name']: t for t in relevant_tools}
+    plan = []
+    for step in steps:
+        render_step(len(plan), step, tools_by_name, TOOL_LABELS)
+        plan.append(step)
+    return plan
+
+def step_markup(i, step, tool_details, TOOL_LABELS):
+    """
+    Build the markdown/HTML blocks describing one step.
+    Args:
+        tool_details (dict): The step's tool, or None if it is not among the relevant tools.
+    Returns:
+        list: Blocks to pass to st.markdown(..., unsafe_allow_html=True), in order.
+    """
+    func = step.get('function', f"Step{i+1}")
+    args = step.get('inputs', {})
+    blocks = []
+    desc = tool_details.get('description', "No description available.") if tool_details else "Tool details not found."
+    category = tool_details.get('category', 'N/A') if tool_details else 'N/A'
+    version = tool_details.get('version', 'N/A') if tool_details else 'N/A'
+    author = tool_details.get('author', 'N/A') if tool_details else 'N/A'
+    tags = tool_details.get('tags', []) if tool_details else []
+
+    label, _ = get_tool_label(func, TOOL_LABELS)
+    
+    blocks.append(f"**Step {i+1}**")
+    blocks.append(f"#### {label}")
+    blocks.append(f"<code style='font-size:1.1em;'>{func}</code>")
+    
+    # Display new tool information
+    blocks.append(f"""
+    <small>
+        <span style='color:#888;'>Category:</span> <b style='color:#555;'>{category}</b> |
+        <span style='color:#888;'>Version:</span> <b style='color:#555;'>{version}</b> |
+        <span style='color:#888;'>Author:</span> <b style='color:#555;'>{author}</b>
+    </small>
+    """)
+    if tags:
+        blocks.append(f"<small><span style='color:#888;'>Tags:</span> <i style='color:#555;'>{', '.join(tags)}</i></small>")
+
+    blocks.append(f"<span style='color:#bdbdbd;'>What it does:</span> <b>{desc}</b>")
+
+    # Display input parameters with their descriptions
+    if args:
+        input_lines = []
+        if tool_details and isinstance(tool_details.get('input'), dict):
+            for k, v in args.items():
+                param_info = tool_details['input'].get(k, {})
+                param_desc = param_info.get('description', 'No specific description.')
+                param_type = param_info.get('type', 'unknown')
+                val_display = repr(v) if v is not None and v != '' and v != '?' else get_input_placeholder(k)
+                input_lines.append(f"<li><b>{k}</b> (<i>{param_type}</i>): {val_display} <br><small style='color:#777;'>&nbsp;&nbsp;&nbsp;└ {param_desc}</small></li>")
+        else: # Fallback if tool_details or its input schema is not found/malformed
+            for k, v in args.items():
+                val_display = repr(v) if v is not None and v != '' and v != '?' else get_input_placeholder(k)
+                input_lines.append(f"<li><b>{k}</b>: {val_display}</li>")
+
+        if input_lines:
+            blocks.append(f"<span style='color:#bdbdbd;'>Inputs:</span>")
+            blocks.append('<ul style="margin-top:0;margin-bottom:0.5em;">' + ''.join(input_lines) + '</ul>')
+
+    # Display output parameters with their descriptions
+    if tool_details and isinstance(tool_details.get('output'), dict) and tool_details['output']:
+        output_lines = []
+        blocks.append(f"<span style='color:#bdbdbd;'>Expected Outputs:</span>")
+        for out_param_name, out_param_details in tool_details['output'].items():
+            out_param_type = out_param_details.get('type', 'unknown')
+            out_param_desc = out_param_details.get('description', 'No specific description.')
+            output_lines.append(f"<li><b>{out_param_name}</b> (<i>{out_param_type}</i>): <small style='color:#777;'>{out_param_desc}</small></li>")
+        if output_lines:
+            blocks.append('<ul style="margin-top:0;margin-bottom:0.5em;">' + ''.join(output_lines) + '</ul>')
+
+    blocks.append("<hr style='border:0;border-top:1px solid #333;margin:0.7em 0 1.1em 0;'/>")
+    return blocks
+
+def render_step(i, step, tools_by_name, TOOL_LABELS, chat_id=None):
+    for block in step_markup(i, step, tools_by_name.get(step.get('function')), TOOL_LABELS):
+        st.markdown(block, unsafe_allow_html=True)
+    render_step_feedback(i, step.get('function', f"Step{i+1}"), chat_id)
+
+def render_step_feedback(i, func_name, chat_id):
+    # User Feedback Section for each tool (only once the plan belongs to a saved chat)
+    if chat_id is None:
+        return
+    with st.expander(f"📝 Provide Feedback for {func_name}"):
+        feedback_rating_key = f"rating_{chat_id}_{i}_{func_name}"
+        feedback_comment_key = f"comment_{chat_id}_{i}_{func_name}"
+        feedback_button_key = f"submit_feedback_{chat_id}_{i}_{func_name}"
+
+        rating = st.radio(
+            "Rate this tool:",
+            options=[1, 2, 3, 4, 5],
+            index=4,  # Default to 5 stars
+            key=feedback_rating_key,
+            horizontal=True
+        )
+        comment = st.text_area("Your comments (optional):", key=feedback_comment_key, height=100)
+
+        if st.button("Submit Feedback", key=feedback_button_key):
+            if func_name not in st.session_state['tool_feedback']:
+                st.session_state['tool_feedback'][func_name] = []
+
+            feedback_entry = {"rating": rating, "comment": comment, "plan_id": chat_id, "step_index": i}
+            st.session_state['tool_feedback'][func_name].append(feedback_entry)
+            st.success(f"Thanks for your feedback on {func_name}!")
+            # Consider clearing the input fields after submission if desired, by resetting their keys or rerunning.
+            # For now, let's keep it simple.
 
 def render_plan_as_graph(plan, TOOL_LABELS):
     """
     Renders the workflow plan as a Graphviz graph.
     """
+    show_graph(plan_graph(plan, TOOL_LABELS).source)
+
+def show_graph(dot_source):
+    try:
+        st.graphviz_chart(dot_source, use_container_width=True)
+    except Exception as e:
+        st.error(f"Failed to render workflow graph: {e}")
+
+def plan_graph(plan, TOOL_LABELS):
+    """
+    Build the workflow plan's Graphviz digraph.
+    Edges follow the plan's dataflow (core.plan_validator.input_bindings), so independent steps appear
+    as parallel branches; each edge is labelled with the inputs it feeds.
+    """
     dot = graphviz.Digraph(comment='Workflow Plan', graph_attr={'rankdir': 'TB', 'splines':'ortho'})
     dot.attr('node', shape='box', style='rounded,filled', fillcolor='#e8f0fe', fontname='Arial', fontsize='10')
     dot.attr('edge', fontname='Arial', fontsize='9', color='#555555')
@@ -136,7 +231,9 @@ def render_plan_as_graph(plan, TOOL_LABELS):
     # Start node
     dot.node('start', '🏁 Start', shape='ellipse', fillcolor='#a2d5ac')
 
-    last_node_name = 'start'
+    bindings = input_bindings(plan, get_catalog().by_name)
+    node_names = []
+    consumed = set()
 
     for i, step in enumerate(plan):
         func_name = step.get('function', f"UnknownStep{i+1}")
@@ -144,6 +241,7 @@ def render_plan_as_graph(plan, TOOL_LABELS):
 
         # Sanitize label for node name
         node_name = f"step_{i}_{func_name}"
+        node_names.append(node_name)
 
         # Node label with function name and custom label
         node_label_html = f'''<
@@ -153,14 +251,22 @@ def render_plan_as_graph(plan, TOOL_LABELS):
             </TABLE>
         >'''
         dot.node(node_name, label=node_label_html, shape='record', fillcolor='#e8f0fe')
-        dot.edge(last_node_name, node_name)
-        last_node_name = node_name
 
-    # End node
-    dot.node('output', '✅ Output', shape='ellipse', fillcolor='#a2d5ac')
-    dot.edge(last_node_name, 'output')
+        # One edge per upstream step, labelled with the inputs it feeds
+        feeds = {}
+        for param, (source, _, _) in bindings[i].items():
+            feeds.setdefault(source, []).append(param)
+        if not feeds:
+            dot.edge('start', node_name)
+        for source, params in sorted(feeds.items()):
+            dot.edge(node_names[source], node_name, label=', '.join(sorted(params)))
+            consumed.add(source)
 
-    try:
-        st.graphviz_chart(dot, use_container_width=True)
-    except Exception as e:
-        st.error(f"Failed to render workflow graph: {e}")
\ No newline at end of file
+    # End node, fed by every step whose outputs no other step consumes
+    dot.node('output', '✅ Output', shape='ellipse', fillcolor='#a2d5ac')
+    for i, node_name in enumerate(node_names):
+        if i not in consumed:
+            dot.edge(node_name, 'output')
+    if not node_names:
+        dot.edge('start', 'output')
+    return dot
\ No newline at end of file
@@ -1,4 +1,7 @@
 import streamlit as st
+from core.plan_store import get_plan_store
+
+CHATS_PER_PAGE = 20
 
 def render_sidebar(session_state, set_active_chat, delete_chat):
     st.markdown("<h3 style='margin-bottom:0.5em;'>💬 Chat History</h3>", unsafe_allow_html=True)
@@ -7,7 +10,11 @@ def render_sidebar(session_state, set_active_chat, delete_chat):
         session_state['active_chat_id'] = None
         session_state['update_input'] = ""
     st.markdown("---")
-    for chat in reversed(session_state['chat_history']):
+    # Chats are read from the plan store one page at a time; "Load more" extends the page
+    store = get_plan_store()
+    limit = session_state.setdefault('chat_list_limit', CHATS_PER_PAGE)
+    owner = session_state['owner']
+    for chat in store.list_chats(owner, limit=limit):
         is_active = chat['id'] == session_state['active_chat_id']
         label = chat['user_query'][:40] + ("..." if len(chat['user_query']) > 40 else "")
         col1, col2 = st.columns([8,1])
@@ -18,4 +25,8 @@ def render_sidebar(session_state, set_active_chat, delete_chat):
             if st.button("🗑️", key=f"del_{chat['id']}", use_container_width=True):
                 delete_chat(chat['id'])
                 st.experimental_rerun() if hasattr(st, 'experimental_rerun') else st.rerun()
+    if store.count_chats(owner) > limit:
+        if st.button("Load more", key="more_chats_btn", use_container_width=True):
+            session_state['chat_list_limit'] = limit + CHATS_PER_PAGE
+            st.experimental_rerun() if hasattr(st, 'experimental_rerun') else st.rerun()
     st.markdown("---") 
\ No newline at end of file
@@ -3,14 +3,23 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
-from core.prompt_builder import build_prompt, load_tools_json, filter_tools_by_query, extract_json_array
-from core.openrouter_api import call_gemini
+from core.prompt_builder import DEFAULT_TOKEN_BUDGET, build_prompt, load_tools_json, filter_tools_by_query, extract_json_array
+from core.backend_router import ROUTING_ENABLED, get_router
+from core.metrics import configure_exporters, get_metrics, span, write_metrics_file
+from core.openrouter_api import call_gemini, stream_gemini
+from core.plan_cache import get_plan_cache
+from core.plan_parsing import StepStreamParser
+from core.plan_store import get_plan_store, is_stale, resolve_tools
+from core.plan_validator import validate_plan
+from core.tool_catalog import get_catalog
 from ui.sidebar import render_sidebar
-from ui.plan_display import render_plan
+from ui.plan_display import render_plan, render_plan_stream
 from ui.update_plan import render_update_plan
 from core.update_prompt_builder import UpdatePromptBuilder
 import json
 import random
+import re
+import secrets
 
 # Page configuration
 st.set_page_config(
@@ -74,8 +83,33 @@ st.markdown("""
 
 st.markdown('<h1 style="text-align:center;">🛠️ Toolmate Pro</h1>', unsafe_allow_html=True)
 
-if 'chat_history' not in st.session_state:
-    st.session_state['chat_history'] = []
+configure_exporters()
+TOOL_USES = get_metrics().counter('mate_tool_uses_total', 'Steps using each tool in plan versions saved since the process started', ['tool'])
+
+OWNER_PARAM = 'owner'
+OWNER_TOKEN = re.compile(r'^[0-9a-f]{16,64}$')
+
+def get_owner():
+    """
+    Stable id that owns this browser's chats in the plan store (and its plan cache entries).
+    The signed-in user's email when Streamlit authentication is configured; otherwise a random token kept
+    in the page URL's `owner` query parameter, so a refresh or a bookmark reopens the same history.
+    """
+    try:
+        if st.user.is_logged_in and st.user.email:
+            return f"user:{st.user.email}"
+    except Exception:
+        pass  # Authentication not configured (or a Streamlit version without st.user)
+    if not hasattr(st, 'query_params'):
+        return secrets.token_hex(8)
+    token = st.query_params.get(OWNER_PARAM, '')
+    if not OWNER_TOKEN.match(token):
+        token = secrets.token_hex(16)
+        st.query_params[OWNER_PARAM] = token
+    return token
+
+if 'owner' not in st.session_state:
+    st.session_state['owner'] = get_owner()
 if 'active_chat_id' not in st.session_state:
     st.session_state['active_chat_id'] = None
 if 'user_query' not in st.session_state:
@@ -84,8 +118,6 @@ if 'trigger_generate' not in st.session_state:
     st.session_state['trigger_generate'] = False
 if 'update_input' not in st.session_state:
     st.session_state['update_input'] = ""
-if 'tool_usage_stats' not in st.session_state:
-    st.session_state['tool_usage_stats'] = {}
 if 'tool_feedback' not in st.session_state:
     st.session_state['tool_feedback'] = {}
 
@@ -97,45 +129,64 @@ def get_random_prompt():
     except Exception:
         return ""
 
+def parse_plan_response(response):
+    """Return (plan, reasoning) from a complete model response: a plan array or a {"plan", "reasoning"} object."""
+    try:
+        parsed = json.loads(response)
+        if isinstance(parsed, list):
+            return parsed, None
+        return parsed.get('plan', []), parsed.get('reasoning', None)
+    except Exception:
+        return extract_json_array(response), None
+
+def count_tool_uses(plan):
+    for step in plan:
+        func_name = step.get('function') if isinstance(step, dict) else None
+        if func_name:
+            TOOL_USES.inc(tool=func_name)
+
 def add_new_chat(user_query, plan, reasoning, relevant_tools):
-    chat_id = str(random.getrandbits(48))
-    st.session_state['chat_history'].append({
-        'id': chat_id,
-        'user_query': user_query,
-        'plans': [{'plan': plan, 'reasoning': reasoning, 'relevant_tools': relevant_tools}],
-    })
+    chat_id = get_plan_store().create_chat(
+        st.session_state['owner'], user_query, plan, reasoning, [t['name'] for t in relevant_tools], get_catalog().version,
+    )
     st.session_state['active_chat_id'] = chat_id
+    count_tool_uses(plan)
 
 def update_chat_plan(chat_id, new_plan, new_reasoning, relevant_tools):
-    for chat in st.session_state['chat_history']:
-        if chat['id'] == chat_id:
-            chat['plans'].append({'plan': new_plan, 'reasoning': new_reasoning, 'relevant_tools': relevant_tools})
-            break
+    """Store a new plan version for a chat and return its index."""
+    new_idx = get_plan_store().add_version(
+        st.session_state['owner'], chat_id, new_plan, new_reasoning, [t['name'] for t in relevant_tools], get_catalog().version,
+    )
+    count_tool_uses(new_plan)
+    return new_idx
 
 def delete_chat(chat_id):
-    st.session_state['chat_history'] = [c for c in st.session_state['chat_history'] if c['id'] != chat_id]
+    get_plan_store().delete_chat(st.session_state['owner'], chat_id)
     if st.session_state['active_chat_id'] == chat_id:
         st.session_state['active_chat_id'] = None
 
 def get_active_chat():
-    for chat in st.session_state['chat_history']:
-        if chat['id'] == st.session_state['active_chat_id']:
-            return chat
-    return None
+    if st.session_state['active_chat_id'] is None:
+        return None
+    return get_plan_store().get_chat(st.session_state['owner'], st.session_state['active_chat_id'])
 
 def set_active_chat(chat_id):
     st.session_state['active_chat_id'] = chat_id
+    st.session_state.pop('plan_version_idx', None)  # Open the chat at its latest version
     chat = get_active_chat()
     if chat:
         st.session_state['user_query'] = chat['user_query']
 
 def revert_to_plan_version(chat_id, version_idx):
-    chat = next((c for c in st.session_state['chat_history'] if c['id'] == chat_id), None)
-    if chat and 0 <= version_idx < len(chat['plans']):
-        chat['plans'] = chat['plans'][:version_idx+1]
+    get_plan_store().truncate_versions(st.session_state['owner'], chat_id, version_idx + 1)
 
 with st.sidebar:
     render_sidebar(st.session_state, set_active_chat, delete_chat)
+    st.checkbox("⚡ Stream plan steps", value=not ROUTING_ENABLED, key="stream_plan", disabled=ROUTING_ENABLED,
+                help="Show each step as soon as the model writes it" + (
+                    " (not available while MATE_BACKENDS routes planning across backends)" if ROUTING_ENABLED else ""))
+    st.checkbox("♻️ Reuse plans for similar requests", value=True, key="reuse_plans",
+                help="Serve the saved plan of a near-identical earlier request instead of asking the model again")
 
 active_chat = get_active_chat()
 if not active_chat:
@@ -201,67 +252,122 @@ TOOL_LABELS = {
 active_chat = get_active_chat()
 if generate_clicked and user_query and not active_chat:
     with st.spinner("Planning your workflow..."):
-        all_tools = load_tools_json()
-        relevant_tools = filter_tools_by_query(user_query, all_tools, top_n=12)
+        # Each stage is timed into mate_stage_seconds (see core.metrics)
+        with span('catalog_load'):
+            all_tools = load_tools_json()
+        with span('tool_filter'):
+            relevant_tools = filter_tools_by_query(user_query, all_tools, top_n=12)
         if not relevant_tools:
             st.warning("No relevant tools found for your query. Try rephrasing.")
             st.stop()
-        prompt = build_prompt(user_query, relevant_tools)
-        try:
-            response = call_gemini(prompt)
-        except Exception as e:
-            st.error(f"Sorry, there was an error contacting the AI model: {e}")
-            st.stop()
-        with st.expander("[Debug] Raw LLM Response", expanded=False):
-            st.code(response)
-        plan, reasoning = None, None
-        try:
-            parsed = json.loads(response)
-            plan = parsed if isinstance(parsed, list) else parsed.get('plan', [])
-            reasoning = parsed.get('reasoning', None) if isinstance(parsed, dict) else None
-        except Exception:
-            plan = extract_json_array(response)
-            reasoning = None
+        with span('prompt_build', tools=len(relevant_tools)):
+            prompt = build_prompt(user_query, relevant_tools, token_budget=DEFAULT_TOKEN_BUDGET)
+        plan, reasoning, cached = None, None, None
+        if st.session_state.get('reuse_plans'):
+            with span('plan_cache'):
+                plan_cache = get_plan_cache()
+                if not st.session_state.get('plan_cache_warmed'):
+                    plan_cache.warm_from_store(st.session_state['owner'])
+                    st.session_state['plan_cache_warmed'] = True
+                cached = plan_cache.lookup(user_query, relevant_tools, owner=st.session_state['owner'])
+        if cached is not None:
+            plan, reasoning = cached['plan'], cached['reasoning']
+            st.session_state['plan_cache_hit'] = (cached['user_query'], cached['similarity'])
+        elif ROUTING_ENABLED:
+            try:
+                # Hedged/failover planning across MATE_BACKENDS (see core.backend_router)
+                with span('llm', routed=True):
+                    routed = get_router().plan(user_query, relevant_tools)
+            except Exception as e:
+                st.error(f"Sorry, there was an error contacting the AI model: {e}")
+                st.stop()
+            plan = routed['plan']
+            with st.expander("[Debug] Routed Backend", expanded=False):
+                st.json({key: routed[key] for key in ('backend', 'kind', 'elapsed', 'attempts')})
+        elif st.session_state.get('stream_plan'):
+            parser = StepStreamParser()
+            try:
+                # Steps are parsed and rendered while the response streams in, so this stage covers all three
+                with span('llm_stream'):
+                    streamed_steps = (step for chunk in stream_gemini(prompt) for step in parser.feed(chunk))
+                    plan = render_plan_stream(streamed_steps, relevant_tools, TOOL_LABELS)
+            except Exception as e:
+                st.error(f"Sorry, there was an error contacting the AI model: {e}")
+                st.stop()
+            response = parser.text
+            with st.expander("[Debug] Raw LLM Response", expanded=False):
+                st.code(response)
+            # The stream parser drops a step whose JSON is invalid; the full-text parse can repair it
+            with span('parse'):
+                full_plan, reasoning = parse_plan_response(response)
+            if isinstance(full_plan, list) and len(full_plan) > len(plan or []):
+                plan = full_plan
+        else:
+            try:
+                with span('llm'):
+                    response = call_gemini(prompt)
+            except Exception as e:
+                st.error(f"Sorry, there was an error contacting the AI model: {e}")
+                st.stop()
+            with st.expander("[Debug] Raw LLM Response", expanded=False):
+                st.code(response)
+            with span('parse'):
+                plan, reasoning = parse_plan_response(response)
         if not plan or not isinstance(plan, list) or len(plan) == 0:
             st.error("Sorry, I couldn't generate a valid plan for your request. Please try rephrasing, or check your API/model settings.")
             st.stop()
+    if cached is None and not validate_plan(plan):
+        get_plan_cache().add(user_query, relevant_tools, plan, reasoning, owner=st.session_state['owner'])
     add_new_chat(user_query, plan, reasoning, relevant_tools)
+    write_metrics_file()
     st.experimental_rerun() if hasattr(st, 'experimental_rerun') else st.rerun()
 
 active_chat = get_active_chat()
 if active_chat:
     if 'plan_version_idx' not in st.session_state or st.session_state['active_chat_id'] != active_chat['id']:
-        st.session_state['plan_version_idx'] = len(active_chat['plans']) - 1
-    num_versions = len(active_chat['plans'])
+        st.session_state['plan_version_idx'] = active_chat['num_versions'] - 1
+    num_versions = active_chat['num_versions']
     idx = st.session_state['plan_version_idx']
     if idx < 0:
         idx = 0
     if idx > num_versions - 1:
         idx = num_versions - 1
     st.session_state['plan_version_idx'] = idx
-    plan_version = active_chat['plans'][idx]
+    plan_version = get_plan_store().get_version(st.session_state['owner'], active_chat['id'], idx)
+    if plan_version is None:
+        # Deleted meanwhile (e.g. pruned, or removed from another tab with the same owner)
+        st.session_state['active_chat_id'] = None
+        st.warning("This plan version no longer exists.")
+        st.stop()
     plan = plan_version['plan']
     reasoning = plan_version.get('reasoning', None)
-    relevant_tools = plan_version.get('relevant_tools', [])
+    relevant_tools = resolve_tools(plan_version['tool_names'], plan_version['catalog_version'])
     st.markdown(f"### 📝 Your Task\n> {active_chat['user_query']}")
-    render_plan(plan, relevant_tools, TOOL_LABELS)
+    if is_stale(plan_version['catalog_version']):
+        st.caption("The tool catalog has changed since this plan version was made; tools are shown as currently defined.")
+    if 'plan_cache_hit' in st.session_state:
+        similar_query, similarity = st.session_state.pop('plan_cache_hit')
+        st.info(f"♻️ Reused the plan of a similar request: \"{similar_query}\" (similarity {similarity:.2f})")
+    with span('render'):
+        render_plan(plan, relevant_tools, TOOL_LABELS, chat_id=active_chat['id'])
+    with span('validate'):
+        plan_issues = validate_plan(plan)
+    if plan_issues:
+        with st.expander(f"⚠️ Plan check: {len(plan_issues)} issue(s)", expanded=False):
+            for issue in plan_issues:
+                st.markdown(f"- {issue}")
     if reasoning:
         st.markdown("### 🤔 Why these functions?")
         st.info(reasoning)
-    render_update_plan(active_chat, idx, relevant_tools, call_gemini, extract_json_array, update_chat_plan)
-
-    # Update and display tool usage statistics
-    if plan:
-        for step in plan:
-            func_name = step.get('function')
-            if func_name:
-                st.session_state['tool_usage_stats'][func_name] = st.session_state['tool_usage_stats'].get(func_name, 0) + 1
+    render_update_plan(active_chat, idx, plan, relevant_tools, call_gemini, extract_json_array, update_chat_plan)
 
+    # Tool usage is counted once per saved plan version (not per rerun), across sessions, since the process started
     with st.sidebar:
         st.markdown("---")
         st.markdown("<h3 style='margin-bottom:0.5em;'>📊 Tool Usage Stats</h3>", unsafe_allow_html=True)
-        if st.session_state['tool_usage_stats']:
-            sorted_stats = sorted(st.session_state['tool_usage_stats'].items(), key=lambda item: item[1], reverse=True)
+        tool_usage_stats = {labels['tool']: count for labels, count in TOOL_USES.items()}
+        if tool_usage_stats:
+            sorted_stats = sorted(tool_usage_stats.items(), key=lambda item: item[1], reverse=True)
             for tool, count in sorted_stats:
                 st.markdown(f"- **{tool}:** {count} uses")
         else:
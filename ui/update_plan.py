@@ -1,10 +1,47 @@
 import streamlit as st
 import json
+from core.metrics import get_metrics
+from core.plan_patch import PlanPatchError, patch_plan
 from core.prompt_builder import filter_tools_by_query, load_tools_json
 from core.update_prompt_builder import UpdatePromptBuilder
 
-def render_update_plan(active_chat, idx, relevant_tools, call_gemini, extract_json_array, update_chat_plan):
-    num_versions = len(active_chat['plans'])
+def count_update(mode):
+    get_metrics().counter('mate_plan_updates_total', 'Plan updates by how they were produced', ['mode']).inc(mode=mode)
+
+def update_tools(current_plan, retrieved_tools, all_tools):
+    """
+    Tools offered for an update: those the current plan calls, then the ones retrieved for the
+    update, without duplicates, so the model can keep the plan's existing steps while adding new ones.
+    """
+    by_name = {tool['name']: tool for tool in all_tools}
+    names = [step.get('function') for step in current_plan if isinstance(step, dict)]
+    names += [tool['name'] for tool in retrieved_tools]
+    return [by_name[name] for name in dict.fromkeys(names) if name in by_name]
+
+def request_patched_plan(user_query, current_plan, update_instruction, relevant_tools, call_gemini, extract_json_array):
+    """
+    Ask the model for the update as patch operations (core.plan_patch) and apply them locally.
+    Returns:
+        list or None: The patched plan, or None if the full plan should be regenerated instead.
+    """
+    patch_prompt = UpdatePromptBuilder.build_patch_prompt(user_query, current_plan, update_instruction, relevant_tools)
+    try:
+        response = call_gemini(patch_prompt)
+    except Exception:
+        return None
+    with st.expander("[Debug] Raw LLM Response (Patch)", expanded=False):
+        st.code(response)
+    operations = extract_json_array(response)
+    if not operations:
+        return None
+    try:
+        return patch_plan(current_plan, operations, allowed_tools=[t['name'] for t in relevant_tools])
+    except PlanPatchError as e:
+        st.caption(f"Could not apply the edit as a patch ({e}); regenerating the whole plan.")
+        return None
+
+def render_update_plan(active_chat, idx, current_plan, relevant_tools, call_gemini, extract_json_array, update_chat_plan):
+    num_versions = active_chat['num_versions']
     col_v1, col_v2, col_v3, _ = st.columns([2,1,2,8])
     with col_v1:
         select_prev = st.button("◀", key="prev_plan_btn", disabled=(idx==0), help="Previous version")
@@ -20,19 +57,34 @@ def render_update_plan(active_chat, idx, relevant_tools, call_gemini, extract_js
         st.experimental_rerun() if hasattr(st, 'experimental_rerun') else st.rerun()
     st.markdown("### ✏️ Update Plan")
     st.session_state['update_input'] = st.text_input("Describe your update (e.g. add a step, change a tool, delete a step, etc.)", value=st.session_state.get('update_input', ''), key="update_input_box")
+    st.checkbox("Send only the changes", value=True, key="patch_updates",
+                help="Ask the model for a few edit operations instead of the whole plan; falls back to a full rewrite if they do not apply")
     if st.button("Update Plan", key="update_plan_btn") and st.session_state['update_input']:
-        current_plan = active_chat['plans'][idx]['plan']
         all_tools = load_tools_json()
         combined_query = active_chat['user_query'] + ' ' + st.session_state['update_input']
-        strict_relevant_tools = filter_tools_by_query(combined_query, all_tools, top_n=12)
+        retrieved_tools = filter_tools_by_query(combined_query, all_tools, top_n=12)
+        offered_tools = update_tools(current_plan, retrieved_tools, all_tools)
         update_instruction = st.session_state['update_input']
-        update_prompt = UpdatePromptBuilder.build_update_prompt(
-            active_chat['user_query'],
-            current_plan,
-            update_instruction,
-            strict_relevant_tools
-        )
         with st.spinner("Preparing workflow..."):
+            new_plan = None
+            if st.session_state.get('patch_updates'):
+                new_plan = request_patched_plan(
+                    active_chat['user_query'], current_plan, update_instruction, offered_tools,
+                    call_gemini, extract_json_array,
+                )
+                count_update('patch' if new_plan is not None else 'patch_fallback')
+            if new_plan is not None:
+                new_idx = update_chat_plan(active_chat['id'], new_plan, None, offered_tools)
+                st.session_state['update_input'] = ""
+                st.session_state['plan_version_idx'] = new_idx
+                st.experimental_rerun() if hasattr(st, 'experimental_rerun') else st.rerun()
+            update_prompt = UpdatePromptBuilder.build_update_prompt(
+                active_chat['user_query'],
+                current_plan,
+                update_instruction,
+                offered_tools
+            )
+            count_update('full')
             try:
                 response = call_gemini(update_prompt)
             except Exception as e:
@@ -40,7 +92,6 @@ def render_update_plan(active_chat, idx, relevant_tools, call_gemini, extract_js
                 st.stop()
             with st.expander("[Debug] Raw LLM Response (Update)", expanded=False):
                 st.code(response)
-            new_plan = None
             try:
                 parsed = json.loads(response)
                 new_plan = parsed if isinstance(parsed, list) else parsed.get('plan', [])
@@ -49,7 +100,7 @@ def render_update_plan(active_chat, idx, relevant_tools, call_gemini, extract_js
             if not new_plan or not isinstance(new_plan, list) or len(new_plan) == 0:
                 st.error("Sorry, I couldn't generate a valid updated plan. Please try rephrasing your update.")
                 st.stop()
-            update_chat_plan(active_chat['id'], new_plan, None, strict_relevant_tools)
+            new_idx = update_chat_plan(active_chat['id'], new_plan, None, offered_tools)
             st.session_state['update_input'] = ""
-            st.session_state['plan_version_idx'] = len(active_chat['plans']) - 1
+            st.session_state['plan_version_idx'] = new_idx
             st.experimental_rerun() if hasattr(st, 'experimental_rerun') else st.rerun() 
\ No newline at end of file